@@ -1,3 +1,9 @@
+import sys
+import time
+from functools import lru_cache
+
+# How many recent fibonacci() results are kept; large ones take megabytes each
+FIBONACCI_CACHE_SIZE = 32
 
 def greet(name):
     """Return a greeting message."""
@@ -40,13 +46,106 @@ def factorial(n):
         result *= i
     return result
 
+def _fibonacci_pair(n, m=None):
+    """Return (F(n), F(n + 1)) by fast doubling, reduced modulo m if given."""
+    a, b = 0, 1
+    # Walk the bits of n from the top: F(2k) = F(k) * (2F(k+1) - F(k)), F(2k+1) = F(k)^2 + F(k+1)^2
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        if m:
+            c, d = c % m, d % m
+        if bit == "1":
+            a, b = d, (c + d) % m if m else c + d
+        else:
+            a, b = c, d
+    return a, b
+
+@lru_cache(maxsize=FIBONACCI_CACHE_SIZE)
 def fibonacci(n):
-    """Return the nth Fibonacci number."""
+    """Return the nth Fibonacci number in O(log n) steps, caching recent results."""
+    if n <= 0:
+        return 0
+    return _fibonacci_pair(n)[0]
+
+def fibonacci_loop(n):
+    """Return the nth Fibonacci number by adding n times (the original version, kept for comparison)."""
     a, b = 0, 1
     for _ in range(n):
         a, b = b, a + b
     return a
 
+def fibonacci_many(ns):
+    """Return the Fibonacci numbers of all indices in ns, in one sweep over them in sorted order."""
+    results = {}
+    # a, b = F(previous), F(previous + 1); each index is reached from the last one
+    # with F(p + d) = F(p) F(d + 1) + F(p - 1) F(d)
+    previous, a, b = 0, 0, 1
+    for n in sorted(set(ns)):
+        if n <= 0:
+            results[n] = 0
+            continue
+        f, g = _fibonacci_pair(n - previous)
+        a, b = a * g + (b - a) * f, b * g + a * f
+        previous = n
+        results[n] = a
+    return [results[n] for n in ns]
+
+def fibonacci_mod(n, m):
+    """Return the nth Fibonacci number modulo m, without computing the full number."""
+    if m <= 0:
+        return "Modulus must be a positive integer."
+    if n <= 0:
+        return 0
+    return _fibonacci_pair(n, m)[0] % m
+
 def reverse_string(s):
     """Return the reversed version of the string s."""
-    return s[::-1]
\ No newline at end of file
+    return s[::-1]
+
+def benchmark_fibonacci(sizes=(10**3, 10**4, 10**5, 10**6, 10**7), loop_limit=10**6):
+    """Print how long fibonacci() and the original loop take for each n in sizes."""
+    for n in sizes:
+        fibonacci.cache_clear()
+        start = time.perf_counter()
+        fast = fibonacci(n)
+        fast_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        fibonacci(n)
+        cached_seconds = time.perf_counter() - start
+        line = f"n = {n:>10,}: fast doubling {fast_seconds:9.4f}s, cached {cached_seconds * 1e6:6.2f}us"
+        # The loop's additions grow with n, so it takes hours by 10**7
+        if n <= loop_limit:
+            start = time.perf_counter()
+            assert fibonacci_loop(n) == fast
+            loop_seconds = time.perf_counter() - start
+            line += f", loop {loop_seconds:9.4f}s ({loop_seconds / fast_seconds:,.0f}x slower)"
+        else:
+            line += ", loop skipped"
+        print(line)
+
+    ns = list(range(0, 100_000, 1_000))
+    start = time.perf_counter()
+    batch = fibonacci_many(ns)
+    batch_seconds = time.perf_counter() - start
+    fibonacci.cache_clear()
+    start = time.perf_counter()
+    one_by_one = [fibonacci(n) for n in ns]
+    single_seconds = time.perf_counter() - start
+    assert batch == one_by_one
+    print(f"{len(ns)} indices up to {ns[-1]:,}: fibonacci_many {batch_seconds:.4f}s, one by one {single_seconds:.4f}s")
+
+    assert fibonacci_mod(10**5, 10**9 + 7) == fibonacci(10**5) % (10**9 + 7)
+    start = time.perf_counter()
+    fibonacci_mod(10**18, 10**9 + 7)
+    print(f"fibonacci_mod(10**18, 10**9 + 7) {(time.perf_counter() - start) * 1e6:.1f}us")
+
+if __name__ == "__main__":
+    # A quick demo; the benchmark takes a while, so it only runs with --benchmark
+    if "--benchmark" in sys.argv[1:]:
+        benchmark_fibonacci()
+    else:
+        print(f"fibonacci(100) = {fibonacci(100)}")
+        print(f"fibonacci_many([10, 20, 30]) = {fibonacci_many([10, 20, 30])}")
+        print(f"fibonacci_mod(10**18, 10**9 + 7) = {fibonacci_mod(10**18, 10**9 + 7)}")
+        print("Run with --benchmark to time fibonacci() against the original loop.")
@@ -0,0 +1,88 @@
+# Running aggregates for the expense ledger
+#
+# Updated on every add and reset, so metrics never need a pass over the rows.
+
+from collections import defaultdict
+
+import numpy as np
+
+
+class ExpenseAggregates:
+    """Count, total, max and per-category sums kept up to date incrementally"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget everything, as after clearing the ledger"""
+        self.count = 0
+        self.total = 0.0
+        self.max_amount = 0.0
+        self.category_totals = defaultdict(float)
+        self.category_counts = defaultdict(int)
+
+    def copy(self):
+        """Return an independent copy, for read-only snapshots"""
+        clone = ExpenseAggregates.__new__(ExpenseAggregates)
+        clone.count = self.count
+        clone.total = self.total
+        clone.max_amount = self.max_amount
+        clone.category_totals = defaultdict(float, self.category_totals)
+        clone.category_counts = defaultdict(int, self.category_counts)
+        return clone
+
+    def add(self, amount, category):
+        """Fold a single expense into the aggregates"""
+        if self.count == 0 or amount > self.max_amount:
+            self.max_amount = amount
+        self.count += 1
+        self.total += amount
+        self.category_totals[category] += amount
+        self.category_counts[category] += 1
+
+    def before_add(self, category):
+        """What add() is about to change, for undo_add()"""
+        return (self.count, self.total, self.max_amount, category,
+                self.category_totals.get(category), self.category_counts.get(category))
+
+    def undo_add(self, state):
+        """Put back what an add changed, from before_add()"""
+        self.count, self.total, self.max_amount, category, total, count = state
+        if count is None:
+            self.category_totals.pop(category, None)
+            self.category_counts.pop(category, None)
+        else:
+            self.category_totals[category] = total
+            self.category_counts[category] = count
+
+    def add_many(self, amounts, category_codes, categories):
+        """Fold a batch of expenses in with vectorized NumPy reductions
+
+        `category_codes` index into the `categories` list of names.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not len(amounts):
+            return
+        batch_max = float(amounts.max())
+        if self.count == 0 or batch_max > self.max_amount:
+            self.max_amount = batch_max
+        self.count += len(amounts)
+        self.total += float(amounts.sum())
+        sums = np.bincount(category_codes, weights=amounts, minlength=len(categories))
+        counts = np.bincount(category_codes, minlength=len(categories))
+        for code in np.flatnonzero(counts):
+            self.category_totals[categories[code]] += float(sums[code])
+            self.category_counts[categories[code]] += int(counts[code])
+
+    def rename_category(self, old, new):
+        """Move the sums of `old` under `new`, adding to it if `new` already exists"""
+        if old == new or old not in self.category_counts:
+            return
+        self.category_totals[new] += self.category_totals.pop(old)
+        self.category_counts[new] += self.category_counts.pop(old)
+
+    def metrics(self):
+        """Return (total, average, max) like ExpenseManager.get_expense_metrics"""
+        if not self.count:
+            return 0, 0, 0
+        return self.total, self.total / self.count, self.max_amount
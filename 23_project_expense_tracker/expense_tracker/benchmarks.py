@@ -0,0 +1,799 @@
+# Benchmarks for the expense tracker ledger
+#
+# Run with:  python benchmarks.py memory --rows 1000000
+#            python benchmarks.py metrics --rows 100000
+#            python benchmarks.py rollup --rows 1000000
+#            python benchmarks.py downsample --rows 500000
+#            python benchmarks.py startup --budget-ms 250
+#            python benchmarks.py shared
+#            python benchmarks.py categories --rows 1000000
+#            python benchmarks.py dates --rows 1000000
+#            python benchmarks.py search --rows 1000000
+#            python benchmarks.py quantiles --rows 1000000
+#            python benchmarks.py fragments
+#            python benchmarks.py export --rows 1000000
+#            python benchmarks.py writes --rows 2000
+#            python benchmarks.py figures --rows 100000
+#            python benchmarks.py reports --rows 20000 --ledgers 64
+#            python benchmarks.py monitor --rows 100000
+#            python benchmarks.py history --rows 1000000
+#            python benchmarks.py scaling --sizes 1000 10000 100000 1000000 --output scaling.json
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from downsample import METHODS, downsample
+from expense_query import page_rows, select_rows
+from expense_store import ExpenseStore, date_to_day, datetime_to_micros, day_to_date
+from exporter import EXTENSIONS, export_expenses
+from figure_cache import FigureCache
+from frame_cache import FrameCache
+from ledger import Ledger, LedgerSnapshot, SharedLedger
+from reports import generate_reports
+from rollup import PERIODS
+from sketches import PERCENTILES, QuantileSketch
+from storage import MemoryBackend, SQLiteBackend
+from write_behind import WriteBehindBackend
+
+CATEGORIES = ["Food", "Transport", "Entertainment", "Bills", "Shopping", "Others"]
+DESCRIPTIONS = ["Lunch", "Groceries", "Taxi", "Bus pass", "Cinema", "Electricity", "Internet", "Shoes", "Gift", "Coffee"]
+
+
+def synthetic_rows(rows, seed=42):
+    """Yield (amount, category, description, date, timestamp) tuples"""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    stamp = datetime(2020, 1, 1, 9, 0, 0)
+    for i in range(rows):
+        yield (
+            round(rng.uniform(1, 500), 2),
+            rng.choice(CATEGORIES),
+            rng.choice(DESCRIPTIONS),
+            start + timedelta(days=rng.randrange(1825)),
+            stamp + timedelta(seconds=i),
+        )
+
+
+def build_dict_list(rows):
+    """Build the ledger the old way: one dict per expense"""
+    expenses = []
+    for amount, category, description, expense_date, timestamp in synthetic_rows(rows):
+        expenses.append({
+            "amount": float(amount),
+            "category": str(category),
+            "description": str(description),
+            "date": expense_date,
+            "timestamp": timestamp,
+        })
+    return expenses
+
+
+def build_store(rows):
+    """Build the ledger as a columnar ExpenseStore"""
+    store = ExpenseStore()
+    for amount, category, description, expense_date, timestamp in synthetic_rows(rows):
+        store.append(amount, category, description, expense_date, timestamp)
+    return store
+
+
+def measure(builder, rows):
+    """Return memory and GC statistics for one ledger layout"""
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    started = time.perf_counter()
+    ledger = builder(rows)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Live Python object allocations, a proxy for GC and allocator pressure
+    allocated_blocks = sys.getallocatedblocks() - blocks_before
+    del ledger
+    return {
+        "build_seconds": round(elapsed, 3),
+        "retained_bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_row": round(current / rows, 1),
+        "allocated_blocks": allocated_blocks,
+    }
+
+
+def bench_memory(rows):
+    """Compare the list-of-dicts layout with the columnar store"""
+    results = {
+        "rows": rows,
+        "list_of_dicts": measure(build_dict_list, rows),
+        "expense_store": measure(build_store, rows),
+    }
+    results["retained_ratio"] = round(
+        results["list_of_dicts"]["retained_bytes"] / max(results["expense_store"]["retained_bytes"], 1), 1
+    )
+    return results
+
+
+def recompute_metrics(ledger):
+    """Full pass over the stored rows, the way metrics used to be computed"""
+    expenses = list(ledger.store)
+    if not expenses:
+        return (0, 0, 0), {}
+    total = sum(expense["amount"] for expense in expenses)
+    max_expense = max(expense["amount"] for expense in expenses)
+    category_totals = {}
+    for expense in expenses:
+        category_totals[expense["category"]] = category_totals.get(expense["category"], 0.0) + expense["amount"]
+    return (total, total / len(expenses), max_expense), category_totals
+
+
+def bench_metrics(rows, seed=7):
+    """Time the running metrics against a full recomputation"""
+    ledger = Ledger()
+    for amount, category, description, expense_date, timestamp in synthetic_rows(rows, seed):
+        ledger.add(amount, category, description, expense_date, timestamp)
+    started = time.perf_counter()
+    ledger.metrics()
+    incremental = time.perf_counter() - started
+    started = time.perf_counter()
+    recompute_metrics(ledger)
+    full_scan = time.perf_counter() - started
+    return {"rows": rows, "incremental_seconds": incremental, "full_scan_seconds": full_scan}
+
+
+def bench_rollup(rows, seed=11):
+    """Time the analysis frames from the rollup against a full groupby"""
+    ledger = Ledger()
+    for amount, category, description, expense_date, timestamp in synthetic_rows(rows, seed):
+        ledger.add(amount, category, description, expense_date, timestamp)
+    results = {"rows": rows, "cells": len(ledger.rollup)}
+    for period in PERIODS:
+        started = time.perf_counter()
+        ledger.rollup.trend_frame(period)
+        results[f"trend_{period}_seconds"] = time.perf_counter() - started
+    started = time.perf_counter()
+    ledger.rollup.category_frame()
+    results["by_category_seconds"] = time.perf_counter() - started
+    started = time.perf_counter()
+    ledger.store.to_frame().groupby("category", observed=True)["amount"].sum()
+    results["full_groupby_seconds"] = time.perf_counter() - started
+    return results
+
+
+def bench_downsample(rows, max_points=2000):
+    """Time both downsampling methods"""
+    import numpy as np
+
+    rng = np.random.default_rng(3)
+    x = np.arange(rows, dtype=np.int64)
+    y = rng.uniform(1, 500, rows)
+    results = {"rows": rows, "max_points": max_points}
+    for method in METHODS:
+        started = time.perf_counter()
+        downsample(x, y, max_points, method)
+        results[f"{method}_seconds"] = time.perf_counter() - started
+    return results
+
+
+SCALING_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def synthetic_columns(rows, seed=42):
+    """Random (amounts, categories, descriptions, days, timestamps) columns for Ledger.add_many"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    start_day = date_to_day(date(2020, 1, 1))
+    return (
+        np.round(rng.uniform(1, 500, rows), 2),
+        np.array(CATEGORIES, dtype=object)[rng.integers(len(CATEGORIES), size=rows)],
+        np.array(DESCRIPTIONS, dtype=object)[rng.integers(len(DESCRIPTIONS), size=rows)],
+        start_day + rng.integers(1825, size=rows),
+        datetime_to_micros(datetime(2020, 1, 1, 9)) + np.arange(rows, dtype=np.int64) * 1_000_000,
+    )
+
+
+def synthetic_ledger(rows, seed=42):
+    """Build a Ledger of `rows` random expenses in one vectorized batch"""
+    ledger = Ledger()
+    ledger.add_many(*synthetic_columns(rows, seed))
+    return ledger
+
+
+def profile(operation, repeat=5):
+    """Run `operation` `repeat` times and return latency, peak memory and allocations
+
+    Latency is timed without tracemalloc, which slows allocation-heavy code;
+    memory and allocations come from one extra traced run.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # Blocks still alive while the result is held, as in measure()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+    return {
+        "median_seconds": timings[len(timings) // 2],
+        "min_seconds": timings[0],
+        "peak_bytes": peak,
+        "allocated_blocks": blocks,
+    }
+
+
+def page_operations(ledger):
+    """The work behind each page, timed through ExpenseManager's own methods, keyed by name
+
+    The app runs in Streamlit's bare mode on `ledger`; the frame and figure
+    caches are emptied before every call, so each one measures a cold build.
+    """
+    import streamlit as st
+    from streamlit import config
+    from streamlit.logger import set_log_level
+
+    # Bare mode warns about the missing script context on every Streamlit call; reading an
+    # option first parses the config, which would otherwise reset the level later
+    config.get_option("logger.level")
+    set_log_level("error")
+
+    from expanse_tracker import ExpenseManager
+
+    st.session_state.clear()
+    app = ExpenseManager(ledger=ledger)
+    days = ledger.store.column("day")
+    first_date, last_date = day_to_date(days.min()), day_to_date(days.max())
+    trend = ("day", first_date, last_date, 2000, METHODS[0])
+
+    def cold(build):
+        def operation(*args):
+            st.session_state.frame_cache = FrameCache()
+            st.session_state.figure_cache = FigureCache()
+            return build(*args)
+        return operation
+
+    def view_page():
+        rows = select_rows(ledger.store, sort_by="date", descending=True, date_index=ledger.date_index,
+                           description_codes=ledger.search_index.match(""))
+        return app.build_page_frame(page_rows(rows, 1, 50), ledger.store)
+
+    operations = {
+        "add_expense": lambda: app.add_expense(42.0, "Food", "Lunch", last_date),
+        "get_expense_metrics": app.get_expense_metrics,
+        "dashboard_recent": lambda: list(ledger.store[-5:]),
+        "dashboard_range": lambda: ledger.date_index.between(date_to_day(last_date) - 29, date_to_day(last_date)),
+        "view_page_frame": view_page,
+        "by_category_frame": app.build_category_frame,
+        "box_frame": app.build_box_frame,
+        "trend_frame": lambda: cold(app.build_trend_points)(*trend),
+    }
+    if importlib.util.find_spec("plotly") is None:
+        return operations
+    operations.update({
+        "dashboard_figure": app.build_pie_figure,
+        "trend_figure": lambda: cold(app.build_trend_figure)(*trend),
+        "by_category_figure": cold(app.build_category_figure),
+        "distribution_figure": cold(app.build_distribution_figure),
+    })
+    return operations
+
+
+def bench_scaling(sizes=SCALING_SIZES, repeat=5):
+    """Time every page operation on synthetic ledgers of increasing size"""
+    results = {"python": sys.version.split()[0], "repeat": repeat, "sizes": {}}
+    for rows in sizes:
+        started = time.perf_counter()
+        ledger = synthetic_ledger(rows)
+        size_results = {"build_seconds": time.perf_counter() - started}
+        for name, operation in page_operations(ledger).items():
+            size_results[name] = profile(operation, repeat)
+        results["sizes"][str(rows)] = size_results
+        del ledger
+    return results
+
+
+def bench_categories(rows):
+    """Time a rename, a merge and a groupby on the categorical column"""
+    ledger = synthetic_ledger(rows)
+    results = {"rows": rows}
+    started = time.perf_counter()
+    ledger.rename_category("Bills", "Utilities")
+    results["rename_seconds"] = time.perf_counter() - started
+    started = time.perf_counter()
+    ledger.rename_category("Shopping", "Food")
+    results["merge_seconds"] = time.perf_counter() - started
+    started = time.perf_counter()
+    ledger.store.to_frame().groupby("category", observed=True)["amount"].sum()
+    results["categorical_groupby_seconds"] = time.perf_counter() - started
+    return results
+
+
+def bench_dates(rows, queries=200, seed=13):
+    """Race date index range queries against a pandas mask"""
+    import numpy as np
+
+    rng = random.Random(seed)
+    ledger = synthetic_ledger(rows)
+    frame = ledger.store.to_frame()
+    first_day, last_day = int(ledger.store.column("day").min()), int(ledger.store.column("day").max())
+    ranges = []
+    for _ in range(queries):
+        start = rng.randint(first_day, last_day)
+        ranges.append((start, min(last_day, start + rng.randint(0, 60))))
+
+    started = time.perf_counter()
+    for start, end in ranges:
+        ledger.date_index.between(start, end)
+    index_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for start, end in ranges:
+        low, high = np.datetime64(day_to_date(start)), np.datetime64(day_to_date(end))
+        np.flatnonzero(((frame["date"] >= low) & (frame["date"] <= high)).to_numpy())
+    mask_seconds = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "queries": queries,
+        "index_seconds_per_query": index_seconds / queries,
+        "pandas_mask_seconds_per_query": mask_seconds / queries,
+    }
+
+
+MERCHANTS = ["Tesco", "Uber", "Netflix", "Shell", "Amazon", "Starbucks", "IKEA", "Lidl", "Spotify", "Boots"]
+
+
+def bench_search(rows, seed=17):
+    """Time description search through the index against a regex scan"""
+    import re
+
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    ledger = synthetic_ledger(0)
+    # Mostly unique descriptions, like a bank export with reference numbers
+    descriptions = [
+        f"{merchant} {item} ref {number}" for merchant, item, number in zip(
+            np.array(MERCHANTS)[rng.integers(len(MERCHANTS), size=rows)],
+            np.array(DESCRIPTIONS)[rng.integers(len(DESCRIPTIONS), size=rows)],
+            rng.integers(100_000, size=rows),
+        )
+    ]
+    ledger.add_many(
+        np.round(rng.uniform(1, 500, rows), 2),
+        np.array(CATEGORIES, dtype=object)[rng.integers(len(CATEGORIES), size=rows)],
+        descriptions,
+        date_to_day(date(2020, 1, 1)) + rng.integers(1825, size=rows),
+        np.arange(rows, dtype=np.int64),
+    )
+    frame = ledger.store.to_frame()
+    lowered = frame["description"].astype(str).str.lower()
+
+    results = {"rows": rows, "descriptions": len(ledger.store.descriptions), "queries": {}}
+    for query in ["tesco", "gro", "uber taxi", "ref 4242", "netflix cinema 1"]:
+        started = time.perf_counter()
+        found = select_rows(ledger.store, sort_by="added", description_codes=ledger.search_index.match(query))
+        index_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        mask = np.ones(len(frame), dtype=bool)
+        for term in query.split():
+            mask &= lowered.str.contains(r"\b" + re.escape(term), regex=True).to_numpy()
+        expected = np.flatnonzero(mask)
+        scan_seconds = time.perf_counter() - started
+        results["queries"][query] = {
+            "matches": len(found), "scan_matches": len(expected), "index_seconds": index_seconds, "scan_seconds": scan_seconds
+        }
+    return results
+
+
+def bench_quantiles(rows, seed=19):
+    """Compare the size and speed of sketch quantiles with exact ones"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    distributions = {
+        "uniform": rng.uniform(0.01, 500, rows),
+        "lognormal": rng.lognormal(3, 1.5, rows),
+        "pareto": (rng.pareto(1.2, rows) + 1) * 5,
+        "rounded": np.round(rng.exponential(40, rows), 2) + 0.01,
+    }
+    results = {"rows": rows, "distributions": {}}
+    for name, values in distributions.items():
+        sketch = QuantileSketch()
+        started = time.perf_counter()
+        sketch.add_many(values)
+        add_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        sketch.quantiles(PERCENTILES)
+        sketch_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        np.quantile(values, PERCENTILES)
+        exact_seconds = time.perf_counter() - started
+        results["distributions"][name] = {
+            "buckets": len(sketch.buckets), "add_many_seconds": add_seconds,
+            "sketch_seconds": sketch_seconds, "exact_seconds": exact_seconds
+        }
+    return results
+
+
+def bench_shared(writers=8, readers=8, adds_per_writer=2000):
+    """Time a SharedLedger under concurrent writers and snapshot readers"""
+    import threading
+
+    shared = SharedLedger()
+    done = threading.Event()
+    reads = [0] * readers
+
+    def write(worker):
+        rows = synthetic_rows(adds_per_writer, seed=worker)
+        for amount, category, description, expense_date, timestamp in rows:
+            shared.add(amount, category, description, expense_date, timestamp)
+
+    def read(worker):
+        while not done.is_set():
+            shared.snapshot().metrics()
+            reads[worker] += 1
+
+    threads = [threading.Thread(target=read, args=(worker,)) for worker in range(readers)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    writer_threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in threads:
+        thread.join()
+    return {
+        "writers": writers,
+        "readers": readers,
+        "adds": len(shared),
+        "write_seconds": elapsed,
+        "adds_per_second": len(shared) / elapsed,
+        "snapshot_reads": sum(reads),
+        "store_bytes": shared.store.nbytes,
+    }
+
+
+def bench_fragments(rows=1000):
+    """Time Settings edits, which rerun only their fragment (needs streamlit)"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["EXPENSE_TRACKER_DB"] = ""
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "expanse_tracker.py"),
+                            default_timeout=60)
+    app.run()
+    ledger = app.session_state.ledger
+    for amount, category, description, expense_date, timestamp in synthetic_rows(rows):
+        ledger.add(amount, category, description, expense_date, timestamp)
+    for page in ["Dashboard", "Expense Analysis", "Settings"]:
+        app.sidebar.radio[0].set_value(page).run()
+
+    started = time.perf_counter()
+    for text in ["T", "Tr", "Tra", "Travel"]:
+        app.text_input[0].set_value(text).run()
+    edit_seconds = time.perf_counter() - started
+    return {"rows": rows, "settings_edits": 4, "edit_seconds": edit_seconds, **app.session_state.fragments.stats()}
+
+
+def bench_export(rows, chunk_sizes=(10_000, 100_000)):
+    """Time each export format and its peak memory per chunk size"""
+    import tempfile
+
+    ledger = synthetic_ledger(rows)
+    results = {"rows": rows, "formats": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in EXTENSIONS:
+            for chunk_size in chunk_sizes:
+                path = os.path.join(directory, f"export{EXTENSIONS[file_format]}")
+                report = export_expenses(ledger.store, path, chunk_size=chunk_size)
+                # A second, traced run for memory, as tracing slows the export down
+                gc.collect()
+                tracemalloc.start()
+                export_expenses(ledger.store, path, chunk_size=chunk_size)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results["formats"][f"{file_format}/{chunk_size}"] = {**report.summary(), "peak_mb": peak / 2 ** 20}
+    return results
+
+
+def time_adds(backend, rows):
+    """Seconds per Ledger.add, then for the final flush (if any)"""
+    ledger = Ledger(backend=backend)
+    started = time.perf_counter()
+    for row in synthetic_rows(rows):
+        ledger.add(*row)
+    add_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    if isinstance(backend, WriteBehindBackend):
+        backend.flush()
+    flush_seconds = time.perf_counter() - started
+    return ledger, add_seconds / rows, flush_seconds
+
+
+def bench_writes(rows):
+    """Compare add latency with and without the write-behind queue"""
+    import tempfile
+
+    results = {"rows": rows}
+    with tempfile.TemporaryDirectory() as directory:
+        direct = SQLiteBackend(os.path.join(directory, "direct.db"))
+        _, add_seconds, _ = time_adds(direct, rows)
+        results["direct_add_ms"] = 1000 * add_seconds
+        direct.close()
+
+        queued = WriteBehindBackend(SQLiteBackend(os.path.join(directory, "queued.db")))
+        _, add_seconds, flush_seconds = time_adds(queued, rows)
+        results["queued_add_ms"] = 1000 * add_seconds
+        results["final_flush_ms"] = 1000 * flush_seconds
+        results["queue"] = queued.metrics()
+        queued.close()
+    return results
+
+
+class DiscardBackend(MemoryBackend):
+    """Persists nothing, so timings show the ledger's own cost"""
+
+    def append(self, rows):
+        pass
+
+
+def held_by_changes(rows, history, seed):
+    """Bytes still allocated after a mix of changes to a ledger of `rows` expenses, and after a reset that follows"""
+    ledger = Ledger(backend=DiscardBackend(), history=history)
+    ledger.add_many(*synthetic_columns(rows, seed))
+    changes = [
+        lambda number: ledger.add(*next(synthetic_rows(1, seed + number))),
+        lambda number: ledger.add_many(*synthetic_columns(100, seed + number)),
+        lambda number: ledger.set_budget(CATEGORIES[number % len(CATEGORIES)], 100 + number),
+        lambda number: ledger.rename_category(*(("Shopping", "Retail") if number % 8 == 3 else ("Retail", "Shopping"))),
+    ]
+    gc.collect()
+    tracemalloc.start()
+    for number in range(max(history, 20) - 1):
+        changes[number % len(changes)](number)
+    gc.collect()
+    changed = tracemalloc.get_traced_memory()[0]
+    ledger.reset()
+    gc.collect()
+    reset = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return changed, reset
+
+
+def bench_history(rows, history=20, seed=31):
+    """Time snapshots, resets and undos, and measure what `history` versions cost"""
+    results = {"rows": rows, "history": history, "seconds": {}}
+    for size in [1_000, rows]:
+        ledger = Ledger(backend=DiscardBackend(), history=history)
+        ledger.add_many(*synthetic_columns(size, seed))
+        timings = {}
+        started = time.perf_counter()
+        for _ in range(1000):
+            LedgerSnapshot(ledger)
+        timings["snapshot_us"] = (time.perf_counter() - started) / 1000 * 1e6
+        # The first add after a bulk load grows the buffers, with or without history
+        ledger.add(*next(synthetic_rows(1, seed + 2)))
+        started = time.perf_counter()
+        for row in synthetic_rows(history, seed):
+            ledger.add(*row)
+        timings["add_us"] = (time.perf_counter() - started) / history * 1e6
+        started = time.perf_counter()
+        ledger.undo()
+        timings["undo_add_us"] = (time.perf_counter() - started) * 1e6
+        started = time.perf_counter()
+        ledger.redo()
+        timings["redo_add_us"] = (time.perf_counter() - started) * 1e6
+        started = time.perf_counter()
+        ledger.reset()
+        timings["reset_us"] = (time.perf_counter() - started) * 1e6
+        started = time.perf_counter()
+        ledger.undo()
+        timings["undo_reset_us"] = (time.perf_counter() - started) * 1e6
+        # The first add on a restored version copies the columns once, instead of writing into shared buffers
+        ledger.undo()
+        started = time.perf_counter()
+        ledger.add(*next(synthetic_rows(1, seed + 1)))
+        timings["first_add_after_undo_ms"] = (time.perf_counter() - started) * 1000
+        results["seconds"][size] = timings
+
+    # Memory held by `history` versions of a large ledger, beyond what the same changes hold without history
+    held = {depth: held_by_changes(rows, depth, seed) for depth in (0, history)}
+    columns_bytes = 28 * rows
+    overhead = held[history][0] - held[0][0]
+    results["memory"] = {
+        "columns_bytes": columns_bytes,
+        "history_bytes": overhead,
+        "bytes_per_version": overhead / history,
+        "deep_copy_bytes": history * columns_bytes,
+        # What a reset leaves allocated: with history, the old buffers are kept for undo rather than freed
+        "after_reset_bytes": held[0][1],
+        "after_reset_with_history_bytes": held[history][1],
+    }
+    return results
+
+
+def bench_figures(rows):
+    """Time analysis and dashboard reruns with cold and warm figure caches (needs streamlit)"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["EXPENSE_TRACKER_DB"] = ""
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "expanse_tracker.py"),
+                            default_timeout=120)
+    app.run()
+    ledger = app.session_state.ledger
+    for batch_start in range(0, rows, 50_000):
+        batch = list(synthetic_rows(min(50_000, rows - batch_start), seed=batch_start))
+        amounts, categories, descriptions, dates, timestamps = zip(*batch)
+        ledger.add_many(amounts, categories, descriptions, [date_to_day(day) for day in dates],
+                        [datetime_to_micros(stamp) for stamp in timestamps])
+
+    results = {"rows": rows}
+    for page in ["Dashboard", "Expense Analysis"]:
+        started = time.perf_counter()
+        app.sidebar.radio[0].set_value(page).run()
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        app.run()
+        warm = time.perf_counter() - started
+        results[page] = {"cold_seconds": cold, "warm_seconds": warm}
+    results["figure_cache"] = app.session_state.figure_cache.stats()
+    return results
+
+
+def write_ledger_files(directory, ledgers, rows):
+    """Write `ledgers` SQLite ledgers of `rows` expenses each, plus one CSV export and one bad file"""
+    paths = []
+    for number in range(ledgers):
+        path = os.path.join(directory, f"ledger-{number:04d}.db")
+        backend = SQLiteBackend(path)
+        backend.append((amount, category, description, date_to_day(day), datetime_to_micros(stamp))
+                       for amount, category, description, day, stamp in synthetic_rows(rows, seed=number))
+        backend.close()
+        paths.append(path)
+    ledger = synthetic_ledger(rows, seed=ledgers)
+    export_expenses(ledger.store, os.path.join(directory, "exported.csv"))
+    with open(os.path.join(directory, "broken.jsonl"), "w") as file:
+        file.write("not json\n")
+    return paths
+
+
+def bench_reports(ledgers, rows):
+    """Generate reports for many ledgers with 1, 2, 4, ... workers up to the CPU count"""
+    import tempfile
+
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, cpus} | {2 ** power for power in range(1, cpus.bit_length()) if 2 ** power < cpus})
+    results = {"ledgers": ledgers, "rows_per_ledger": rows, "cpus": cpus, "runs": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        write_ledger_files(directory, ledgers, rows)
+        results["setup_seconds"] = time.perf_counter() - started
+        for workers in worker_counts:
+            index = generate_reports([directory], os.path.join(directory, f"reports-{workers}"), workers=workers)
+            results["runs"][workers] = {
+                "seconds": index["seconds"],
+                "ledgers_per_second": index["ledgers_per_second"],
+                "speedup": results["runs"][1]["seconds"] / index["seconds"] if workers > 1 else 1.0,
+            }
+    return results
+
+
+def bench_monitor(rows, seed=23):
+    """Time a monitor add, which stays O(1) as the ledger grows"""
+    results = {"rows": rows, "add_us": {}}
+    for size in [1_000, rows]:
+        ledger = synthetic_ledger(size)
+        started = time.perf_counter()
+        for amount, category, description, expense_date, timestamp in synthetic_rows(2000, seed=size):
+            ledger.monitor.add(amount, category, date_to_day(expense_date))
+        results["add_us"][size] = (time.perf_counter() - started) / 2000 * 1e6
+    return results
+
+
+# Cold import of the ledger, which the app and every script pay at startup
+STARTUP_BUDGET_MS = 250
+
+
+def import_time(module):
+    """Cumulative import time of `module` in microseconds, from a fresh `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    )
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nested imports are indented
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].rstrip() == f" {module}":
+            return int(fields[1])
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def bench_startup(budget_ms=STARTUP_BUDGET_MS):
+    """Report cold import times per module, and whether the ledger import is within budget"""
+    ledger_ms = import_time("ledger") / 1000
+    results = {"budget_ms": budget_ms, "ledger_ms": ledger_ms, "within_budget": ledger_ms <= budget_ms}
+    for module in ["expanse_tracker", "plotly.express", "pandas"]:
+        try:
+            results[f"{module}_ms"] = import_time(module) / 1000
+        except subprocess.CalledProcessError:
+            results[f"{module}_ms"] = None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expense tracker benchmarks")
+    parser.add_argument("benchmark", nargs="?", choices=["memory", "metrics", "rollup", "downsample", "startup", "scaling", "shared", "categories", "dates", "search", "quantiles", "fragments", "export", "writes", "figures", "reports", "monitor", "history"])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SCALING_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ledgers", type=int, default=64)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    # Every benchmark takes a while at its default size, so running the file alone only explains it
+    if args.benchmark is None:
+        parser.print_help()
+        return
+
+    if args.benchmark == "memory":
+        results = bench_memory(args.rows)
+    elif args.benchmark == "metrics":
+        results = bench_metrics(args.rows)
+    elif args.benchmark == "rollup":
+        results = bench_rollup(args.rows)
+    elif args.benchmark == "downsample":
+        results = bench_downsample(args.rows)
+    elif args.benchmark == "startup":
+        results = bench_startup(args.budget_ms)
+    elif args.benchmark == "scaling":
+        results = bench_scaling(args.sizes, args.repeat)
+    elif args.benchmark == "shared":
+        results = bench_shared()
+    elif args.benchmark == "categories":
+        results = bench_categories(args.rows)
+    elif args.benchmark == "dates":
+        results = bench_dates(args.rows)
+    elif args.benchmark == "search":
+        results = bench_search(args.rows)
+    elif args.benchmark == "quantiles":
+        results = bench_quantiles(args.rows)
+    elif args.benchmark == "fragments":
+        results = bench_fragments()
+    elif args.benchmark == "export":
+        results = bench_export(args.rows)
+    elif args.benchmark == "writes":
+        results = bench_writes(args.rows)
+    elif args.benchmark == "figures":
+        results = bench_figures(args.rows)
+    elif args.benchmark == "reports":
+        results = bench_reports(args.ledgers, args.rows)
+    elif args.benchmark == "monitor":
+        results = bench_monitor(args.rows)
+    elif args.benchmark == "history":
+        results = bench_history(args.rows)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Category registry: stable integer codes for category names
+#
+# Rows only store a code. Renaming a category changes its name in one place,
+# and merging points one code at another, so neither touches the rows.
+
+import numpy as np
+
+
+class CategoryRegistry:
+    """Names by code, with a cached sorted view and a code -> sorted-rank table
+
+    Codes are never reused or renumbered. After a merge the old code stays
+    valid and resolves to the name of the category it was merged into.
+    """
+
+    def __init__(self, names=()):
+        # names[code] is the current name of the category `code` resolves to
+        self._names = []
+        # Active code for every code: itself, or the code it was merged into
+        self._targets = []
+        self._codes = {}
+        self._sorted = None
+        self._ranks = None
+        for name in names:
+            self.code(name)
+
+    def copy(self):
+        """Return an independent copy, so a renamed or extended registry leaves snapshots alone"""
+        clone = CategoryRegistry()
+        clone._names = list(self._names)
+        clone._targets = list(self._targets)
+        clone._codes = dict(self._codes)
+        clone._sorted = self._sorted
+        clone._ranks = self._ranks
+        return clone
+
+    def agrees_with(self, other):
+        """Whether every code both registries have resolves to the same name"""
+        shared = min(len(self), len(other))
+        return self._names[:shared] == other._names[:shared]
+
+    def __len__(self):
+        """Number of codes ever assigned, the valid range for stored codes"""
+        return len(self._names)
+
+    def __getitem__(self, code):
+        return self._names[code]
+
+    def __contains__(self, name):
+        return name in self._codes
+
+    def code(self, name):
+        """Return the code for `name`, registering it if new"""
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self._names)
+            self._names.append(name)
+            self._targets.append(code)
+            self._codes[name] = code
+            self._invalidate()
+        return code
+
+    def find(self, name):
+        """Return the code for a known category, or None"""
+        return self._codes.get(name)
+
+    def codes_for(self, names):
+        """Every code, including merged ones, that resolves to one of `names`"""
+        targets = {self._codes[name] for name in names if name in self._codes}
+        return [code for code, target in enumerate(self._targets) if target in targets]
+
+    def sorted_names(self):
+        """Active category names in alphabetical order, cached until the next change"""
+        if self._sorted is None:
+            self._sorted = sorted(self._codes)
+        return self._sorted
+
+    @property
+    def ranks(self):
+        """Array mapping every code to the position of its name in sorted_names()"""
+        if self._ranks is None:
+            position = {name: index for index, name in enumerate(self.sorted_names())}
+            self._ranks = np.array([position[name] for name in self._names], dtype=np.int32)
+        return self._ranks
+
+    def to_categorical(self, codes):
+        """Return stored codes as a pandas Categorical over the sorted names"""
+        import pandas as pd
+
+        return pd.Categorical.from_codes(self.ranks[codes], categories=self.sorted_names(), validate=False)
+
+    def rename(self, old, new):
+        """Rename `old` to `new`, merging into `new` if it already exists"""
+        if old not in self._codes:
+            raise KeyError(f"Unknown category: {old}")
+        if old == new:
+            return
+        if new in self._codes:
+            self.merge(old, new)
+            return
+        code = self._codes.pop(old)
+        self._codes[new] = code
+        for other, target in enumerate(self._targets):
+            if target == code:
+                self._names[other] = new
+        self._invalidate()
+
+    def merge(self, source, target):
+        """Point every code of `source` at `target`; `source` stops being a category"""
+        if source not in self._codes:
+            raise KeyError(f"Unknown category: {source}")
+        if target not in self._codes:
+            raise KeyError(f"Unknown category: {target}")
+        if source == target:
+            return
+        source_code = self._codes.pop(source)
+        target_code = self._codes[target]
+        for other, current in enumerate(self._targets):
+            if current == source_code:
+                self._targets[other] = target_code
+                self._names[other] = target
+        self._invalidate()
+
+    def _invalidate(self):
+        self._sorted = None
+        self._ranks = None
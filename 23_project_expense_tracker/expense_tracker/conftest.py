@@ -0,0 +1,17 @@
+# Shared pytest options for the expense tracker tests
+#
+# The scaling tests time every page operation at each ledger size. They run
+# at small sizes by default; pass the full range to measure it:
+#
+#   python -m pytest -q test_scaling.py --scaling-sizes 1000 10000 100000 1000000
+
+SCALING_SIZES = [1_000, 100_000]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--scaling-sizes", type=int, nargs="+", default=SCALING_SIZES,
+                     help="Ledger sizes for the page scaling tests, smallest first")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "scaling: times page operations on ledgers of increasing size")
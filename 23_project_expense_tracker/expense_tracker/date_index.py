@@ -0,0 +1,189 @@
+# Sorted date index over the expense store
+#
+# Row numbers are kept ordered by (day, timestamp) next to a parallel array
+# of their days, so a date range is two binary searches and a slice. Rows
+# added out of date order go to a small sorted side index, with the position
+# in the main index they belong at, and are merged in once it fills. Like
+# ExpenseStore, the buffers are only ever appended to or replaced, so a view
+# handed out earlier never changes under its reader, and the views of
+# successive versions share the main buffers.
+
+import numpy as np
+
+# Back-dated rows kept aside before they are merged into the main index;
+# larger out-of-order batches re-sort the whole index
+LATE_LIMIT = 4096
+
+
+class DateIndex:
+    """Store row numbers ordered by date, then by time added"""
+
+    def __init__(self, capacity=1024):
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._rows = np.empty(self._capacity, dtype=np.int64)
+        self._days = np.empty(self._capacity, dtype=np.int32)
+        self._clear_late()
+
+    def _clear_late(self):
+        self._late_rows = np.empty(0, dtype=np.int64)
+        self._late_days = np.empty(0, dtype=np.int32)
+        self._late_stamps = np.empty(0, dtype=np.int64)
+        # Position in the main index each late row is merged in at
+        self._late_positions = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return self._size + len(self._late_rows)
+
+    def clear(self):
+        """Drop every entry, in fresh (small) buffers so earlier views stay intact"""
+        self._allocate(min(self._capacity, 1024))
+
+    def rebuild(self, days, timestamps):
+        """Index every row of the given store columns from scratch"""
+        order = np.lexsort((timestamps, days))
+        self._capacity = max(len(order), 1024)
+        self._size = len(order)
+        self._rows = np.empty(self._capacity, dtype=np.int64)
+        self._days = np.empty(self._capacity, dtype=np.int32)
+        self._rows[:self._size] = order
+        self._days[:self._size] = np.asarray(days)[order]
+        self._clear_late()
+
+    def extend(self, first_row, days, timestamps):
+        """Index the rows appended to the store from `first_row` onwards
+
+        `days` and `timestamps` are the store's full columns, already
+        including the new rows.
+        """
+        days = np.asarray(days)
+        timestamps = np.asarray(timestamps)
+        count = len(days) - first_row
+        if count <= 0:
+            return
+        batch = first_row + np.lexsort((timestamps[first_row:], days[first_row:]))
+        # Rows sorting after the last indexed row are appended; only the ones before it are back-dated
+        late = self._count_before_last(batch, days, timestamps)
+        if late > LATE_LIMIT:
+            self.rebuild(days, timestamps)
+            return
+        if late:
+            if len(self._late_rows) + late > LATE_LIMIT:
+                self._merge_late()
+            self._insert_late(batch[:late], days, timestamps)
+        if late < count:
+            self._append(batch[late:], days[batch[late:]])
+
+    def _count_before_last(self, batch, days, timestamps):
+        """How many rows of a sorted batch sort before the last row of the main index
+
+        Late rows always sort before that row too, so every other row of the
+        batch sorts after everything indexed.
+        """
+        if self._size == 0:
+            return 0
+        last = self._size - 1
+        last_day = self._days[last]
+        last_timestamp = timestamps[self._rows[last]]
+        batch_days = days[batch]
+        after = (batch_days > last_day) | ((batch_days == last_day) & (timestamps[batch] >= last_timestamp))
+        # The batch is sorted, so the rows after the last one form a suffix
+        return len(batch) - int(after.sum())
+
+    def _append(self, rows, days):
+        """Append rows that sort after everything indexed, in amortized O(k)"""
+        end = self._size + len(rows)
+        if end > self._capacity:
+            capacity = max(self._capacity * 2, end)
+            grown_rows = np.empty(capacity, dtype=np.int64)
+            grown_days = np.empty(capacity, dtype=np.int32)
+            grown_rows[:self._size] = self._rows[:self._size]
+            grown_days[:self._size] = self._days[:self._size]
+            self._rows, self._days, self._capacity = grown_rows, grown_days, capacity
+        self._rows[self._size:end] = rows
+        self._days[self._size:end] = days
+        self._size = end
+
+    def _insert_late(self, rows, days, timestamps):
+        """Add back-dated rows to the side index, in new arrays of O(late rows)"""
+        indexed_days = self._days[:self._size]
+        positions = []
+        for row in rows.tolist():
+            low = int(np.searchsorted(indexed_days, days[row], side="left"))
+            high = int(np.searchsorted(indexed_days, days[row], side="right"))
+            same_day = timestamps[self._rows[low:high]]
+            positions.append(low + int(np.searchsorted(same_day, timestamps[row], side="right")))
+        late_rows = np.concatenate([self._late_rows, rows])
+        late_days = np.concatenate([self._late_days, days[rows]])
+        late_stamps = np.concatenate([self._late_stamps, timestamps[rows]])
+        late_positions = np.concatenate([self._late_positions, np.array(positions, dtype=np.int64)])
+        # Stable, so rows with equal dates keep the order they were added in
+        order = np.lexsort((late_stamps, late_days))
+        self._late_rows = late_rows[order]
+        self._late_days = late_days[order]
+        self._late_stamps = late_stamps[order]
+        self._late_positions = late_positions[order]
+
+    def _merge_late(self):
+        """Merge the side index into the main one, in new buffers"""
+        merged_rows = np.insert(self._rows[:self._size], self._late_positions, self._late_rows)
+        merged_days = np.insert(self._days[:self._size], self._late_positions, self._late_days)
+        self._size = len(merged_rows)
+        self._capacity = max(self._size * 2, 1024)
+        self._rows = np.empty(self._capacity, dtype=np.int64)
+        self._days = np.empty(self._capacity, dtype=np.int32)
+        self._rows[:self._size] = merged_rows
+        self._days[:self._size] = merged_days
+        self._clear_late()
+
+    def view(self):
+        """Return a frozen index sharing this one's buffers, for snapshots"""
+        frozen = DateIndex.__new__(DateIndex)
+        frozen._rows = self._rows[:self._size]
+        frozen._days = self._days[:self._size]
+        # capacity == size, so the frozen index can never write into the shared buffers
+        frozen._size = frozen._capacity = self._size
+        frozen._late_rows = self._late_rows
+        frozen._late_days = self._late_days
+        frozen._late_stamps = self._late_stamps
+        frozen._late_positions = self._late_positions
+        return frozen
+
+    def day_range(self):
+        """(first day, last day) over every indexed row in O(1), or None when empty
+
+        Back-dated rows kept aside can only extend the range at its start, but
+        both ends of the side index are checked.
+        """
+        ends = []
+        if self._size:
+            ends += [int(self._days[0]), int(self._days[self._size - 1])]
+        if len(self._late_days):
+            ends += [int(self._late_days[0]), int(self._late_days[-1])]
+        return (min(ends), max(ends)) if ends else None
+
+    def ordered(self):
+        """Every row number in date order, as a read-only view"""
+        return self.between()
+
+    def between(self, start_day=None, end_day=None):
+        """Row numbers with start_day <= day <= end_day, in date order, in O(log n)
+
+        Either bound may be None for an open range. The result is a
+        read-only view into the index, or, when back-dated rows in the range
+        are kept aside, a merged copy.
+        """
+        days = self._days[:self._size]
+        low = 0 if start_day is None else int(np.searchsorted(days, start_day, side="left"))
+        high = self._size if end_day is None else int(np.searchsorted(days, end_day, side="right"))
+        rows = self._rows[low:max(low, high)]
+        if len(self._late_rows):
+            first = 0 if start_day is None else int(np.searchsorted(self._late_days, start_day, side="left"))
+            last = len(self._late_rows) if end_day is None else int(np.searchsorted(self._late_days, end_day, side="right"))
+            if first < last:
+                rows = np.insert(rows, self._late_positions[first:last] - low, self._late_rows[first:last])
+        rows.flags.writeable = False
+        return rows
@@ -0,0 +1,78 @@
+# Downsampling of long time series before they are handed to Plotly
+#
+# Both methods return the indices of the points to keep, in order, so the
+# caller can slice dates, amounts and any hover columns the same way.
+
+import numpy as np
+
+METHODS = ["lttb", "minmax"]
+
+
+def _as_float(values):
+    """Return values as float64, reading datetimes as integer ticks"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.view(np.int64)
+    return values.astype(np.float64, copy=False)
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets: keep the points that shape the line most
+
+    The first and last points are always kept. Each of the `max_points - 2`
+    buckets in between contributes the point forming the largest triangle
+    with the previously kept point and the average of the next bucket.
+    """
+    x, y = _as_float(x), _as_float(y)
+    size = len(y)
+    if max_points >= size or max_points < 3:
+        return np.arange(size)
+
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.int64)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = y[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        keep[bucket + 1] = previous
+    return keep
+
+
+def minmax(y, max_points):
+    """Keep the smallest and largest value of each bucket
+
+    Guarantees that every local extreme at bucket resolution survives, which
+    matters more than line shape for spotting unusual expenses.
+    """
+    y = _as_float(y)
+    size = len(y)
+    if max_points >= size or max_points < 4:
+        return np.arange(size)
+
+    buckets = (max_points - 2) // 2
+    starts = np.linspace(1, size - 1, buckets + 1).astype(np.int64)
+    keep = [0, size - 1]
+    for start, end in zip(starts[:-1], starts[1:]):
+        if end > start:
+            keep.append(start + int(y[start:end].argmin()))
+            keep.append(start + int(y[start:end].argmax()))
+    return np.unique(keep)
+
+
+def downsample(x, y, max_points, method="lttb"):
+    """Return the indices of at most `max_points` points that represent (x, y)"""
+    if method == "lttb":
+        return lttb(x, y, max_points)
+    if method == "minmax":
+        return minmax(y, max_points)
+    raise ValueError(f"Unknown downsampling method: {method}")
@@ -1,27 +1,86 @@
 # working script rest of code is commented 
 
+import os
 import streamlit as st
-import plotly.express as px
-from datetime import datetime, date
-import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from datetime import datetime, date, timedelta
+import numpy as np
 from collections import defaultdict
+from downsample import METHODS, downsample
+from expense_query import SORT_KEYS, page_count, page_rows, select_rows
+from expense_store import date_to_day, day_to_date
+from exporter import EXTENSIONS, MIME_TYPES, ExportFile
+from fragments import FragmentState, fragment
+from figure_cache import FigureCache
+from frame_cache import FrameCache
+from importer import import_expenses
+from ledger import Ledger, SharedLedger
+from profiling import Profiler
+from rollup import PERIODS
+from storage import MemoryBackend, open_backend
+from write_behind import WriteBehindBackend
+
+# plotly.express and pandas are imported inside the pages that draw charts or
+# tables, so a cold start (and importing this module) only pays for Streamlit.
+
+# Set EXPENSE_TRACKER_DB to an empty string to keep the ledger in memory only
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expenses.db")
+
+
+@st.cache_resource
+def get_backend():
+    """Open the storage backend once per process and share it between sessions
+
+    A persistent backend sits behind a write-behind queue, so adding an
+    expense never waits on the disk.
+    """
+    backend = open_backend(os.environ.get("EXPENSE_TRACKER_DB", DEFAULT_DB_PATH))
+    if isinstance(backend, MemoryBackend):
+        return backend
+    return WriteBehindBackend(backend)
+
+
+def current_session():
+    """Id of the Streamlit session running this script, or None outside one"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+@st.cache_resource
+def get_shared_ledger():
+    """Load the ledger once per process; every session reads and writes this copy
+
+    Undo and redo only ever act on the calling session's own last change.
+    """
+    return SharedLedger(Ledger(backend=get_backend()), session=current_session)
+
 
 class ExpenseManager:
-    def __init__(self):
+    def __init__(self, backend=None, ledger=None):
+        self.backend = backend
+        self.ledger = ledger
         self.initialize_session_state()
         self.setup_page_config()
         self.apply_custom_css()
     
     def initialize_session_state(self):
         """Initialize all session state variables"""
-        if "expenses" not in st.session_state:
-            st.session_state.expenses = []
-        if "categories" not in st.session_state:
-            st.session_state.categories = set(["Food", "Transport", "Entertainment", "Bills", "Shopping", "Others"])
+        if "ledger" not in st.session_state:
+            # Sessions share the process-wide ledger when given one, otherwise
+            # they bulk-load their own; afterwards reads never hit the backend
+            st.session_state.ledger = self.ledger if self.ledger is not None else Ledger(backend=self.backend)
+        if "frame_cache" not in st.session_state:
+            st.session_state.frame_cache = FrameCache()
+        if "figure_cache" not in st.session_state:
+            st.session_state.figure_cache = FigureCache()
         if "reset_state" not in st.session_state:
             st.session_state.reset_state = False
         if "current_page" not in st.session_state:
             st.session_state.current_page = "Dashboard"
+        if "profiler" not in st.session_state:
+            st.session_state.profiler = Profiler()
+        if "fragments" not in st.session_state:
+            st.session_state.fragments = FragmentState()
 
     def setup_page_config(self):
         """Configure Streamlit page settings"""
@@ -84,33 +143,157 @@ class ExpenseManager:
     def add_expense(self, amount, category, description, expense_date):
         """Add a new expense with validation"""
         try:
-            expense = {
-                "amount": float(amount),
-                "category": str(category),
-                "description": str(description),
-                "date": expense_date,
-                "timestamp": datetime.now()
-            }
-            st.session_state.expenses.append(expense)
+            # Outliers and budget breaches are known as soon as the expense is in
+            st.session_state.new_alerts = st.session_state.ledger.add(
+                amount=float(amount),
+                category=str(category),
+                description=str(description),
+                expense_date=expense_date,
+                timestamp=datetime.now()
+            )
             return True
         except Exception as e:
             st.error(f"Error adding expense: {str(e)}")
             return False
 
+    def data_version(self, name):
+        """Version of a piece of data a fragment can depend on"""
+        if name == "ledger":
+            return st.session_state.ledger.version
+        raise ValueError(f"Unknown fragment dependency: {name}")
+
+    def memo(self, key, builder):
+        """Value computed by `builder`, kept until the current fragment's data changes"""
+        return st.session_state.fragments.memo(key, builder)
+
+    def flash(self, message, balloons=False):
+        """Show a success message after the full rerun a data change triggers"""
+        st.session_state.flash = (message, balloons)
+        st.rerun()
+
+    def render_flash(self):
+        """Show the message left by flash(), once"""
+        if "flash" in st.session_state:
+            message, balloons = st.session_state.pop("flash")
+            st.success(message)
+            if balloons:
+                st.balloons()
+        for alert in st.session_state.pop("new_alerts", []):
+            st.warning(alert.message, icon="🚨")
+
     def get_expense_metrics(self):
         """Calculate expense metrics safely"""
         try:
-            if not st.session_state.expenses:
-                return 0, 0, 0
-            
-            total = sum(float(expense["amount"]) for expense in st.session_state.expenses)
-            avg = total / len(st.session_state.expenses) if st.session_state.expenses else 0
-            max_expense = max(float(expense["amount"]) for expense in st.session_state.expenses)
-            return total, avg, max_expense
+            # Running aggregates are maintained on add/reset, so this is O(1)
+            return st.session_state.ledger.metrics()
         except Exception as e:
             st.error(f"Error calculating metrics: {str(e)}")
             return 0, 0, 0
 
+    def get_frame(self, name):
+        """Return a derived DataFrame, built at most once per ledger version"""
+        builders = {
+            "by_category": self.build_category_frame,
+            "box": self.build_box_frame,
+            "percentiles": self.build_percentile_frame,
+        }
+        return st.session_state.frame_cache.get(name, st.session_state.ledger.version, builders[name])
+
+    def build_page_frame(self, rows, store):
+        """Format only the given rows for the View Expenses table"""
+        df = store.take(rows).to_frame()
+
+        # Format date for better readability
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+
+        # Rename columns for display
+        return df.rename(columns={
+            'amount': 'Amount ($)',
+            'category': 'Category',
+            'description': 'Description',
+            'date': 'Date'
+        })
+
+    def build_category_frame(self):
+        """Total amount per category, summed from the category × day rollup"""
+        return st.session_state.ledger.rollup.category_frame()
+
+    def build_box_frame(self):
+        """Quartiles and whiskers per category from the quantile sketches"""
+        return st.session_state.ledger.sketches.box_frame()
+
+    def build_percentile_frame(self):
+        """p50/p90/p99 per category from the quantile sketches"""
+        return st.session_state.ledger.sketches.percentile_frame()
+
+    def get_trend_frame(self, period):
+        """Total amount per day, week, month or year from the rollup"""
+        return st.session_state.frame_cache.get(("trend", period), st.session_state.ledger.version,
+                                                lambda: st.session_state.ledger.rollup.trend_frame(period))
+
+    def get_trend_points(self, period, start_date, end_date, max_points, method):
+        """Trend series for a date range, reduced to at most `max_points` points"""
+        params = (period, start_date, end_date, max_points, method)
+        return st.session_state.frame_cache.get(("trend_points", params), st.session_state.ledger.version,
+                                                lambda: self.build_trend_points(*params))
+
+    def build_trend_points(self, period, start_date, end_date, max_points, method):
+        """Select the trend rows in range, then keep only the points that shape the line"""
+        import pandas as pd
+
+        if period == "expense":
+            ledger = st.session_state.ledger.snapshot()
+            store = ledger.store
+            rows = select_rows(store, start_date=start_date, end_date=end_date, sort_by="date",
+                               date_index=ledger.date_index)
+            # Rows are in date order, so their position is an evenly spaced x axis
+            keep = rows[downsample(np.arange(len(rows)), store.column("amount")[rows], max_points, method)]
+            return store.take(keep).to_frame()[["date", "amount", "category", "description"]]
+
+        trend = self.get_trend_frame(period)
+        trend = trend[(trend["date"] >= pd.Timestamp(start_date)) & (trend["date"] <= pd.Timestamp(end_date))]
+        keep = downsample(trend["date"].to_numpy(), trend["amount"].to_numpy(), max_points, method)
+        return trend.iloc[keep]
+
+    def get_figure(self, chart, params, builder):
+        """Return a chart, drawn at most once per ledger version and set of parameters"""
+        return st.session_state.figure_cache.get(chart, st.session_state.ledger.version, params, builder)
+
+    def build_pie_figure(self):
+        """Share of each category in the total"""
+        import plotly.express as px
+
+        category_totals = st.session_state.ledger.aggregates.category_totals
+        return px.pie(values=list(category_totals.values()), names=list(category_totals.keys()),
+                      title='Expenses by Category')
+
+    def build_trend_figure(self, period, start_date, end_date, max_points, method):
+        """Downsampled trend line; the number of points drawn is kept in layout.meta"""
+        import plotly.express as px
+
+        trend = self.get_trend_points(period, start_date, end_date, max_points, method)
+        fig = px.line(trend, x='date', y='amount', title='Expense Trend Over Time')
+        fig.update_layout(meta={"points": len(trend)})
+        return fig
+
+    def build_category_figure(self):
+        """Total amount per category"""
+        import plotly.express as px
+
+        return px.bar(self.get_frame("by_category"), x='category', y='amount', title='Expenses by Category')
+
+    def build_distribution_figure(self):
+        """Box plot per category, with quartiles from the sketches rather than the raw amounts"""
+        import plotly.graph_objects as go
+
+        box = self.get_frame("box")
+        fig = go.Figure(go.Box(
+            x=box['category'], q1=box['q1'], median=box['median'], q3=box['q3'],
+            lowerfence=box['lowerfence'], upperfence=box['upperfence'], name='Amount'
+        ))
+        fig.update_layout(title='Expense Distribution by Category', xaxis_title='category', yaxis_title='amount')
+        return fig
+
     def render_sidebar(self):
         """Render sidebar navigation"""
         with st.sidebar:
@@ -119,15 +302,21 @@ class ExpenseManager:
             st.session_state.current_page = st.radio("Navigation", menu, label_visibility="collapsed")
             
             st.markdown("---")
-            st.markdown("### Quick Stats")
-            total, _, _ = self.get_expense_metrics()
-            st.metric("Total Expenses", f"${total:,.2f}")
+            self.render_sidebar_stats()
 
+    @fragment("ledger")
+    def render_sidebar_stats(self):
+        """Render the quick stats, recomputed only when the ledger changes"""
+        st.markdown("### Quick Stats")
+        total, _, _ = self.memo("metrics", self.get_expense_metrics)
+        st.metric("Total Expenses", f"${total:,.2f}")
+
+    @fragment("ledger")
     def render_dashboard(self):
         """Render dashboard page"""
         st.title("📊 Expense Dashboard")
         st.markdown("Welcome to ExpenseTracker Pro! Use the navigation menu to manage your expenses.")
-        total, avg, max_exp = self.get_expense_metrics()
+        total, avg, max_exp = self.memo("metrics", self.get_expense_metrics)
         
         # Metrics
         col1, col2, col3 = st.columns(3)
@@ -143,13 +332,43 @@ class ExpenseManager:
                     </div>
                 """, unsafe_allow_html=True)
 
+        # Spending in a date range, answered from the date index
+        ledger = st.session_state.ledger.snapshot()
+        if len(ledger):
+            last_date = day_to_date(ledger.date_index.day_range()[1])
+            date_range = st.date_input("Date Range", value=(last_date - timedelta(days=29), last_date),
+                                       key="dashboard_dates")
+            start_date = date_range[0] if len(date_range) > 0 else None
+            end_date = date_range[1] if len(date_range) > 1 else start_date
+            rows = ledger.date_index.between(
+                None if start_date is None else date_to_day(start_date),
+                None if end_date is None else date_to_day(end_date)
+            )
+            amounts = ledger.store.column("amount")[rows]
+            col1, col2 = st.columns(2)
+            col1.metric("Spent in Range", f"${amounts.sum():,.2f}")
+            col2.metric("Expenses in Range", f"{len(rows):,}")
+
+            # Alerts raised as expenses were added, and this month's budgets
+            monitor = ledger.monitor
+            today = date.today()
+            budgets = monitor.budget_status(today.year, today.month)
+            if monitor.alerts or budgets:
+                st.markdown("### Alerts")
+                for alert in list(monitor.alerts)[:-6:-1]:
+                    st.warning(f"{day_to_date(alert.day):%Y-%m-%d} · {alert.message}", icon="🚨")
+                for status in budgets:
+                    st.progress(min(status["used"], 1.0),
+                                text=f"{status['category']}: ${status['spent']:,.2f} of ${status['budget']:,.2f} "
+                                     f"this month ({status['used']:.0%})")
+
         # Recent expenses and charts
         col1, col2 = st.columns([2, 1])
         
         with col1:
             st.markdown("### Recent Expenses")
-            if st.session_state.expenses:
-                for expense in reversed(st.session_state.expenses[-5:]):
+            if len(st.session_state.ledger):
+                for expense in reversed(st.session_state.ledger.store[-5:]):
                     st.markdown(f"""
                         <div class="expense-card">
                             <h3>${float(expense['amount']):,.2f}</h3>
@@ -162,21 +381,22 @@ class ExpenseManager:
                 st.info("No expenses recorded yet!")
 
         with col2:
-            if st.session_state.expenses:
-                df = pd.DataFrame(st.session_state.expenses)
-                fig = px.pie(df, values='amount', names='category', title='Expenses by Category')
-                st.plotly_chart(fig, use_container_width=True)
+            if len(st.session_state.ledger):
+                st.plotly_chart(self.get_figure("dashboard_pie", (), self.build_pie_figure),
+                                use_container_width=True)
 
+    @fragment("ledger")
     def render_add_expense(self):
         """Render add expense page"""
         st.title("➕ Add New Expense")
+        self.render_flash()
         
         with st.form("expense_form", clear_on_submit=True):
             col1, col2 = st.columns(2)
             
             with col1:
                 amount = st.number_input("Amount ($)", min_value=0.01, format="%.2f", step=0.01)
-                category = st.selectbox("Category", sorted(list(st.session_state.categories)))
+                category = st.selectbox("Category", st.session_state.ledger.store.categories.sorted_names())
             
             with col2:
                 expense_date = st.date_input("Date", value=date.today())
@@ -186,84 +406,246 @@ class ExpenseManager:
             if submitted:
                 if description:
                     if self.add_expense(amount, category, description, expense_date):
-                        st.success("✅ Expense added successfully!")
-                        st.balloons()
+                        # Full rerun, so the sidebar stats pick up the new expense
+                        self.flash("✅ Expense added successfully!", balloons=True)
                 else:
                     st.error("Please provide a description.")
 
+        # Bulk import
+        with st.expander("📥 Import Expenses from File"):
+            st.caption("CSV, Parquet or JSON Lines with columns: amount, category, description, date "
+                       "(and optionally timestamp), with ISO dates such as 2024-01-31. "
+                       "Invalid rows are skipped and listed below.")
+            uploaded = st.file_uploader("Ledger file", type=["csv", "parquet", "jsonl", "json"])
+            chunk_size = st.number_input("Rows per chunk", min_value=1_000, value=50_000, step=10_000)
+            if uploaded is not None and st.button("Import File"):
+                st.session_state.import_report = self.import_file(uploaded, int(chunk_size))
+                st.rerun()
+        if "import_report" in st.session_state:
+            self.render_import_result(st.session_state.pop("import_report"))
+
+    def import_file(self, source, chunk_size=50_000):
+        """Stream a ledger file into the current ledger"""
+        return import_expenses(st.session_state.ledger, source, chunk_size=chunk_size)
+
+    def render_import_result(self, report):
+        """Show the outcome of a bulk import"""
+        import pandas as pd
+
+        summary = report.summary()
+        st.success(f"✅ Imported {summary['rows_imported']:,} of {summary['rows_read']:,} rows "
+                   f"in {summary['seconds']:.2f}s ({summary['rows_per_second']:,.0f} rows/s)")
+        if report.error_count:
+            st.warning(f"{report.error_count:,} rows were rejected.")
+            st.dataframe(pd.DataFrame(report.errors, columns=["Row", "Problem"]), use_container_width=True)
+
+    @fragment("ledger")
     def render_view_expenses(self):
         """Render expenses in a tabular format"""
         st.title("📋 View All Expenses")
 
-        if st.session_state.expenses:
-            # Convert expense data to a DataFrame
-            df = pd.DataFrame(st.session_state.expenses)
-            
-            # Ensure the 'date' column is in datetime format
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-
-            # Format date for better readability
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-
-            # Rename columns for display
-            df = df.rename(columns={
-                'amount': 'Amount ($)',
-                'category': 'Category',
-                'description': 'Description',
-                'date': 'Date'
-            })
-
-            # Display DataFrame in a tabular format
-            st.dataframe(df, use_container_width=True)
+        # One snapshot, so the filters, the row indices and the page all agree
+        ledger = st.session_state.ledger.snapshot()
+        if len(ledger):
+            first_date, last_date = map(day_to_date, ledger.date_index.day_range())
+
+            # Search and filters, evaluated against the column store
+            query = st.text_input("🔎 Search Descriptions", placeholder="e.g. groc taxi", key="view_search")
+            with st.expander("🔍 Filter & Sort"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    date_range = st.date_input("Date Range", value=(first_date, last_date), key="view_dates")
+                    categories = st.multiselect("Categories", ledger.store.categories.sorted_names(),
+                                                key="view_categories")
+                with col2:
+                    min_amount = st.number_input("Min Amount ($)", min_value=0.0, value=0.0, step=1.0, key="view_min_amount")
+                    max_amount = st.number_input("Max Amount ($, 0 = no limit)", min_value=0.0, value=0.0, step=1.0,
+                                                 key="view_max_amount")
+                with col3:
+                    sort_by = st.selectbox("Sort By", SORT_KEYS, format_func=str.title, key="view_sort_by")
+                    descending = st.checkbox("Descending", value=True, key="view_descending")
+
+            # A date range picker returns a single date while the user is still choosing
+            start_date = date_range[0] if len(date_range) > 0 else None
+            end_date = date_range[1] if len(date_range) > 1 else start_date
+            params = (query, start_date, end_date, tuple(categories), min_amount, max_amount, sort_by, descending)
+            rows = st.session_state.frame_cache.get(("view_rows", params), ledger.version, lambda: select_rows(
+                ledger.store,
+                start_date=start_date,
+                end_date=end_date,
+                categories=categories or None,
+                min_amount=min_amount or None,
+                max_amount=max_amount or None,
+                sort_by=sort_by,
+                descending=descending,
+                date_index=ledger.date_index,
+                description_codes=ledger.search_index.match(query)
+            ))
+
+            # Pagination
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                page_size = st.selectbox("Rows per page", [25, 50, 100, 500], index=1, key="view_page_size")
+            pages = page_count(len(rows), page_size)
+            if st.session_state.get("view_page", 1) > pages:
+                st.session_state.view_page = pages
+            with col2:
+                page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1,
+                                       key="view_page")
+
+            # Only the visible page is formatted and sent to the browser
+            window = page_rows(rows, page, page_size)
+            if len(window):
+                st.dataframe(self.build_page_frame(window, ledger.store), use_container_width=True)
+                first_row = (page - 1) * page_size + 1
+                st.caption(f"Showing {first_row:,}–{first_row + len(window) - 1:,} of {len(rows):,} matching expenses")
+            else:
+                st.info("No expenses match the current filters.")
+
+            # Export of the filtered rows, written to a temporary file chunk by chunk
+            with st.expander("📤 Export Expenses"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    export_format = st.selectbox("Format", list(EXTENSIONS), format_func=str.upper, key="export_format")
+                with col2:
+                    export_chunk = st.number_input("Rows per chunk", min_value=1_000, value=50_000, step=10_000,
+                                                   key="export_chunk")
+                if st.button(f"Prepare Export ({len(rows):,} rows)"):
+                    self.prepare_export(ledger.store, rows, export_format, int(export_chunk))
+                if "export_file" in st.session_state:
+                    export = st.session_state.export_file
+                    summary = export.report.summary()
+                    st.caption(f"{summary['rows_written']:,} rows, {summary['bytes_written']:,} bytes "
+                               f"in {summary['seconds']:.2f}s ({summary['rows_per_second']:,.0f} rows/s)")
+                    # The file is only read when the download is clicked, not on every rerun
+                    st.download_button("Download", export.read, file_name=f"expenses{EXTENSIONS[export.file_format]}",
+                                       mime=MIME_TYPES[export.file_format])
         else:
             st.info("No expenses to display yet! Start adding some.")
 
+    def prepare_export(self, store, rows, file_format, chunk_size=50_000):
+        """Export rows to a temporary file, replacing the previous export of this session
+
+        The file is deleted when it is replaced, or with the session's state when the session ends.
+        """
+        if "export_file" in st.session_state:
+            st.session_state.pop("export_file").close()
+        st.session_state.export_file = ExportFile(store, file_format, rows=rows, chunk_size=chunk_size)
+
 
+    @fragment("ledger")
     def render_expense_analysis(self):
         """Render expense analysis page"""
         st.title("📈 Expense Analysis")
         st.info("Expense analysis features are coming soon!")
-        if st.session_state.expenses:
-            df = pd.DataFrame(st.session_state.expenses)
-            
-            # Time series analysis
-            fig1 = px.line(df, x='date', y='amount', title='Expense Trend Over Time')
+        ledger = st.session_state.ledger.snapshot()
+        if len(ledger):
+            # Time series analysis, downsampled to a fixed point budget
+            first_date, last_date = map(day_to_date, ledger.date_index.day_range())
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                period = st.selectbox("Group By", list(PERIODS) + ["expense"], format_func=str.title,
+                                      key="trend_period")
+            with col2:
+                # Narrowing the range re-samples at a higher resolution
+                zoom = st.date_input("Zoom", value=(first_date, last_date), key="trend_zoom")
+            with col3:
+                max_points = st.slider("Max Points", min_value=200, max_value=5000, value=2000, step=100,
+                                       key="trend_max_points")
+            with col4:
+                method = st.selectbox("Downsampling", METHODS, format_func=str.upper, key="trend_method")
+            start_date = zoom[0] if len(zoom) > 0 else first_date
+            end_date = zoom[1] if len(zoom) > 1 else last_date
+            params = (period, start_date, end_date, max_points, method)
+            fig1 = self.get_figure("trend", params, lambda: self.build_trend_figure(*params))
             st.plotly_chart(fig1, use_container_width=True)
+            st.caption(f"Showing {fig1.layout.meta['points']:,} points")
             
             # Category breakdown
             col1, col2 = st.columns(2)
             with col1:
-                fig2 = px.bar(df.groupby('category')['amount'].sum().reset_index(), 
-                             x='category', y='amount', title='Expenses by Category')
-                st.plotly_chart(fig2, use_container_width=True)
+                st.plotly_chart(self.get_figure("by_category", (), self.build_category_figure),
+                                use_container_width=True)
             
             with col2:
-                fig3 = px.box(df, x='category', y='amount', title='Expense Distribution by Category')
-                st.plotly_chart(fig3, use_container_width=True)
+                st.plotly_chart(self.get_figure("distribution", (), self.build_distribution_figure),
+                                use_container_width=True)
+
+            st.markdown("### Percentiles by Category")
+            st.dataframe(self.get_frame("percentiles"), use_container_width=True, hide_index=True)
+            st.caption(f"Estimated within ±{st.session_state.ledger.sketches.alpha:.0%} of the exact amounts.")
+
+            st.markdown("### Category Statistics")
+            st.dataframe(st.session_state.ledger.monitor.stats_records(), use_container_width=True, hide_index=True)
+            st.caption("Mean and standard deviation over all expenses, and exponentially weighted over recent ones. "
+                       "An expense more than "
+                       f"{st.session_state.ledger.monitor.threshold:g} deviations above both is flagged as it is added.")
         else:
             st.info("Add some expenses to see the analysis!")
 
+    @fragment("ledger")
     def render_settings(self):
         """Render settings page"""
         st.title("⚙️ Settings")
+        self.render_flash()
         
         # Category management
         st.subheader("Manage Categories")
         new_category = st.text_input("Add New Category")
         if st.button("Add Category"):
-            if new_category and new_category not in st.session_state.categories:
-                st.session_state.categories.add(new_category)
+            if new_category and new_category not in st.session_state.ledger.store.categories:
+                st.session_state.ledger.add_category(new_category)
                 st.success(f"Added category: {new_category}")
+
+        # Rename or merge, without rewriting the stored expenses
+        category_names = st.session_state.ledger.store.categories.sorted_names()
+        col1, col2 = st.columns(2)
+        with col1:
+            old_category = st.selectbox("Rename Category", category_names, key="rename_from")
+        with col2:
+            renamed = st.text_input("New Name (an existing name merges the two)", key="rename_to")
+        if st.button("Rename Category"):
+            if renamed and renamed != old_category:
+                merging = renamed in st.session_state.ledger.store.categories
+                st.session_state.ledger.rename_category(old_category, renamed)
+                self.flash(f"{'Merged' if merging else 'Renamed'} {old_category} into {renamed}")
         
+        # Monthly budgets, checked on every add
+        st.subheader("Monthly Budgets")
+        budgets = st.session_state.ledger.monitor.budgets
+        col1, col2 = st.columns(2)
+        with col1:
+            budget_category = st.selectbox("Category", category_names, key="budget_category")
+        with col2:
+            budget = st.number_input("Budget per Month ($, 0 removes it)", min_value=0.0, step=50.0,
+                                     value=float(budgets.get(budget_category, 0.0)), key=f"budget_{budget_category}")
+        if st.button("Set Budget"):
+            st.session_state.ledger.set_budget(budget_category, budget)
+            self.flash(f"Budget for {budget_category} set to ${budget:,.2f}" if budget
+                       else f"Removed the budget for {budget_category}")
+        if budgets:
+            st.caption(" · ".join(f"{name}: ${amount:,.2f}" for name, amount in sorted(budgets.items())))
+
         # Display categories
         st.markdown("### Existing Categories")
         categories_cols = st.columns(3)
-        for idx, category in enumerate(sorted(st.session_state.categories)):
+        for idx, category in enumerate(st.session_state.ledger.store.categories.sorted_names()):
             with categories_cols[idx % 3]:
                 st.markdown(f"""
                     <div class="category-pill">{category}</div>
                 """, unsafe_allow_html=True)
 
+        # Cache statistics
+        with st.expander("Cache Statistics"):
+            st.json(st.session_state.frame_cache.stats())
+            st.markdown("**Figures**")
+            st.json(st.session_state.figure_cache.stats())
+            st.json(st.session_state.fragments.stats())
+            if isinstance(st.session_state.ledger.backend, WriteBehindBackend):
+                st.markdown("**Write-behind queue**")
+                st.json(st.session_state.ledger.backend.metrics())
+
+    @fragment("ledger")
     def render_reset_section(self):
         """Render reset section"""
         st.markdown("---")
@@ -271,7 +653,7 @@ class ExpenseManager:
         
         with col2:
             st.markdown("### 🔄 Reset Application")
-            if st.session_state.expenses:
+            if len(st.session_state.ledger):
                 reset_col1, reset_col2 = st.columns(2)
                 with reset_col1:
                     if st.button("Reset All Records", key="reset_btn", 
@@ -281,13 +663,28 @@ class ExpenseManager:
                 if "show_reset_dialog" in st.session_state and st.session_state.show_reset_dialog:
                     with reset_col2:
                         if st.button("⚠️ Confirm Reset", key="confirm_reset"):
-                            st.session_state.expenses = []
+                            st.session_state.ledger.reset()
                             st.session_state.reset_state = True
                             st.session_state.show_reset_dialog = False
                             st.rerun()
             else:
                 st.info("✨ Ready for new process tracking! No expenses recorded yet.")
 
+            ledger = st.session_state.ledger
+            undo_label, redo_label = ledger.undo_label, ledger.redo_label
+            if undo_label or redo_label:
+                undo_col, redo_col = st.columns(2)
+                with undo_col:
+                    if st.button(f"↩️ Undo {undo_label}" if undo_label else "↩️ Undo", key="undo_btn",
+                                 disabled=undo_label is None, help="Revert your last change to the records"):
+                        ledger.undo()
+                        st.rerun()
+                with redo_col:
+                    if st.button(f"↪️ Redo {redo_label}" if redo_label else "↪️ Redo", key="redo_btn",
+                                 disabled=redo_label is None, help="Reapply the change you last undid"):
+                        ledger.redo()
+                        st.rerun()
+
         if st.session_state.reset_state:
             st.markdown("""
                 <div class='reset-message'>
@@ -307,8 +704,46 @@ class ExpenseManager:
             </div>
         """, unsafe_allow_html=True)
 
+    def enable_profiling(self):
+        """Instrument this rerun if the performance panel is switched on"""
+        profiler = st.session_state.profiler
+        if st.session_state.get("profiling_enabled", False):
+            profiler.enable()
+        else:
+            profiler.disable()
+        profiler.instrument(self, [
+            name for name in dir(self)
+            if name.startswith(("render_", "get_", "build_")) and name != "render_performance_panel"
+        ])
+        profiler.start_run()
+
+    def render_performance_panel(self):
+        """Render the optional sidebar panel with timings of the previous rerun"""
+        import pandas as pd
+
+        profiler = st.session_state.profiler
+        with st.sidebar:
+            st.markdown("---")
+            st.checkbox("⏱️ Performance Panel", key="profiling_enabled",
+                        help="Time every page render and data helper. Off by default; costs nothing when off.")
+            if not profiler.enabled:
+                return
+            last_run = profiler.last_run()
+            if last_run:
+                st.caption(f"Last rerun: {sum(call['wall_seconds'] for call in last_run if call['depth'] == 0):.3f}s")
+                frame = pd.DataFrame(last_run)
+                frame["name"] = ["· " * depth + name for depth, name in zip(frame["depth"], frame["name"])]
+                st.dataframe(frame.drop(columns="depth"), use_container_width=True, hide_index=True)
+            with st.expander("Session Totals"):
+                st.dataframe(pd.DataFrame(profiler.summary()), use_container_width=True, hide_index=True)
+            st.download_button("Export JSON", profiler.to_json(), file_name="expense_tracker_profile.json",
+                               mime="application/json")
+            if st.button("Clear Timings"):
+                profiler.reset()
+
     def run(self):
         """Main application entry point"""
+        self.enable_profiling()
         try:
             self.render_sidebar()
             
@@ -330,9 +765,12 @@ class ExpenseManager:
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
             st.exception(e)
+        finally:
+            st.session_state.profiler.finish_run()
+        self.render_performance_panel()
 
 def main():
-    app = ExpenseManager()
+    app = ExpenseManager(ledger=get_shared_ledger())
     app.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+# Server-side filtering, sorting and paging over the expense store
+#
+# Everything here works on NumPy row indices, so only the rows of the page
+# being shown are ever turned into Python objects or pandas frames.
+
+import numpy as np
+
+from expense_store import date_to_day
+
+SORT_KEYS = ["date", "amount", "category", "added"]
+
+
+def select_rows(store, start_date=None, end_date=None, categories=None,
+                min_amount=None, max_amount=None, sort_by="date", descending=False, date_index=None,
+                description_codes=None):
+    """Return the indices of matching rows, in display order
+
+    With a DateIndex the date range is a binary search and the other filters
+    only look at the rows inside it; without one every row is scanned.
+    `description_codes` (from DescriptionIndex.match) keeps only rows whose
+    description is one of them.
+    """
+    columns = store.to_numpy()
+    if date_index is not None:
+        rows = date_index.between(
+            None if start_date is None else date_to_day(start_date),
+            None if end_date is None else date_to_day(end_date)
+        )
+    else:
+        mask = np.ones(len(store), dtype=bool)
+        if start_date is not None:
+            mask &= columns["day"] >= date_to_day(start_date)
+        if end_date is not None:
+            mask &= columns["day"] <= date_to_day(end_date)
+        rows = np.flatnonzero(mask)
+
+    if categories is not None:
+        # Merged categories keep their old codes, so match every code of each name
+        rows = rows[np.isin(columns["category_code"][rows], store.categories.codes_for(categories))]
+    if description_codes is not None:
+        rows = rows[np.isin(columns["description_code"][rows], description_codes)]
+    if min_amount is not None:
+        rows = rows[columns["amount"][rows] >= min_amount]
+    if max_amount is not None:
+        rows = rows[columns["amount"][rows] <= max_amount]
+
+    if sort_by == "date":
+        # Rows from the date index are already in date order
+        order = None if date_index is not None else np.lexsort((columns["timestamp"][rows], columns["day"][rows]))
+    elif sort_by == "amount":
+        order = np.argsort(columns["amount"][rows], kind="stable")
+    elif sort_by == "category":
+        # Codes follow insertion order, so sort by each code's rank by name
+        order = np.argsort(store.categories.ranks[columns["category_code"][rows]], kind="stable")
+    elif sort_by == "added":
+        order = None if date_index is None else np.argsort(rows, kind="stable")
+    else:
+        raise ValueError(f"Unknown sort key: {sort_by}")
+
+    if order is not None:
+        rows = rows[order]
+    return rows[::-1] if descending else rows
+
+
+def page_count(total_rows, page_size):
+    """Number of pages needed to show `total_rows` (at least one)"""
+    return max(1, -(-total_rows // page_size))
+
+
+def page_rows(rows, page, page_size):
+    """Slice the row indices for a 1-based page number"""
+    start = (page - 1) * page_size
+    return rows[start:start + page_size]
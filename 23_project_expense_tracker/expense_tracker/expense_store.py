@@ -0,0 +1,224 @@
+# Columnar storage for expenses
+#
+# Instead of one dict per expense, every field lives in its own typed NumPy
+# array. Categories (via a CategoryRegistry) and descriptions are interned
+# into lookup tables so each row only stores small integer codes.
+
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from categories import CategoryRegistry
+
+EPOCH_DATE = date(1970, 1, 1)
+EPOCH_DATETIME = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+COLUMNS = {
+    "amount": np.float64,
+    "category_code": np.int32,
+    "description_code": np.int32,
+    "day": np.int32,
+    "timestamp": np.int64,
+}
+
+
+def date_to_day(value):
+    """Convert a date (or datetime) to a day number counted from 1970-01-01"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_DATE.toordinal()
+
+
+def day_to_date(day):
+    """Convert a day number back to a date"""
+    return date.fromordinal(int(day) + EPOCH_DATE.toordinal())
+
+
+def datetime_to_micros(value):
+    """Convert a naive datetime to microseconds since the epoch"""
+    return (value - EPOCH_DATETIME) // ONE_MICROSECOND
+
+
+def micros_to_datetime(micros):
+    """Convert microseconds since the epoch back to a naive datetime"""
+    return EPOCH_DATETIME + timedelta(microseconds=int(micros))
+
+
+class ExpenseStore:
+    """Append-only expense ledger stored as typed column arrays"""
+
+    def __init__(self, capacity=1024):
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._columns = {name: np.empty(self._capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.categories = CategoryRegistry()
+        self.descriptions = []
+        self._description_codes = {}
+        # Shared by every view and grown copy of this store until clear()
+        self._lineage = object()
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self.record(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._slice(key)
+        index = int(key)
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("expense index out of range")
+        return self.record(index)
+
+    def _slice(self, key):
+        """Return a new store whose columns are views into this one"""
+        view = ExpenseStore.__new__(ExpenseStore)
+        view._columns = {name: column[:self._size][key] for name, column in self._columns.items()}
+        view._size = len(view._columns["amount"])
+        # capacity == size, so the first append on a view reallocates instead of
+        # writing into the parent's buffers
+        view._capacity = view._size
+        # Lookup tables are append-only, so sharing them keeps codes valid
+        view.categories = self.categories
+        view.descriptions = self.descriptions
+        view._description_codes = self._description_codes
+        view._lineage = self._lineage
+        return view
+
+    def take(self, indices):
+        """Return a new store holding copies of the rows at `indices`"""
+        subset = self._slice(slice(None))
+        subset._columns = {name: column[indices] for name, column in subset._columns.items()}
+        subset._size = subset._capacity = len(subset._columns["amount"])
+        return subset
+
+    def _grow(self, needed):
+        """Reallocate the column arrays so they can hold `needed` rows"""
+        capacity = max(self._capacity * 2, needed)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def category_code(self, category):
+        """Return the integer code for a category, registering it if new"""
+        return self.categories.code(category)
+
+    def find_category(self, category):
+        """Return the code for a known category, or None"""
+        return self.categories.find(category)
+
+    def description_code(self, description):
+        """Return the integer code for a description, interning it if new"""
+        code = self._description_codes.get(description)
+        if code is None:
+            description = sys.intern(description)
+            code = len(self.descriptions)
+            self.descriptions.append(description)
+            self._description_codes[description] = code
+        return code
+
+    def append(self, amount, category, description, expense_date, timestamp=None):
+        """Append a single expense"""
+        if timestamp is None:
+            timestamp = datetime.now()
+        row = {
+            "amount": float(amount),
+            "category_code": self.category_code(str(category)),
+            "description_code": self.description_code(str(description)),
+            "day": date_to_day(expense_date),
+            "timestamp": datetime_to_micros(timestamp),
+        }
+        if self._size == self._capacity:
+            self._grow(self._size + 1)
+        for name, value in row.items():
+            self._columns[name][self._size] = value
+        self._size += 1
+
+    def extend_columns(self, amounts, categories, descriptions, days, timestamps):
+        """Append many expenses given as already-encoded columns
+
+        `days` are day numbers and `timestamps` epoch microseconds, as stored.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        count = len(amounts)
+        if not count:
+            return
+        needed = self._size + count
+        if needed > self._capacity:
+            self._grow(needed)
+        end = self._size + count
+        columns = self._columns
+        columns["amount"][self._size:end] = amounts
+        columns["category_code"][self._size:end] = [self.category_code(str(name)) for name in categories]
+        columns["description_code"][self._size:end] = [self.description_code(str(text)) for text in descriptions]
+        columns["day"][self._size:end] = days
+        columns["timestamp"][self._size:end] = timestamps
+        self._size = end
+
+    def clear(self):
+        """Drop all expenses, keeping the category and description tables"""
+        # Fresh, small buffers, so arrays exported before the reset are never
+        # overwritten, and a snapshot holding the old ones costs no extra memory
+        self._size = 0
+        self._capacity = min(self._capacity, 1024)
+        self._columns = {name: np.empty(self._capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._lineage = object()
+
+    def same_lineage(self, other):
+        """Whether both stores grew from the same rows since the last clear(), with codes naming the same categories
+
+        Within one ledger's history the shorter store is then a prefix of the longer.
+        """
+        return self._lineage is other._lineage and self.categories.agrees_with(other.categories)
+
+    def record(self, index):
+        """Return one expense as a dict, in the same shape the app used before"""
+        columns = self._columns
+        return {
+            "amount": float(columns["amount"][index]),
+            "category": self.categories[columns["category_code"][index]],
+            "description": self.descriptions[columns["description_code"][index]],
+            "date": day_to_date(columns["day"][index]),
+            "timestamp": micros_to_datetime(columns["timestamp"][index]),
+        }
+
+    def column(self, name):
+        """Return a read-only, zero-copy view of one column"""
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def to_numpy(self):
+        """Return every column as a read-only, zero-copy NumPy view"""
+        return {name: self.column(name) for name in COLUMNS}
+
+    def to_frame(self):
+        """Return the ledger as a pandas DataFrame
+
+        Amounts and timestamps are shared with the store, categories and
+        descriptions come out as Categoricals built on the stored codes;
+        categories are ordered by name, with merged categories combined.
+        """
+        import pandas as pd
+
+        columns = self.to_numpy()
+        return pd.DataFrame({
+            "amount": columns["amount"],
+            "category": self.categories.to_categorical(columns["category_code"]),
+            "description": pd.Categorical.from_codes(columns["description_code"], categories=self.descriptions, validate=False),
+            "date": columns["day"].astype("datetime64[D]").astype("datetime64[s]"),
+            "timestamp": columns["timestamp"].view("datetime64[us]"),
+        }, copy=False)
+
+    @property
+    def nbytes(self):
+        """Bytes used by the allocated column buffers"""
+        return sum(column.nbytes for column in self._columns.values())
@@ -0,0 +1,153 @@
+# Streaming export of the expense ledger to CSV, Parquet or JSON Lines
+#
+# Rows are written in chunks straight from the column store, so only one
+# chunk is ever turned into a DataFrame. The files use the same columns the
+# importer reads, so an export can be imported again unchanged.
+
+import os
+import tempfile
+import time
+import weakref
+
+import numpy as np
+
+from importer import detect_format
+
+EXPORT_COLUMNS = ["amount", "category", "description", "date", "timestamp"]
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "jsonl": ".jsonl"}
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet", "jsonl": "application/x-ndjson"}
+
+
+class ExportReport:
+    """Outcome of one export: rows and bytes written, and timing"""
+
+    def __init__(self):
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_written / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return {
+            "rows_written": self.rows_written,
+            "bytes_written": self.bytes_written,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def iter_chunks(store, rows=None, chunk_size=50_000):
+    """Yield DataFrames of at most `chunk_size` rows, in the order of `rows` (default: all)"""
+    if rows is None:
+        rows = np.arange(len(store))
+    for start in range(0, len(rows), chunk_size):
+        frame = store.take(rows[start:start + chunk_size]).to_frame()
+        # Plain strings and ISO dates, as the importer expects
+        frame["category"] = frame["category"].astype(str)
+        frame["description"] = frame["description"].astype(str)
+        frame["date"] = frame["date"].dt.strftime("%Y-%m-%d")
+        yield frame[EXPORT_COLUMNS]
+
+
+class _CountingWriter:
+    """Binary file wrapper that counts the bytes written through it"""
+
+    closed = False
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.count += len(data)
+        return self.file.write(data)
+
+    def tell(self):
+        return self.count
+
+    def flush(self):
+        self.file.flush()
+
+
+def export_expenses(store, destination, file_format=None, rows=None, chunk_size=50_000):
+    """Stream the rows of `store` (or just `rows`, in that order) to `destination`
+
+    `destination` may be a path or a binary file object; when `file_format`
+    is not given it is taken from the file name. Returns an ExportReport.
+    """
+    if file_format is None:
+        file_format = detect_format(getattr(destination, "name", destination))
+    if file_format not in EXTENSIONS:
+        raise ValueError(f"Unknown file format: {file_format}")
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "wb") as file:
+            return export_expenses(store, file, file_format, rows, chunk_size)
+
+    report = ExportReport()
+    writer = _CountingWriter(destination)
+    started = time.perf_counter()
+    if file_format == "parquet":
+        _write_parquet(store, writer, rows, chunk_size, report)
+    else:
+        for index, chunk in enumerate(iter_chunks(store, rows, chunk_size)):
+            if file_format == "csv":
+                writer.write(chunk.to_csv(index=False, header=index == 0))
+            else:
+                writer.write(chunk.to_json(orient="records", lines=True, date_format="iso", date_unit="us"))
+            report.rows_written += len(chunk)
+    report.bytes_written = writer.count
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ExportFile:
+    """An export written to a temporary file, deleted on close() or once the object is dropped
+
+    Holding it in a session's state ties the file's lifetime to the session.
+    """
+
+    def __init__(self, store, file_format, rows=None, chunk_size=50_000):
+        with tempfile.NamedTemporaryFile(suffix=EXTENSIONS[file_format], delete=False) as file:
+            self.path = file.name
+            self._remove = weakref.finalize(self, _remove_file, self.path)
+            self.report = export_expenses(store, file, file_format, rows=rows, chunk_size=chunk_size)
+        self.file_format = file_format
+
+    def read(self):
+        """The exported bytes, read only when a download asks for them"""
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def close(self):
+        self._remove()
+
+
+def _write_parquet(store, writer, rows, chunk_size, report):
+    """Write one Parquet row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+        ("date", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+    with pq.ParquetWriter(pa.PythonFile(writer, mode="w"), schema) as parquet:
+        for chunk in iter_chunks(store, rows, chunk_size):
+            parquet.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            report.rows_written += len(chunk)
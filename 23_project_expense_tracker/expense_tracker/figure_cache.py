@@ -0,0 +1,82 @@
+# Cache for Plotly figures drawn from the ledger
+#
+# Entries are keyed by (chart, ledger version, chart parameters) and hold the
+# built figure itself, so an unchanged chart is served without pandas,
+# plotly.express or rebuilding a Figure. Like FrameCache, a new ledger
+# version evicts older entries.
+
+from collections import OrderedDict, defaultdict
+
+
+class FigureCache:
+    """LRU cache of built figures, bounded by their size in bytes as JSON
+
+    Every hit returns the same Figure object, so callers must treat it as
+    read-only; st.plotly_chart only reads it.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, chart, version, params, builder):
+        """Return the figure `chart` for `version` and `params`, calling `builder()` on a miss
+
+        `params` must be hashable: the filters and options the figure depends on.
+        """
+        key = (chart, version, params)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits[chart] += 1
+            return self._entries[key][0]
+
+        self.misses[chart] += 1
+        figure = builder()
+        # Measured once, as the bytes st.plotly_chart sends for the figure
+        size = len(figure.to_json().encode("utf-8"))
+        self._discard_older_than(version)
+        self._entries[key] = (figure, size)
+        self._nbytes += size
+        self._evict()
+        return figure
+
+    def _discard_older_than(self, version):
+        """Drop figures drawn for earlier ledger versions"""
+        for key in [key for key in self._entries if key[1] < version]:
+            self._nbytes -= self._entries.pop(key)[1]
+
+    def _evict(self):
+        """Evict least recently used figures until within max_bytes"""
+        # Always keep the newest entry, even if it alone exceeds max_bytes
+        while len(self._entries) > 1 and self._nbytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._nbytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached figure, keeping the counters"""
+        self._entries.clear()
+        self._nbytes = 0
+
+    def stats(self):
+        """Return hit/miss counters, overall and per chart, and current size"""
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._nbytes,
+            "charts": {
+                chart: {"hits": self.hits[chart], "misses": self.misses[chart]}
+                for chart in sorted(set(self.hits) | set(self.misses))
+            },
+        }
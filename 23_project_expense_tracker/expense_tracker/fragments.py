@@ -0,0 +1,84 @@
+# Fragment-scoped reruns for the Streamlit app
+#
+# Each part of the page (sidebar stats, page body, reset section) is a
+# Streamlit fragment, so a widget inside it reruns only that part. A fragment
+# also declares the data it depends on; values it computes through memo()
+# are kept until one of those data versions changes, so even a full rerun
+# does not recompute them.
+#
+# A fragment rerun skips the rest of the script, so a fragment that runs
+# outside a full rerun records its own profiler run.
+
+import functools
+from collections import defaultdict
+from contextlib import nullcontext
+
+import streamlit as st
+
+
+class FragmentState:
+    """Per-session memo of values computed inside fragments"""
+
+    def __init__(self):
+        self._entries = {}
+        self._scopes = []
+        # (fragment, key) -> number of times the value was computed
+        self.builds = defaultdict(int)
+        self.renders = defaultdict(int)
+
+    def enter(self, fragment, versions):
+        self._scopes.append((fragment, versions))
+        self.renders[fragment] += 1
+
+    def exit(self):
+        self._scopes.pop()
+
+    def memo(self, key, builder):
+        """Return `builder()`, recomputed only when the current fragment's data versions change
+
+        Outside any fragment the value is computed every time.
+        """
+        if not self._scopes:
+            return builder()
+        fragment, versions = self._scopes[-1]
+        entry = self._entries.get((fragment, key))
+        if entry is None or entry[0] != versions:
+            self.builds[(fragment, key)] += 1
+            entry = (versions, builder())
+            self._entries[(fragment, key)] = entry
+        return entry[1]
+
+    def stats(self):
+        """Render and recompute counters, for the settings page and tests"""
+        return {
+            "renders": dict(self.renders),
+            "builds": {f"{fragment}.{key}": count for (fragment, key), count in self.builds.items()},
+        }
+
+
+def fragment(*dependencies):
+    """Render an ExpenseManager method as a fragment that depends on `dependencies`
+
+    Dependencies are names understood by ExpenseManager.data_version, such as
+    "ledger". The method can call self.memo() for values that only change
+    with those versions.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def render(self, *args, **kwargs):
+            state = st.session_state.fragments
+            profiler = st.session_state.get("profiler")
+            # Outside a full rerun nothing else starts or finishes a profiler run
+            own_run = profiler is not None and not profiler.in_run
+            if own_run:
+                profiler.start_run()
+            state.enter(method.__name__, tuple(self.data_version(name) for name in dependencies))
+            try:
+                with profiler.measure(method.__name__) if own_run else nullcontext():
+                    return method(self, *args, **kwargs)
+            finally:
+                state.exit()
+                if own_run:
+                    profiler.finish_run()
+        return st.fragment(render)
+    return decorate
@@ -0,0 +1,74 @@
+# Cache for DataFrames (and index arrays) derived from the ledger
+#
+# Every entry is keyed by (name, ledger version). Adding or resetting expenses
+# bumps the version, so stale frames are never served and get evicted.
+
+from collections import OrderedDict
+
+
+def frame_nbytes(frame):
+    """Approximate memory held by a DataFrame, Series or NumPy array"""
+    if hasattr(frame, "nbytes") and not hasattr(frame, "memory_usage"):
+        return int(frame.nbytes)
+    usage = frame.memory_usage(index=True, deep=False)
+    return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+
+
+class FrameCache:
+    """LRU cache of derived frames, bounded by entry count and bytes"""
+
+    def __init__(self, max_entries=16, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, name, version, builder):
+        """Return the frame `name` for `version`, building it on a miss"""
+        key = (name, version)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        self.misses += 1
+        frame = builder()
+        self._discard_older_than(version)
+        size = frame_nbytes(frame)
+        self._entries[key] = (frame, size)
+        self._nbytes += size
+        self._evict()
+        return frame
+
+    def _discard_older_than(self, version):
+        """Drop entries built for earlier ledger versions"""
+        for key in [key for key in self._entries if key[1] < version]:
+            self._nbytes -= self._entries.pop(key)[1]
+
+    def _evict(self):
+        """Evict least recently used entries until within bounds"""
+        # Always keep the newest entry, even if it alone exceeds max_bytes
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._nbytes -= size
+
+    def clear(self):
+        """Drop every cached frame, keeping the counters"""
+        self._entries.clear()
+        self._nbytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._nbytes,
+        }
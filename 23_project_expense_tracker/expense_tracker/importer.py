@@ -0,0 +1,139 @@
+# Streaming bulk import of expense ledgers from CSV, Parquet or JSON Lines
+#
+# Files are read in chunks. Each chunk is validated and coerced with
+# vectorized pandas operations, bad rows are reported without stopping the
+# import, and the good rows are appended to the ledger in one batch.
+
+import os
+import time
+
+import numpy as np
+
+REQUIRED_COLUMNS = ["amount", "category", "description", "date"]
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".jsonl": "jsonl", ".json": "jsonl", ".ndjson": "jsonl"}
+
+
+class ImportReport:
+    """Outcome of one import: counts, timing and per-row errors"""
+
+    def __init__(self, max_errors=1000):
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def add_error(self, row_number, message):
+        """Record a rejected row; only the first `max_errors` are kept"""
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((row_number, message))
+
+    def summary(self):
+        return {
+            "rows_read": self.rows_read,
+            "rows_imported": self.rows_imported,
+            "rows_rejected": self.error_count,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def detect_format(name):
+    """Guess the file format from its extension"""
+    extension = os.path.splitext(str(name))[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}', expected one of {sorted(FORMATS)}")
+    return FORMATS[extension]
+
+
+def read_chunks(source, file_format, chunk_size=50_000):
+    """Yield DataFrames of at most `chunk_size` rows from a file path or file object"""
+    import pandas as pd
+
+    if file_format == "csv":
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    elif file_format == "jsonl":
+        yield from pd.read_json(source, lines=True, chunksize=chunk_size, dtype=False)
+    elif file_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet import needs pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unknown file format: {file_format}")
+
+
+def validate_chunk(chunk, first_row, report):
+    """Coerce one chunk to ledger columns, recording rejected rows in `report`
+
+    Returns (amounts, categories, descriptions, days, timestamps) for the
+    valid rows. Dates and timestamps must be ISO 8601, as the exporter writes them.
+    """
+    import pandas as pd
+
+    missing = [name for name in REQUIRED_COLUMNS if name not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    amounts = pd.to_numeric(chunk["amount"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    # An explicit format, so every row is parsed on its own instead of by a format guessed from the first
+    dates = pd.to_datetime(chunk["date"], errors="coerce", format="ISO8601")
+    categories = chunk["category"].astype("string").str.strip()
+    descriptions = chunk["description"].astype("string").str.strip()
+    if "timestamp" in chunk.columns:
+        timestamps = pd.to_datetime(chunk["timestamp"], errors="coerce", format="ISO8601")
+    else:
+        timestamps = pd.Series(pd.Timestamp.now(), index=chunk.index)
+
+    problems = {
+        "amount is not a positive number": ~(np.isfinite(amounts) & (amounts > 0)),
+        "date is missing or invalid": dates.isna().to_numpy(),
+        "category is empty": categories.fillna("").eq("").to_numpy(),
+        "description is empty": descriptions.fillna("").eq("").to_numpy(),
+        "timestamp is invalid": timestamps.isna().to_numpy(),
+    }
+    bad = np.zeros(len(chunk), dtype=bool)
+    for mask in problems.values():
+        bad |= mask
+
+    # Only rejected rows are visited one by one
+    for position in np.flatnonzero(bad):
+        reasons = [message for message, mask in problems.items() if mask[position]]
+        report.add_error(first_row + int(position), "; ".join(reasons))
+
+    good = ~bad
+    return (
+        amounts[good],
+        categories.to_numpy(dtype=object)[good],
+        descriptions.to_numpy(dtype=object)[good],
+        dates.to_numpy(dtype="datetime64[D]")[good].astype(np.int64),
+        timestamps.to_numpy(dtype="datetime64[us]")[good].astype(np.int64),
+    )
+
+
+def import_expenses(ledger, source, file_format=None, chunk_size=50_000, max_errors=1000):
+    """Stream `source` into `ledger` chunk by chunk and return an ImportReport
+
+    `source` may be a path or a file-like object; when `file_format` is not
+    given it is taken from the file name. Row numbers in errors are 1-based
+    data rows (the CSV header is not counted).
+    """
+    if file_format is None:
+        file_format = detect_format(getattr(source, "name", source))
+    report = ImportReport(max_errors=max_errors)
+    started = time.perf_counter()
+    for chunk in read_chunks(source, file_format, chunk_size):
+        columns = validate_chunk(chunk, report.rows_read + 1, report)
+        ledger.add_many(*columns)
+        report.rows_read += len(chunk)
+        report.rows_imported += len(columns[0])
+    report.seconds = time.perf_counter() - started
+    return report
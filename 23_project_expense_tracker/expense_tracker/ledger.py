@@ -0,0 +1,483 @@
+# The expense ledger: column store plus everything derived from it
+#
+# Pure Python/NumPy, so it can be used without a Streamlit session.
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from aggregates import ExpenseAggregates
+from date_index import DateIndex
+from expense_store import date_to_day, datetime_to_micros
+from monitor import ExpenseMonitor
+from rollup import DailyRollup
+from search import DescriptionIndex
+from sketches import CategorySketches
+from storage import MemoryBackend
+
+DEFAULT_CATEGORIES = ["Food", "Transport", "Entertainment", "Bills", "Shopping", "Others"]
+# Changes that can be undone
+DEFAULT_HISTORY = 20
+
+
+class Ledger:
+    """Single entry point for adding and clearing expenses
+
+    Reads are served from the in-memory store; the backend only receives
+    writes, plus one bulk load when the ledger is created. `version` changes
+    on every add and reset so caches of derived data know when to rebuild.
+
+    Snapshots share the ledger's objects instead of copying them; the ledger
+    copies an object on its next write (the derived ones share per-category
+    parts, and the store only ever appends), so a snapshot costs O(1). The
+    last `history` changes can be undone and redone: a single add keeps just
+    the values it replaced, so it stays O(1), and other changes keep a
+    snapshot of the state before them. Each change is tagged with `owner`,
+    the session making it when the ledger is shared.
+    """
+
+    def __init__(self, backend=None, store=None, history=DEFAULT_HISTORY):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.store = store if store is not None else self.backend.load()
+        for name in DEFAULT_CATEGORIES:
+            self.store.category_code(name)
+        self.version = 0
+        self.aggregates = ExpenseAggregates()
+        self.aggregates.add_many(
+            self.store.column("amount"), self.store.column("category_code"), self.store.categories
+        )
+        self.rollup = DailyRollup()
+        self.rollup.add_many(
+            self.store.column("amount"), self.store.column("category_code"), self.store.column("day"),
+            self.store.categories
+        )
+        self.sketches = CategorySketches()
+        self.sketches.add_many(self.store.column("amount"), self.store.column("category_code"), self.store.categories)
+        self.monitor = ExpenseMonitor()
+        self.monitor.add_many(
+            self.store.column("amount"), self.store.column("category_code"), self.store.column("day"),
+            self.store.categories
+        )
+        self.date_index = DateIndex()
+        self.date_index.rebuild(self.store.column("day"), self.store.column("timestamp"))
+        # Descriptions outlive a reset in the store's table, and so do their index entries
+        self.search_index = DescriptionIndex()
+        self.search_index.update(self.store.descriptions)
+        self._snapshot = None
+        self.owner = None
+        # Whether the derived objects, and the category registry, are also held by a snapshot
+        self._shared = False
+        self._categories_shared = False
+        # (label, snapshot or _AddStep before the change, owner), oldest first
+        self._undo = deque(maxlen=history)
+        self._redo = []
+
+    def _change(self, label, categories=False, step=None):
+        """Record an undo step for a change and take ownership of what it writes
+
+        `step` undoes the change by itself; without one the state before the
+        change is kept as a snapshot. `categories` says whether the change may
+        add or rename categories.
+        """
+        if self._undo.maxlen:
+            self._undo.append((label, step if step is not None else self.snapshot(), self.owner))
+        self._redo.clear()
+        self._own(categories)
+
+    def _own(self, categories=False):
+        """Copy whatever a snapshot still shares before writing to it"""
+        if self._shared:
+            self.aggregates = self.aggregates.copy()
+            self.rollup = self.rollup.copy()
+            self.sketches = self.sketches.copy()
+            self.monitor = self.monitor.copy()
+            self._shared = False
+        if categories and self._categories_shared:
+            # Snapshots hold their own view of the store, but share its registry
+            self.store.categories = self.store.categories.copy()
+            self._categories_shared = False
+
+    def __len__(self):
+        return len(self.store)
+
+    def add(self, amount, category, description, expense_date, timestamp=None):
+        """Append an expense, persist it and update the running aggregates and rollup
+
+        Returns the anomaly and budget alerts the expense raised.
+        """
+        amount = float(amount)
+        category = str(category)
+        description = str(description)
+        if timestamp is None:
+            timestamp = datetime.now()
+        day = date_to_day(expense_date)
+        known = category in self.store.categories
+        step = _AddStep(self, amount, category, day) if known and self._undo.maxlen else None
+        self._change("add expense", categories=not known, step=step)
+        self.store.append(amount, category, description, expense_date, timestamp)
+        self.aggregates.add(amount, category)
+        self.rollup.add(amount, category, expense_date)
+        self.sketches.add(amount, category)
+        alerts = self.monitor.add(amount, category, day)
+        self.date_index.extend(len(self.store) - 1, self.store.column("day"), self.store.column("timestamp"))
+        self.search_index.update(self.store.descriptions)
+        self.version += 1
+        self.backend.append([(amount, category, description, day, datetime_to_micros(timestamp))])
+        return alerts
+
+    def add_many(self, amounts, categories, descriptions, days, timestamps):
+        """Append a batch of already-validated, encoded expenses
+
+        `days` are day numbers and `timestamps` epoch microseconds, as in
+        ExpenseStore.extend_columns.
+        """
+        if not len(amounts):
+            return
+        self._change(f"add {len(amounts):,} expenses", categories=True)
+        start = len(self.store)
+        self.store.extend_columns(amounts, categories, descriptions, days, timestamps)
+        self.aggregates.add_many(
+            self.store.column("amount")[start:], self.store.column("category_code")[start:], self.store.categories
+        )
+        self.rollup.add_many(
+            self.store.column("amount")[start:], self.store.column("category_code")[start:],
+            self.store.column("day")[start:], self.store.categories
+        )
+        self.sketches.add_many(
+            self.store.column("amount")[start:], self.store.column("category_code")[start:], self.store.categories
+        )
+        self.monitor.add_many(
+            self.store.column("amount")[start:], self.store.column("category_code")[start:],
+            self.store.column("day")[start:], self.store.categories
+        )
+        self.date_index.extend(start, self.store.column("day"), self.store.column("timestamp"))
+        self.search_index.update(self.store.descriptions)
+        self.version += 1
+        self.backend.append(zip(
+            self.store.column("amount")[start:].tolist(),
+            [str(name) for name in categories],
+            [str(text) for text in descriptions],
+            self.store.column("day")[start:].tolist(),
+            self.store.column("timestamp")[start:].tolist()
+        ))
+
+    def add_category(self, name):
+        """Register a category that has no expenses yet"""
+        if name not in self.store.categories:
+            self._change(f"add category {name}", categories=True)
+            self.store.category_code(name)
+            self.version += 1
+
+    def rename_category(self, old, new):
+        """Rename a category, merging it into `new` if that already exists
+
+        Rows keep their codes; only the registry, the aggregates, the rollup,
+        the sketches, the monitor and the persisted rows change.
+        """
+        if old not in self.store.categories:
+            raise KeyError(f"Unknown category: {old}")
+        self._change(f"rename {old} to {new}", categories=True)
+        self.store.categories.rename(old, new)
+        self.aggregates.rename_category(old, new)
+        self.rollup.rename_category(old, new)
+        self.sketches.rename_category(old, new)
+        self.monitor.rename_category(old, new)
+        self.version += 1
+        self.backend.rename_category(old, new)
+
+    def set_budget(self, category, amount):
+        """Set the monthly budget of a category (0 removes it)"""
+        self._change(f"budget of {category}")
+        self.monitor.set_budget(category, amount)
+        self.version += 1
+
+    def reset(self):
+        """Remove every expense, in O(1): the rows stay reachable from the undo history"""
+        self._change("reset")
+        self.store.clear()
+        self.aggregates.reset()
+        self.rollup.reset()
+        self.sketches.reset()
+        self.monitor.reset()
+        self.date_index.clear()
+        self.version += 1
+        self.backend.clear()
+
+    def metrics(self):
+        """Return (total, average, max) in constant time"""
+        return self.aggregates.metrics()
+
+    def snapshot(self):
+        """Return a read-only LedgerSnapshot of the current state, in O(1)"""
+        if self._snapshot is None or self._snapshot.version != self.version:
+            self._snapshot = LedgerSnapshot(self)
+            self._shared = self._categories_shared = True
+        return self._snapshot
+
+    @property
+    def undo_label(self):
+        """What undo() would revert, or None"""
+        return self.undo_label_for()
+
+    @property
+    def redo_label(self):
+        """What redo() would reapply, or None"""
+        return self.redo_label_for()
+
+    def undo_label_for(self, owner=None):
+        """What undo(owner) would revert, or None"""
+        return _label(self._undo, owner)
+
+    def redo_label_for(self, owner=None):
+        """What redo(owner) would reapply, or None"""
+        return _label(self._redo, owner)
+
+    def undo(self, owner=None):
+        """Revert the last change; returns False if there is nothing to undo
+
+        Given an `owner`, the last change is only reverted if that owner made it.
+        """
+        if _label(self._undo, owner) is None:
+            return False
+        label, state, made_by = self._undo.pop()
+        self._redo.append((label, self.snapshot(), made_by))
+        if isinstance(state, _AddStep):
+            self._rewind(state)
+        else:
+            self._restore(state)
+        return True
+
+    def redo(self, owner=None):
+        """Reapply the last undone change; returns False if there is nothing to redo
+
+        Given an `owner`, the change is only reapplied if that owner undid it.
+        """
+        if _label(self._redo, owner) is None:
+            return False
+        label, state, made_by = self._redo.pop()
+        self._undo.append((label, self.snapshot(), made_by))
+        self._restore(state)
+        return True
+
+    def _rewind(self, step):
+        """Undo a single add from the values it replaced"""
+        self._own()
+        # A new view: the rows after it are still held by the redo snapshot
+        self.store = self.store[:step.length]
+        self.date_index = step.date_index
+        self.aggregates.undo_add(step.aggregates)
+        self.rollup.undo_add(step.rollup)
+        self.sketches.undo_add(step.sketches, step.amount)
+        self.monitor.undo_add(step.monitor)
+        self.version += 1
+        self.backend.truncate(step.length)
+
+    def _restore(self, state):
+        """Make a snapshot's state current again under a new version, and bring the backend in line"""
+        current = self.store
+        # New view objects: they reallocate on their first write, so `state` stays intact
+        self.store = state.store[:]
+        self.aggregates = state.aggregates
+        self.rollup = state.rollup
+        self.sketches = state.sketches
+        self.monitor = state.monitor
+        self.date_index = state.date_index.view()
+        self._shared = self._categories_shared = True
+        self.version += 1
+        # The search index only grows, and covers every description either state has
+        if current.same_lineage(self.store):
+            if len(self.store) < len(current):
+                self.backend.truncate(len(self.store))
+            else:
+                self.backend.append(self._rows(len(current)))
+        else:
+            # Undoing a reset or a rename: the persisted rows differ throughout
+            self.backend.clear()
+            self.backend.append(self._rows(0))
+
+    def _rows(self, start, chunk_size=50_000):
+        """Rows of the store from `start` on, encoded for the backend, produced a chunk at a time"""
+        store = self.store
+        names = store.categories
+        for first in range(start, len(store), chunk_size):
+            last = first + chunk_size
+            yield from zip(
+                store.column("amount")[first:last].tolist(),
+                [names[code] for code in store.column("category_code")[first:last].tolist()],
+                [store.descriptions[code] for code in store.column("description_code")[first:last].tolist()],
+                store.column("day")[first:last].tolist(),
+                store.column("timestamp")[first:last].tolist()
+            )
+
+def _label(steps, owner):
+    """Label of the last undo or redo step, or None if there is none or `owner` did not make it"""
+    if not steps or (owner is not None and steps[-1][2] != owner):
+        return None
+    return steps[-1][0]
+
+
+class _AddStep:
+    """What a single add replaced, enough to undo it without a snapshot
+
+    Recorded before the add, from the entries it is about to change: O(1)
+    whatever the size of the ledger.
+    """
+
+    def __init__(self, ledger, amount, category, day):
+        self.amount = amount
+        self.length = len(ledger.store)
+        self.date_index = ledger.date_index.view()
+        self.aggregates = ledger.aggregates.before_add(category)
+        self.rollup = ledger.rollup.before_add(category, day)
+        self.sketches = ledger.sketches.before_add(category)
+        self.monitor = ledger.monitor.before_add(category, day)
+
+
+class LedgerSnapshot:
+    """Read-only state of a ledger at one version
+
+    The store and date index are zero-copy views (their buffers are
+    append-only and replaced rather than overwritten); aggregates, rollup,
+    sketches and monitor are the ledger's own objects, which the ledger
+    copies before it next writes to them.
+    """
+
+    def __init__(self, ledger):
+        self.version = ledger.version
+        self.store = ledger.store[:]
+        self.aggregates = ledger.aggregates
+        self.rollup = ledger.rollup
+        self.sketches = ledger.sketches
+        self.monitor = ledger.monitor
+        self.date_index = ledger.date_index.view()
+        self.search_index = ledger.search_index.view()
+
+    def __len__(self):
+        return len(self.store)
+
+    def metrics(self):
+        """Return (total, average, max) in constant time"""
+        return self.aggregates.metrics()
+
+
+class SharedLedger:
+    """One Ledger per process, shared by every Streamlit session
+
+    Writes are serialized by a lock. Reads go to an immutable LedgerSnapshot
+    that is rebuilt at most once per version, so readers never see a
+    half-applied write and never block each other.
+
+    `session` returns who is calling (a Streamlit session id, say). Changes
+    are tagged with it, and undo and redo only act on the caller's own last
+    change, never on one another session made since.
+    """
+
+    def __init__(self, ledger=None, session=None):
+        self._ledger = ledger if ledger is not None else Ledger()
+        self._lock = threading.RLock()
+        self._session = session if session is not None else (lambda: None)
+        self._snapshot = self._ledger.snapshot()
+
+    @contextmanager
+    def _writing(self):
+        """Hold the write lock, with changes tagged as the calling session's"""
+        with self._lock:
+            self._ledger.owner = self._session()
+            yield self._ledger
+
+    def snapshot(self):
+        """Return the snapshot for the current version"""
+        snapshot = self._snapshot
+        if snapshot.version == self._ledger.version:
+            return snapshot
+        with self._lock:
+            if self._snapshot.version != self._ledger.version:
+                self._snapshot = self._ledger.snapshot()
+            return self._snapshot
+
+    def add(self, amount, category, description, expense_date, timestamp=None):
+        with self._writing() as ledger:
+            return ledger.add(amount, category, description, expense_date, timestamp)
+
+    def add_many(self, amounts, categories, descriptions, days, timestamps):
+        with self._writing() as ledger:
+            ledger.add_many(amounts, categories, descriptions, days, timestamps)
+
+    def add_category(self, name):
+        with self._writing() as ledger:
+            ledger.add_category(name)
+
+    def rename_category(self, old, new):
+        with self._writing() as ledger:
+            ledger.rename_category(old, new)
+
+    def set_budget(self, category, amount):
+        with self._writing() as ledger:
+            ledger.set_budget(category, amount)
+
+    def reset(self):
+        with self._writing() as ledger:
+            ledger.reset()
+
+    def undo(self):
+        with self._writing() as ledger:
+            return ledger.undo(ledger.owner)
+
+    def redo(self):
+        with self._writing() as ledger:
+            return ledger.redo(ledger.owner)
+
+    @property
+    def undo_label(self):
+        """What undo() would revert for the calling session, or None"""
+        return self._ledger.undo_label_for(self._session())
+
+    @property
+    def redo_label(self):
+        """What redo() would reapply for the calling session, or None"""
+        return self._ledger.redo_label_for(self._session())
+
+    @property
+    def backend(self):
+        return self._ledger.backend
+
+    # Read-only access, served from the current snapshot
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    @property
+    def store(self):
+        return self.snapshot().store
+
+    @property
+    def aggregates(self):
+        return self.snapshot().aggregates
+
+    @property
+    def rollup(self):
+        return self.snapshot().rollup
+
+    @property
+    def sketches(self):
+        return self.snapshot().sketches
+
+    @property
+    def monitor(self):
+        return self.snapshot().monitor
+
+    @property
+    def date_index(self):
+        return self.snapshot().date_index
+
+    @property
+    def search_index(self):
+        return self.snapshot().search_index
+
+    def metrics(self):
+        return self.snapshot().metrics()
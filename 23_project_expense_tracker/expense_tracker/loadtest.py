@@ -0,0 +1,297 @@
+# Concurrent-session load test for the Streamlit app
+#
+# Each simulated user is a headless AppTest session of expanse_tracker.py
+# driven from its own thread, as the Streamlit server runs each session's
+# reruns on its own thread. Sessions share the process-wide ledger (seeded
+# before the run), navigate the sidebar menu, submit the add-expense form
+# and open the analysis page. No browser or network is involved.
+#
+# Run with:  python loadtest.py --sessions 1 2 4 8 16 --actions 20 --rows 100000
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expanse_tracker.py")
+PAGES = ["Dashboard", "Add Expense", "View Expenses", "Expense Analysis", "Settings"]
+# Relative weights of what a simulated user does next
+ACTIONS = {"navigate": 3, "add_expense": 2, "analysis": 1}
+# share_server_state() patches AppTest internals, which were only checked against these releases
+TESTED_STREAMLIT = ["1.65"]
+
+
+def resident_bytes():
+    """Resident set size of this process (Linux), or peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResidentPeak:
+    """Samples resident memory on a background thread and keeps the peak"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = resident_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, resident_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_bytes())
+
+
+class Session:
+    """One simulated user: an AppTest session plus the latency of each of its reruns"""
+
+    def __init__(self, seed, timeout=120):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.random = random.Random(seed)
+        self.latencies = []
+        self.errors = []
+        self.adds = 0
+
+    def rerun(self, action, element=None):
+        """Time one rerun, triggered by `element` (a widget with a pending change) or a plain run"""
+        started = time.perf_counter()
+        (element or self.app).run()
+        self.latencies.append(time.perf_counter() - started)
+        if self.app.exception:
+            self.errors.append((action, [str(error.value) for error in self.app.exception]))
+
+    def open(self, page):
+        self.rerun(f"open {page}", self.app.sidebar.radio[0].set_value(page))
+
+    def start(self):
+        self.rerun("start")
+
+    def navigate(self):
+        self.open(self.random.choice(PAGES))
+
+    def add_expense(self):
+        if self.app.session_state.current_page != "Add Expense":
+            self.open("Add Expense")
+        form = self.app
+        form.number_input[0].set_value(round(self.random.uniform(1, 200), 2))
+        form.selectbox[0].set_value(self.random.choice(form.selectbox[0].options))
+        form.date_input[0].set_value(date.today() - timedelta(days=self.random.randrange(60)))
+        form.text_area[0].set_value(self.random.choice(["Lunch", "Taxi", "Groceries", "Cinema"]))
+        errors = len(self.errors)
+        self.rerun("add_expense", form.button[0].click())
+        if len(self.errors) == errors:
+            self.adds += 1
+
+    def analysis(self):
+        self.open("Expense Analysis")
+
+    def act(self, actions):
+        """Run `actions` weighted-random actions"""
+        names, weights = list(ACTIONS), list(ACTIONS.values())
+        for name in self.random.choices(names, weights, k=actions):
+            try:
+                getattr(self, name)()
+            except Exception as error:
+                self.errors.append((name, [f"{type(error).__name__}: {error}"]))
+
+
+def share_server_state():
+    """Make concurrent AppTest sessions share one runtime and script cache, as the sessions of one server do
+
+    AppTest installs a fresh mock runtime, script cache and config override
+    around every run and removes them afterwards, which breaks sessions
+    running at the same time on other threads (and recompiles the script on
+    every rerun). Here they are installed once for the whole process.
+
+    The patch relies on private AppTest internals, so it refuses to run on a
+    Streamlit release it was not checked against.
+    """
+    import streamlit
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from unittest.mock import MagicMock
+
+    release = ".".join(streamlit.__version__.split(".")[:2])
+    if release not in TESTED_STREAMLIT:
+        raise RuntimeError(f"share_server_state() was checked against Streamlit {', '.join(TESTED_STREAMLIT)}, "
+                           f"not {streamlit.__version__}; check the AppTest internals it patches, "
+                           "then add the release to TESTED_STREAMLIT")
+    missing = [name for name in ["MediaFileManager", "MemoryMediaFileStorage", "DataframeSourceManager",
+                                 "MemoryCacheStorageManager", "BidiComponentManager", "Runtime", "ScriptCache"]
+               if not hasattr(app_test, name)]
+    if missing or not hasattr(local_script_runner, "ScriptCache") or not hasattr(Runtime, "_instance"):
+        raise RuntimeError(f"Streamlit {streamlit.__version__} no longer has the AppTest internals "
+                           f"share_server_state() patches: {missing or 'ScriptCache or Runtime._instance'}")
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    runtime.bidi_component_registry = app_test.BidiComponentManager()
+    runtime.bidi_component_registry.discover_and_register_components(start_file_watching=False)
+    Runtime._instance = runtime
+    # AppTest's own per-run install and removal now land on a throwaway subclass
+    app_test.Runtime = type("PerRunRuntime", (Runtime,), {})
+
+    shared = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared
+    # Every run's config override then restores the same value
+    config.set_option("global.appTest", True)
+
+
+def seed_ledger(rows, seed=42):
+    """Start one session so the shared ledger exists, bulk-load `rows` random expenses into it,
+    then visit every page so later measurements exclude one-off imports
+    """
+    from benchmarks import synthetic_columns
+
+    session = Session(seed)
+    session.start()
+    ledger = session.app.session_state.ledger
+    if rows and not len(ledger):
+        ledger.add_many(*synthetic_columns(rows, seed))
+    for page in PAGES:
+        session.open(page)
+    if session.errors:
+        raise RuntimeError(f"warm-up session failed: {session.errors}")
+    return ledger
+
+
+def check_level(users, ledger, rows_before):
+    """Fail unless every rerun succeeded and every session worked on the one shared ledger"""
+    errors = [error for user in users for error in user.errors]
+    if errors:
+        raise RuntimeError(f"{len(errors)} reruns failed, first ones: {errors[:5]}")
+    separate = sum(user.app.session_state.ledger is not ledger for user in users)
+    if separate:
+        raise RuntimeError(f"{separate} of {len(users)} sessions did not share the seeded ledger")
+    adds = sum(user.adds for user in users)
+    if len(ledger) != rows_before + adds:
+        raise RuntimeError(f"the shared ledger has {len(ledger) - rows_before} new expenses, "
+                           f"but the sessions added {adds}")
+
+
+def run_level(sessions, actions, ledger, seed=0):
+    """Run `sessions` concurrent users for `actions` actions each; returns latency, throughput and memory"""
+    gc.collect()
+    rows_before = len(ledger)
+    baseline = resident_bytes()
+    with ResidentPeak() as memory:
+        users = [Session(seed + number) for number in range(sessions)]
+        for user in users:
+            user.start()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=user.act, args=(actions,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+    check_level(users, ledger, rows_before)
+    # Peak rather than final RSS: freed memory is not always returned to the OS
+    resident = memory.peak - baseline
+
+    # The first rerun of each session (its start) is measured above, not here
+    latencies = np.array([latency for user in users for latency in user.latencies[1:]])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "seconds": seconds,
+        "reruns_per_second": len(latencies) / seconds if seconds else 0.0,
+        "p50_ms": 1000 * p50,
+        "p95_ms": 1000 * p95,
+        "p99_ms": 1000 * p99,
+        "start_p50_ms": 1000 * float(np.median([user.latencies[0] for user in users])),
+        "resident_mb": resident / 2 ** 20,
+        "resident_mb_per_session": resident / sessions / 2 ** 20,
+        "expenses_added": len(ledger) - rows_before,
+    }
+
+
+def load_test(levels, actions, rows, seed=0):
+    """Seed the shared ledger, then run each concurrency level in turn"""
+    os.environ.setdefault("EXPENSE_TRACKER_DB", "")
+    share_server_state()
+    ledger = seed_ledger(rows)
+    results = {"rows": len(ledger), "actions_per_session": actions, "cpus": os.cpu_count(), "levels": []}
+    for sessions in levels:
+        results["levels"].append(run_level(sessions, actions, ledger, seed))
+        gc.collect()
+    results["rows_after"] = len(ledger)
+    return results
+
+
+def load_test_isolated(levels, actions, rows):
+    """Run each level in a fresh process, so resident memory is not skewed by earlier levels"""
+    results = None
+    with tempfile.TemporaryDirectory() as directory:
+        for sessions in levels:
+            output = os.path.join(directory, f"{sessions}.json")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--sessions", str(sessions),
+                            "--actions", str(actions), "--rows", str(rows), "--output", output, "--quiet"],
+                           check=True, stderr=subprocess.DEVNULL)
+            with open(output) as file:
+                level = json.load(file)
+            if results is None:
+                results = {**level, "levels": []}
+            results["levels"].extend(level["levels"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the expense tracker with concurrent headless sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", help="Concurrent sessions at each level, e.g. 1 2 4 8 16")
+    parser.add_argument("--actions", type=int, default=20, help="Actions per session at each level")
+    parser.add_argument("--rows", type=int, default=100_000, help="Expenses to seed the shared ledger with")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run every level in this process instead of one fresh process per level")
+    parser.add_argument("--quiet", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    # A full run takes minutes, so running the file alone only explains it
+    if args.sessions is None:
+        parser.print_help()
+        return
+
+    if args.in_process or len(args.sessions) == 1:
+        results = load_test(args.sessions, args.actions, args.rows)
+    else:
+        results = load_test_isolated(args.sessions, args.actions, args.rows)
+    for level in [] if args.quiet else results["levels"]:
+        print(f"{level['sessions']:>4} sessions: {level['reruns_per_second']:7.1f} reruns/s, "
+              f"p50 {level['p50_ms']:7.1f} ms, p95 {level['p95_ms']:7.1f} ms, p99 {level['p99_ms']:7.1f} ms, "
+              f"{level['resident_mb_per_session']:6.1f} MB/session, {level['expenses_added']} expenses added")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
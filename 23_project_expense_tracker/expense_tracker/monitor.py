@@ -0,0 +1,301 @@
+# Streaming anomaly and budget checks for the expense ledger
+#
+# Every category keeps a Welford mean/variance over its whole history and an
+# exponentially weighted mean/variance of its recent expenses, so an add is
+# checked against both in O(1). Spending per category and month is kept the
+# same way, which makes a monthly budget breach a dictionary lookup instead
+# of a pass over the ledger.
+
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+from expense_store import day_to_date
+
+DEFAULT_ALPHA = 0.1
+DEFAULT_THRESHOLD = 3.0
+# Expenses a category needs before its statistics are trusted
+MIN_HISTORY = 10
+# Share of a budget at which a warning is raised before the breach
+WARN_AT = 0.8
+
+
+def day_to_month(day):
+    """Month of a day number, as (year, month)"""
+    value = day_to_date(day)
+    return value.year, value.month
+
+
+class CategoryStats:
+    """Welford and EWMA mean and variance of one category's amounts"""
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # EWMA of amounts and of squared amounts (pandas' adjust=False recurrence)
+        self.ewm_mean = 0.0
+        self.ewm_square = 0.0
+
+    def copy(self):
+        clone = CategoryStats.__new__(CategoryStats)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1), as pandas' var()"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+    @property
+    def ewm_std(self):
+        return max(self.ewm_square - self.ewm_mean ** 2, 0.0) ** 0.5
+
+    def add(self, amount):
+        """Fold one amount in, in O(1)"""
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+        if self.count == 1:
+            self.ewm_mean, self.ewm_square = amount, amount * amount
+        else:
+            self.ewm_mean += self.alpha * (amount - self.ewm_mean)
+            self.ewm_square += self.alpha * (amount * amount - self.ewm_square)
+
+    def add_many(self, amounts):
+        """Fold a batch in, in order, with the same results as adding one at a time"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not len(amounts):
+            return
+        # Chan et al.: merge the batch's mean and sum of squares into the running ones
+        count, mean = len(amounts), float(amounts.mean())
+        m2 = float(((amounts - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        # An EWMA after n steps is the old value decayed by (1 - alpha)^n plus a
+        # geometrically weighted sum of the new amounts
+        if self.count == 0:
+            self.ewm_mean, self.ewm_square = amounts[0], amounts[0] ** 2
+            amounts = amounts[1:]
+        decay = 1 - self.alpha
+        weights = self.alpha * decay ** np.arange(len(amounts) - 1, -1, -1, dtype=np.float64)
+        self.ewm_mean = float(decay ** len(amounts) * self.ewm_mean + weights @ amounts)
+        self.ewm_square = float(decay ** len(amounts) * self.ewm_square + weights @ (amounts * amounts))
+        self.count = total
+
+    def merge(self, other):
+        """Fold another category's statistics in
+
+        Welford statistics merge exactly; the EWMAs are averaged by count,
+        since the interleaving of the two histories is not known.
+        """
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.ewm_mean = (self.ewm_mean * self.count + other.ewm_mean * other.count) / total
+        self.ewm_square = (self.ewm_square * self.count + other.ewm_square * other.count) / total
+        self.count = total
+
+    def is_outlier(self, amount, threshold=DEFAULT_THRESHOLD):
+        """Whether `amount` is more than `threshold` deviations above both the long-run and the recent mean"""
+        if self.count < MIN_HISTORY:
+            return False
+        return (amount > self.mean + threshold * self.std
+                and amount > self.ewm_mean + threshold * self.ewm_std)
+
+
+class Alert:
+    """An unusual expense or a budget warning, raised as the expense is added"""
+
+    def __init__(self, kind, category, amount, day, message):
+        self.kind = kind
+        self.category = category
+        self.amount = amount
+        self.day = day
+        self.message = message
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "category": self.category,
+            "amount": self.amount,
+            "date": day_to_date(self.day),
+            "message": self.message,
+        }
+
+
+class ExpenseMonitor:
+    """Per-category statistics, monthly spending and budgets, checked on every add
+
+    A copy shares the per-category statistics with the original; either side
+    copies a category's statistics before its first write to them.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA, threshold=DEFAULT_THRESHOLD, max_alerts=50):
+        self.alpha = alpha
+        self.threshold = threshold
+        # category -> monthly budget; kept across resets
+        self.budgets = {}
+        self.alerts = deque(maxlen=max_alerts)
+        self.reset()
+
+    def reset(self):
+        """Forget all statistics and alerts, as after clearing the ledger"""
+        self.stats = {}
+        # (category, (year, month)) -> amount spent
+        self.month_spend = {}
+        # Categories whose statistics this monitor alone holds
+        self._owned = set()
+        self.alerts.clear()
+
+    def copy(self):
+        clone = ExpenseMonitor.__new__(ExpenseMonitor)
+        clone.alpha = self.alpha
+        clone.threshold = self.threshold
+        clone.budgets = dict(self.budgets)
+        clone.alerts = deque(self.alerts, maxlen=self.alerts.maxlen)
+        clone.stats = dict(self.stats)
+        clone.month_spend = dict(self.month_spend)
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def _stats(self, category):
+        """The statistics of `category`, copied first if they are shared"""
+        stats = self.stats.get(category)
+        if stats is None:
+            stats = self.stats[category] = CategoryStats(self.alpha)
+        elif category not in self._owned:
+            stats = self.stats[category] = stats.copy()
+        self._owned.add(category)
+        return stats
+
+    def add(self, amount, category, day):
+        """Check an expense against its category's history and budget, then record it
+
+        Returns the alerts it raised, which are also kept in `alerts`.
+        """
+        stats = self._stats(category)
+        raised = []
+        if stats.is_outlier(amount, self.threshold):
+            raised.append(Alert(
+                "outlier", category, amount, day,
+                f"${amount:,.2f} is unusually high for {category} "
+                f"(typically ${stats.mean:,.2f} ± ${stats.std:,.2f}, recently ${stats.ewm_mean:,.2f})"
+            ))
+        stats.add(amount)
+
+        month = day_to_month(day)
+        before = self.month_spend.get((category, month), 0.0)
+        spent = self.month_spend[(category, month)] = before + amount
+        budget = self.budgets.get(category)
+        if budget:
+            label = f"{category} in {month[0]}-{month[1]:02d}"
+            if before <= budget < spent:
+                raised.append(Alert("budget", category, amount, day,
+                                    f"{label}: ${spent:,.2f} spent, over the ${budget:,.2f} budget"))
+            elif before < WARN_AT * budget <= spent <= budget:
+                raised.append(Alert("budget_warning", category, amount, day,
+                                    f"{label}: ${spent:,.2f} spent, {spent / budget:.0%} of the ${budget:,.2f} budget"))
+        self.alerts.extend(raised)
+        return raised
+
+    def before_add(self, category, day):
+        """What add() is about to change, for undo_add()"""
+        stats = self.stats.get(category)
+        key = (category, day_to_month(day))
+        # An add raises at most two alerts, which can push out the two oldest
+        return (category, None if stats is None else stats.copy(), key, self.month_spend.get(key),
+                self.alerts[-1] if self.alerts else None, list(islice(self.alerts, 2)))
+
+    def undo_add(self, state):
+        """Put back the statistics, spending and alerts an add changed, from before_add()"""
+        category, stats, key, spent, last_alert, oldest_alerts = state
+        if stats is None:
+            del self.stats[category]
+            self._owned.discard(category)
+        else:
+            self.stats[category] = stats
+            self._owned.add(category)
+        if spent is None:
+            del self.month_spend[key]
+        else:
+            self.month_spend[key] = spent
+        while self.alerts and self.alerts[-1] is not last_alert:
+            self.alerts.pop()
+        self.alerts.extendleft(reversed([alert for alert in oldest_alerts if alert not in self.alerts]))
+
+    def add_many(self, amounts, category_codes, days, categories):
+        """Record a batch (e.g. an import) without raising alerts, one vectorized pass per category"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not len(amounts):
+            return
+        codes = np.asarray(category_codes)
+        months = np.asarray(days).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        for start, end in zip(starts.tolist(), np.r_[starts[1:], len(order)].tolist()):
+            self._stats(categories[sorted_codes[start]]).add_many(amounts[order[start:end]])
+
+        keys, inverse = np.unique(np.stack([codes, months]), axis=1, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=amounts)
+        for code, month, total in zip(keys[0].tolist(), keys[1].tolist(), sums.tolist()):
+            # datetime64[M] counts months from January 1970
+            year, month = divmod(month, 12)
+            key = (categories[code], (1970 + year, month + 1))
+            self.month_spend[key] = self.month_spend.get(key, 0.0) + total
+
+    def rename_category(self, old, new):
+        """Move statistics, spending and budget of `old` under `new`, merging with what `new` has"""
+        if old == new:
+            return
+        if old in self.stats:
+            owned = old in self._owned
+            self._owned.discard(old)
+            stats = self.stats.pop(old)
+            if new in self.stats:
+                self._stats(new).merge(stats)
+            else:
+                self.stats[new] = stats
+                if owned:
+                    self._owned.add(new)
+        for key in [key for key in self.month_spend if key[0] == old]:
+            self.month_spend[(new, key[1])] = self.month_spend.get((new, key[1]), 0.0) + self.month_spend.pop(key)
+        if old in self.budgets:
+            self.budgets.setdefault(new, self.budgets.pop(old))
+
+    def set_budget(self, category, amount):
+        """Set the monthly budget of a category; 0 or None removes it"""
+        if amount:
+            self.budgets[category] = float(amount)
+        else:
+            self.budgets.pop(category, None)
+
+    def budget_status(self, year, month):
+        """Spending against budget for every budgeted category in one month"""
+        return [
+            {"category": category, "budget": budget, "spent": self.month_spend.get((category, (year, month)), 0.0),
+             "used": self.month_spend.get((category, (year, month)), 0.0) / budget}
+            for category, budget in sorted(self.budgets.items())
+        ]
+
+    def stats_records(self):
+        """Current statistics per category, for tables"""
+        return [
+            {"category": name, "count": stats.count, "mean": stats.mean, "std": stats.std,
+             "ewm_mean": stats.ewm_mean, "ewm_std": stats.ewm_std}
+            for name, stats in sorted(self.stats.items()) if stats.count
+        ]
@@ -0,0 +1,179 @@
+# Per-call profiling for the Streamlit app
+#
+# A Profiler records wall time, CPU time of the calling thread and peak
+# allocated bytes for each instrumented call. Methods are only wrapped while
+# profiling is enabled, so a disabled profiler adds no per-call overhead at all.
+#
+# tracemalloc is process-wide while every Streamlit session has its own
+# Profiler, so tracing is reference counted across profilers and the shared
+# peak counter is only read and reset under one lock.
+
+import functools
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import defaultdict, deque
+from contextlib import nullcontext
+
+NO_PROFILING = nullcontext()
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+# Whether tracing was started here, so tracing started by someone else is never stopped
+_started_tracing = False
+# Measurements still running in any session, each keeping the highest peak seen so far
+_open_measurements = set()
+
+
+def _start_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+class Profiler:
+    """Collects timings per call name and per rerun"""
+
+    def __init__(self, history=50):
+        self.enabled = False
+        self.totals = defaultdict(lambda: {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "max_bytes": 0})
+        self.runs = deque(maxlen=history)
+        self.current_run = []
+        self.in_run = False
+        self._release_tracing = None
+        # Number of measured calls still on the stack
+        self._depth = 0
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            _start_tracing()
+            # A session can end without disabling its profiler; dropping it releases tracing too
+            self._release_tracing = weakref.finalize(self, _stop_tracing)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            self._release_tracing()
+
+    def start_run(self):
+        """Begin collecting calls for a new rerun"""
+        self.current_run = []
+        self.in_run = True
+
+    def finish_run(self):
+        """Store the calls of the rerun that just ended"""
+        if self.current_run:
+            self.runs.append(self.current_run)
+        self.current_run = []
+        self.in_run = False
+
+    def measure(self, name):
+        """Context manager timing a block; a shared no-op when disabled"""
+        if not self.enabled:
+            return NO_PROFILING
+        return _Measurement(self, name)
+
+    def wrap(self, name, function):
+        """Return `function` wrapped so every call is measured under `name`"""
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            with self.measure(name):
+                return function(*args, **kwargs)
+        return profiled
+
+    def instrument(self, obj, names):
+        """Wrap the named methods on one instance, if profiling is enabled"""
+        if not self.enabled:
+            return
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def record(self, slot, name, wall, cpu, allocated, depth):
+        """Fill the rerun slot reserved when the call started"""
+        entry = {"name": name, "depth": depth, "wall_seconds": wall, "cpu_seconds": cpu, "allocated_bytes": allocated}
+        self.current_run[slot] = entry
+        totals = self.totals[name]
+        totals["calls"] += 1
+        totals["wall_seconds"] += wall
+        totals["cpu_seconds"] += cpu
+        totals["max_bytes"] = max(totals["max_bytes"], allocated)
+
+    def last_run(self):
+        """Calls of the most recent finished rerun, in call order"""
+        return list(self.runs[-1]) if self.runs else []
+
+    def summary(self):
+        """Totals per call name, slowest first"""
+        rows = [{"name": name, **totals} for name, totals in self.totals.items()]
+        return sorted(rows, key=lambda row: row["wall_seconds"], reverse=True)
+
+    def reset(self):
+        self.totals.clear()
+        self.runs.clear()
+        self.current_run = []
+
+    def to_json(self):
+        """Everything recorded so far, for download or offline comparison"""
+        return json.dumps({"summary": self.summary(), "runs": list(self.runs)}, indent=2)
+
+
+class _Measurement:
+    """One timed call, nested correctly inside other measurements
+
+    The allocated bytes are the peak growth of traced memory while the call
+    ran. tracemalloc does not tell threads apart, so allocations made by
+    other sessions at the same time are included.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        with _tracing_lock:
+            self.tracing = tracemalloc.is_tracing()
+            if self.tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                # reset_peak() below would lose the peak of every call still running, in any session
+                for measurement in _open_measurements:
+                    measurement.peak = max(measurement.peak, peak)
+                tracemalloc.reset_peak()
+                self.start_bytes = self.peak = current
+                _open_measurements.add(self)
+        # Reserve the slot now so callers are listed before the calls they make
+        self.slot = len(self.profiler.current_run)
+        self.profiler.current_run.append(None)
+        self.depth = self.profiler._depth
+        self.profiler._depth += 1
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        allocated = 0
+        if self.tracing:
+            with _tracing_lock:
+                _open_measurements.discard(self)
+                if tracemalloc.is_tracing():
+                    self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            allocated = max(self.peak - self.start_bytes, 0)
+        self.profiler._depth -= 1
+        self.profiler.record(self.slot, self.name, wall, cpu, allocated, self.depth)
+        return False
@@ -0,0 +1,190 @@
+# Headless batch reports over many expense ledgers
+#
+# Every ledger file (a SQLite database written by the app, or a CSV, Parquet
+# or JSON Lines export) is loaded into a Ledger, so reports use the same
+# running aggregates, rollup and quantile sketches as the Streamlit pages,
+# without Streamlit. Files are fanned out over a process pool; each ledger
+# gets its own JSON summary and the run writes a combined index.json.
+#
+# Run with:  python reports.py ledgers/ --output-dir reports --workers 8
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from expense_store import day_to_date
+from importer import FORMATS, import_expenses
+from ledger import Ledger
+from sketches import PERCENTILES
+from storage import SQLiteBackend
+
+SQLITE_EXTENSIONS = {".db", ".sqlite", ".sqlite3"}
+# Files picked up from directories: plain .json is left out, as the reports themselves are .json
+LEDGER_EXTENSIONS = SQLITE_EXTENSIONS | {extension for extension in FORMATS if extension != ".json"}
+
+
+def find_ledgers(paths, skip_dir=None):
+    """Expand directories into the ledger files they contain, sorted by path
+
+    Nothing under `skip_dir` (the report output directory) is picked up.
+    Files named directly are always kept.
+    """
+    skip_dir = os.path.abspath(skip_dir) if skip_dir else None
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [name for name in dirs if os.path.abspath(os.path.join(root, name)) != skip_dir]
+                if os.path.abspath(root) == skip_dir:
+                    continue
+                found.extend(os.path.join(root, name) for name in names
+                             if os.path.splitext(name)[1].lower() in LEDGER_EXTENSIONS)
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def load_ledger(path):
+    """Load one ledger file; returns (ledger, rows rejected by the importer)"""
+    if os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        # Read-only, so reporting never changes the files it reads
+        backend = SQLiteBackend(path, read_only=True)
+        try:
+            return Ledger(backend=backend), 0
+        finally:
+            backend.close()
+    ledger = Ledger()
+    return ledger, import_expenses(ledger, path).error_count
+
+
+def build_report(ledger):
+    """Metric summary, category breakdown and monthly totals of a ledger, as plain JSON data"""
+    total, average, highest = ledger.metrics()
+    aggregates = ledger.aggregates
+    days = ledger.store.column("day")
+    categories = []
+    for name in sorted(aggregates.category_totals, key=aggregates.category_totals.get, reverse=True):
+        count = aggregates.category_counts[name]
+        if not count:
+            continue
+        sketch = ledger.sketches.sketches[name]
+        categories.append({
+            "category": name,
+            "amount": aggregates.category_totals[name],
+            "count": count,
+            "share": aggregates.category_totals[name] / total if total else 0.0,
+            **{f"p{round(q * 100)}": value for q, value in zip(PERCENTILES, sketch.quantiles(PERCENTILES))},
+        })
+    return {
+        "metrics": {
+            "count": aggregates.count,
+            "total": total,
+            "average": average,
+            "max": highest,
+            "first_date": day_to_date(days.min()).isoformat() if len(days) else None,
+            "last_date": day_to_date(days.max()).isoformat() if len(days) else None,
+        },
+        "categories": categories,
+        "monthly": [
+            {
+                "month": month,
+                "amount": sum(amount for amount, _ in by_category.values()),
+                "count": sum(count for _, count in by_category.values()),
+                "categories": {name: amount for name, (amount, _) in sorted(by_category.items())},
+            }
+            for month, by_category in ledger.rollup.month_totals().items()
+        ],
+    }
+
+
+def report_ledger(path, output_path):
+    """Write the report of one ledger to `output_path` and return its index entry
+
+    Runs in a worker process. A ledger that fails to load is recorded in its
+    entry instead of stopping the batch.
+    """
+    started = time.perf_counter()
+    entry = {"ledger": path, "report": os.path.basename(output_path)}
+    try:
+        ledger, rejected = load_ledger(path)
+        report = build_report(ledger)
+    except Exception as error:
+        entry.update(error=f"{type(error).__name__}: {error}", seconds=time.perf_counter() - started)
+        return entry
+    report["ledger"] = path
+    report["rows_rejected"] = rejected
+    with open(output_path, "w") as file:
+        json.dump(report, file, indent=2)
+    entry.update(report["metrics"], rows_rejected=rejected, error=None, seconds=time.perf_counter() - started)
+    return entry
+
+
+def report_names(paths):
+    """One distinct report file name per ledger, from its base name"""
+    names, seen = [], {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(f"{stem}.json" if seen[stem] == 1 else f"{stem}-{seen[stem]}.json")
+    return names
+
+
+def generate_reports(paths, output_dir, workers=None, chunksize=None):
+    """Report on every ledger under `paths` with `workers` processes; returns the index
+
+    `workers` defaults to the number of CPUs; 1 runs everything in this
+    process. Ledgers are handed out `chunksize` at a time (by default about
+    four chunks per worker), which keeps the per-task overhead low for many
+    small ledgers.
+    """
+    paths = find_ledgers(paths, skip_dir=output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = [os.path.join(output_dir, name) for name in report_names(paths)]
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers == 1 or len(paths) <= 1:
+        entries = list(map(report_ledger, paths, outputs))
+    else:
+        chunksize = chunksize or max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(report_ledger, paths, outputs, chunksize=chunksize))
+    seconds = time.perf_counter() - started
+
+    index = {
+        "ledgers": len(entries),
+        "failed": sum(entry["error"] is not None for entry in entries),
+        "workers": workers,
+        "seconds": seconds,
+        "ledgers_per_second": len(entries) / seconds if seconds else 0.0,
+        "total": sum(entry.get("total", 0.0) for entry in entries),
+        "count": sum(entry.get("count", 0) for entry in entries),
+        "entries": entries,
+    }
+    with open(os.path.join(output_dir, "index.json"), "w") as file:
+        json.dump(index, file, indent=2)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write expense reports for many ledgers")
+    parser.add_argument("paths", nargs="*", help="Ledger files, or directories to search for them")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Ledgers handed to a worker at a time")
+    args = parser.parse_args()
+    if not args.paths:
+        parser.print_usage()
+        return
+
+    index = generate_reports(args.paths, args.output_dir, args.workers, args.chunksize)
+    print(f"{index['ledgers']} ledgers ({index['failed']} failed) in {index['seconds']:.2f}s "
+          f"with {index['workers']} workers, {index['ledgers_per_second']:.1f} ledgers/s")
+    print(f"Index written to {os.path.join(args.output_dir, 'index.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Category × day rollup of the expense ledger
+#
+# One cell per (category, day) holding sum, count, min and max, updated on
+# every add. Charts and coarser week/month/year rollups are built from the
+# cells, so their cost depends on distinct days and categories, not rows.
+
+import numpy as np
+
+from expense_store import date_to_day
+
+PERIODS = {"day": "D", "week": "W", "month": "M", "year": "Y"}
+# Cells are grouped into blocks of this many days, the unit a copy shares
+BLOCK_DAYS = 32
+
+
+def combine(cell, total, count, low, high):
+    """A new cell folding (total, count, min, max) into `cell`, which may be None"""
+    if cell is None:
+        return total, count, low, high
+    return cell[0] + total, cell[1] + count, min(cell[2], low), max(cell[3], high)
+
+
+class DailyRollup:
+    """Sum, count, min and max of amounts per category and day
+
+    Cells are grouped by category and block of days. A copy shares every
+    block with the original until one of them writes to it, and cells are
+    replaced rather than updated in place, so a copy and the first write
+    after it cost O(blocks) and O(BLOCK_DAYS), not O(cells).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def __len__(self):
+        return sum(len(days) for days in self.cells.values())
+
+    def reset(self):
+        """Forget everything, as after clearing the ledger"""
+        # (category, day // BLOCK_DAYS) -> {day number: (total, count, min, max)}
+        self.cells = {}
+        # Blocks this rollup alone holds
+        self._owned = set()
+
+    def copy(self):
+        """Return a copy that shares each block of cells until either side writes to it"""
+        clone = DailyRollup.__new__(DailyRollup)
+        clone.cells = dict(self.cells)
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def _block(self, category, day):
+        """The block of cells holding `day` of `category`, copied first if it is shared"""
+        key = (category, day // BLOCK_DAYS)
+        days = self.cells.get(key)
+        if days is None:
+            days = self.cells[key] = {}
+        elif key not in self._owned:
+            days = self.cells[key] = dict(days)
+        self._owned.add(key)
+        return days
+
+    def add(self, amount, category, expense_date):
+        """Fold a single expense into its cell"""
+        day = date_to_day(expense_date)
+        days = self._block(category, day)
+        days[day] = combine(days.get(day), amount, 1, amount, amount)
+
+    def before_add(self, category, day):
+        """What add() is about to change, for undo_add()"""
+        return category, day, self.cells.get((category, day // BLOCK_DAYS), {}).get(day)
+
+    def undo_add(self, state):
+        """Put back the cell an add changed, from before_add()"""
+        category, day, cell = state
+        days = self._block(category, day)
+        if cell is not None:
+            days[day] = cell
+            return
+        del days[day]
+        if not days:
+            key = (category, day // BLOCK_DAYS)
+            del self.cells[key]
+            self._owned.discard(key)
+
+    def add_many(self, amounts, category_codes, days, categories):
+        """Fold a batch of expenses in, reducing each (category, day) group with NumPy
+
+        `category_codes` index into the `categories` list of names and `days`
+        are day numbers, as stored in ExpenseStore.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not len(amounts):
+            return
+        codes = np.asarray(category_codes)
+        days = np.asarray(days)
+        order = np.lexsort((days, codes))
+        codes, days, amounts = codes[order], days[order], amounts[order]
+        starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])])
+        sums = np.add.reduceat(amounts, starts)
+        counts = np.diff(np.r_[starts, len(amounts)])
+        mins = np.minimum.reduceat(amounts, starts)
+        maxes = np.maximum.reduceat(amounts, starts)
+        for code, day, total, count, low, high in zip(
+            codes[starts].tolist(), days[starts].tolist(), sums.tolist(), counts.tolist(), mins.tolist(), maxes.tolist()
+        ):
+            cells = self._block(categories[code], day)
+            cells[day] = combine(cells.get(day), total, count, low, high)
+
+    def rename_category(self, old, new):
+        """Move the cells of `old` under `new`, combining days both already have"""
+        if old == new:
+            return
+        for key in [key for key in self.cells if key[0] == old]:
+            owned = key in self._owned
+            self._owned.discard(key)
+            moved = self.cells.pop(key)
+            target = (new, key[1])
+            if target not in self.cells:
+                self.cells[target] = moved
+                if owned:
+                    self._owned.add(target)
+                continue
+            for day, cell in moved.items():
+                days = self._block(new, day)
+                days[day] = combine(days.get(day), *cell)
+
+    def _items(self):
+        """Every ((category, day), cell) pair"""
+        return [((category, day), cell) for (category, _), days in self.cells.items() for day, cell in days.items()]
+
+    def month_totals(self):
+        """Return {"YYYY-MM": {category: [total, count]}} without pandas, for headless reports"""
+        items = self._items()
+        if not items:
+            return {}
+        months = np.array([day for (_, day), _ in items], dtype="datetime64[D]").astype("datetime64[M]").astype(str)
+        totals = {}
+        for ((category, _), cell), month in zip(items, months.tolist()):
+            total = totals.setdefault(month, {}).setdefault(category, [0.0, 0])
+            total[0] += cell[0]
+            total[1] += cell[1]
+        return dict(sorted(totals.items()))
+
+    def to_frame(self, period="day"):
+        """Return one row per category and period with amount, count, min and max
+
+        `period` is one of "day", "week", "month" or "year"; weeks, months
+        and years are labelled by their first day.
+        """
+        import pandas as pd
+
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}', expected one of {list(PERIODS)}")
+        items = self._items()
+        if not items:
+            return pd.DataFrame({
+                "category": pd.Series(dtype=object),
+                "date": pd.Series(dtype="datetime64[s]"),
+                "amount": pd.Series(dtype=np.float64),
+                "count": pd.Series(dtype=np.int64),
+                "min": pd.Series(dtype=np.float64),
+                "max": pd.Series(dtype=np.float64),
+            })
+
+        values = np.array([cell for _, cell in items], dtype=np.float64)
+        df = pd.DataFrame({
+            "category": [category for (category, _), _ in items],
+            "date": np.array([day for (_, day), _ in items], dtype="datetime64[D]").astype("datetime64[s]"),
+            "amount": values[:, 0],
+            "count": values[:, 1].astype(np.int64),
+            "min": values[:, 2],
+            "max": values[:, 3],
+        })
+        if period != "day":
+            df["date"] = df["date"].dt.to_period(PERIODS[period]).dt.start_time
+            df = df.groupby(["category", "date"], as_index=False).agg(
+                amount=("amount", "sum"), count=("count", "sum"), min=("min", "min"), max=("max", "max")
+            )
+        return df.sort_values(["date", "category"], ignore_index=True)
+
+    def trend_frame(self, period="day"):
+        """Total amount and count per period across all categories"""
+        return self.to_frame(period).groupby("date", as_index=False).agg(
+            amount=("amount", "sum"), count=("count", "sum"), min=("min", "min"), max=("max", "max")
+        )
+
+    def category_frame(self):
+        """Total amount and count per category"""
+        return self.to_frame("day").groupby("category", as_index=False).agg(
+            amount=("amount", "sum"), count=("count", "sum"), min=("min", "min"), max=("max", "max")
+        )
@@ -0,0 +1,95 @@
+# Full-text search over expense descriptions
+#
+# Descriptions are already interned by ExpenseStore, so the inverted index
+# maps each token to description codes rather than rows. A query resolves to
+# a handful of codes, and rows are matched by comparing integer codes.
+
+import re
+from bisect import bisect_left, insort
+
+import numpy as np
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-cased word tokens of a description or query"""
+    return TOKEN.findall(str(text).lower())
+
+
+class DescriptionIndex:
+    """Inverted index from description tokens to description codes
+
+    Every query term matches as a prefix, so "gro" finds "Groceries". The
+    index only grows; a view limits results to the codes it had seen, which
+    keeps snapshots stable while new descriptions are added.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return self._indexed
+
+    def clear(self):
+        self._postings = {}
+        self._vocabulary = []
+        self._indexed = 0
+
+    def update(self, descriptions):
+        """Index the descriptions added to the store's table since the last update"""
+        if len(descriptions) <= self._indexed:
+            return
+        new_tokens = []
+        for code in range(self._indexed, len(descriptions)):
+            for token in set(tokenize(descriptions[code])):
+                postings = self._postings.get(token)
+                if postings is None:
+                    self._postings[token] = [code]
+                    new_tokens.append(token)
+                else:
+                    postings.append(code)
+        if new_tokens:
+            # A new sorted list rather than inserting in place, so readers of
+            # the old one are never disturbed
+            vocabulary = list(self._vocabulary)
+            for token in new_tokens:
+                insort(vocabulary, token)
+            self._vocabulary = vocabulary
+        self._indexed = len(descriptions)
+
+    def view(self):
+        """Return a frozen index sharing this one's postings, for snapshots"""
+        frozen = DescriptionIndex.__new__(DescriptionIndex)
+        frozen._postings = self._postings
+        frozen._vocabulary = self._vocabulary
+        frozen._indexed = self._indexed
+        return frozen
+
+    def _prefix_postings(self, prefix):
+        """Posting lists of every token starting with `prefix`"""
+        vocabulary = self._vocabulary
+        postings = []
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            postings.append(self._postings[vocabulary[position]])
+            position += 1
+        return postings
+
+    def match(self, query):
+        """Description codes matching every term of `query`, as a sorted array
+
+        Returns None for an empty query, meaning no text filter.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return None
+        # Only the rarest term becomes a set; the others just filter it
+        by_term = sorted((self._prefix_postings(term) for term in set(terms)),
+                         key=lambda postings: sum(map(len, postings)))
+        matched = {code for codes in by_term[0] for code in codes if code < self._indexed}
+        for postings in by_term[1:]:
+            if not matched:
+                break
+            matched = {code for codes in postings for code in codes if code in matched}
+        return np.fromiter(sorted(matched), dtype=np.int32, count=len(matched))
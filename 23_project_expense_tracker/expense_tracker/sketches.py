@@ -0,0 +1,231 @@
+# Streaming quantile sketches for expense amounts
+#
+# QuantileSketch is a DDSketch: amounts are counted in logarithmic buckets,
+# so any quantile is within a relative error of `alpha` of the exact value
+# (1% by default), whatever the number of expenses. Its size depends only on
+# the spread of amounts: about 920 buckets cover $0.01 to $1,000,000.
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+DEFAULT_ALPHA = 0.01
+PERCENTILES = [0.5, 0.9, 0.99]
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch of positive values
+
+    For q in [0, 1], quantile(q) is within `alpha * x` of x, the value of
+    rank floor(q * (count - 1)) in sorted order (numpy's method="lower").
+    Values <= 0 are counted but reported as 0.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def copy(self):
+        clone = QuantileSketch.__new__(QuantileSketch)
+        clone.__dict__.update(self.__dict__)
+        clone.buckets = defaultdict(int, self.buckets)
+        return clone
+
+    def add(self, value):
+        """Count one value in O(1)"""
+        if value > 0:
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        """Count a batch of values with one vectorized bucketing pass"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        positive = values[values > 0]
+        indices, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+        for index, count in zip(indices.tolist(), counts.tolist()):
+            self.buckets[index] += count
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def discard(self, value, low, high):
+        """Take back the last add(value), restoring the min and max from before it"""
+        if value > 0:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] -= 1
+            if not self.buckets[index]:
+                del self.buckets[index]
+        else:
+            self.zero_count -= 1
+        self.count -= 1
+        self.min = low
+        self.max = high
+
+    def merge(self, other):
+        """Fold another sketch with the same alpha into this one"""
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantiles(self, qs):
+        """Estimate several quantiles in one pass over the buckets"""
+        if not self.count:
+            return [math.nan for _ in qs]
+        ranks = sorted((math.floor(q * (self.count - 1)), position) for position, q in enumerate(qs))
+        results = [0.0] * len(qs)
+        next_rank = 0
+        seen = self.zero_count
+        while next_rank < len(ranks) and ranks[next_rank][0] < seen:
+            next_rank += 1
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            value = 2 * self.gamma ** index / (self.gamma + 1)
+            while next_rank < len(ranks) and ranks[next_rank][0] < seen:
+                results[ranks[next_rank][1]] = min(max(value, self.min), self.max)
+                next_rank += 1
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+
+class CategorySketches:
+    """One QuantileSketch per category, updated on every add
+
+    A copy shares the sketches with the original; either side copies a
+    category's sketch before its first write to it.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """Forget everything, as after clearing the ledger"""
+        self.sketches = {}
+        # Categories whose sketch this object alone holds
+        self._owned = set()
+
+    def copy(self):
+        clone = CategorySketches(self.alpha)
+        clone.sketches = dict(self.sketches)
+        self._owned = set()
+        return clone
+
+    def _sketch(self, category):
+        """The sketch of `category`, copied first if it is shared"""
+        sketch = self.sketches.get(category)
+        if sketch is None:
+            sketch = self.sketches[category] = QuantileSketch(self.alpha)
+        elif category not in self._owned:
+            sketch = self.sketches[category] = sketch.copy()
+        self._owned.add(category)
+        return sketch
+
+    def add(self, amount, category):
+        self._sketch(category).add(amount)
+
+    def before_add(self, category):
+        """What add() is about to change, for undo_add()"""
+        sketch = self.sketches.get(category)
+        return category, None if sketch is None else (sketch.min, sketch.max)
+
+    def undo_add(self, state, amount):
+        """Take `amount` back out of its category's sketch, from before_add()"""
+        category, bounds = state
+        if bounds is None:
+            del self.sketches[category]
+            self._owned.discard(category)
+        else:
+            self._sketch(category).discard(amount, *bounds)
+
+    def add_many(self, amounts, category_codes, categories):
+        """Fold a batch in, one vectorized pass per category present
+
+        `category_codes` index into the `categories` list of names.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if not len(amounts):
+            return
+        codes = np.asarray(category_codes)
+        order = np.argsort(codes, kind="stable")
+        codes, amounts = codes[order], amounts[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        for start, end in zip(starts.tolist(), np.r_[starts[1:], len(codes)].tolist()):
+            self._sketch(categories[codes[start]]).add_many(amounts[start:end])
+
+    def rename_category(self, old, new):
+        """Move the sketch of `old` under `new`, merging if `new` already has one"""
+        if old == new or old not in self.sketches:
+            return
+        owned = old in self._owned
+        self._owned.discard(old)
+        sketch = self.sketches.pop(old)
+        if new in self.sketches:
+            self._sketch(new).merge(sketch)
+        else:
+            self.sketches[new] = sketch
+            if owned:
+                self._owned.add(new)
+
+    def box_frame(self):
+        """Quartiles and Tukey whiskers per category, for a precomputed box plot
+
+        Whiskers are the 1.5 IQR fences clamped to the observed min and max,
+        rather than the furthest data point inside the fences.
+        """
+        import pandas as pd
+
+        records = []
+        for name in sorted(self.sketches):
+            sketch = self.sketches[name]
+            if not sketch.count:
+                continue
+            q1, median, q3 = sketch.quantiles([0.25, 0.5, 0.75])
+            spread = q3 - q1
+            records.append({
+                "category": name,
+                "count": sketch.count,
+                "min": sketch.min,
+                "lowerfence": max(sketch.min, q1 - 1.5 * spread),
+                "q1": q1,
+                "median": median,
+                "q3": q3,
+                "upperfence": min(sketch.max, q3 + 1.5 * spread),
+                "max": sketch.max,
+            })
+        return pd.DataFrame.from_records(records, columns=[
+            "category", "count", "min", "lowerfence", "q1", "median", "q3", "upperfence", "max"
+        ])
+
+    def percentile_frame(self, percentiles=PERCENTILES):
+        """p50/p90/p99 (by default) per category"""
+        import pandas as pd
+
+        records = []
+        for name in sorted(self.sketches):
+            sketch = self.sketches[name]
+            if sketch.count:
+                values = sketch.quantiles(percentiles)
+                records.append({"category": name, "count": sketch.count,
+                                **{f"p{round(q * 100)}": value for q, value in zip(percentiles, values)}})
+        return pd.DataFrame.from_records(records, columns=[
+            "category", "count", *[f"p{round(q * 100)}" for q in percentiles]
+        ])
@@ -0,0 +1,201 @@
+# Storage backends for the expense ledger
+#
+# The ledger always works from its in-memory ExpenseStore. A backend only
+# persists rows: it is bulk-loaded once when a session starts and then sees
+# one batched insert per add.
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from urllib.parse import quote
+
+from expense_store import ExpenseStore, day_to_date, micros_to_datetime
+
+LOAD_BATCH_SIZE = 50_000
+
+
+class StorageBackend(ABC):
+    """Persistence layer behind the Ledger
+
+    Rows are (amount, category, description, day, timestamp) tuples with the
+    day and timestamp encoded the same way ExpenseStore stores them.
+    """
+
+    @abstractmethod
+    def load(self):
+        """Return every stored expense as a new ExpenseStore"""
+
+    @abstractmethod
+    def append(self, rows):
+        """Persist a batch of rows"""
+
+    @abstractmethod
+    def clear(self):
+        """Delete every stored expense"""
+
+    @abstractmethod
+    def truncate(self, count):
+        """Delete every stored expense after the first `count`, as when an add is undone"""
+
+    @abstractmethod
+    def rename_category(self, old, new):
+        """Store every expense of category `old` under `new`"""
+
+    @abstractmethod
+    def count(self):
+        """Return the number of stored expenses"""
+
+    @abstractmethod
+    def fetch(self, offset, limit):
+        """Return up to `limit` rows starting at `offset`, in insertion order"""
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class MemoryBackend(StorageBackend):
+    """Keeps rows in a plain list; nothing survives the process"""
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+
+    def load(self):
+        store = ExpenseStore(capacity=len(self.rows) or 1024)
+        if self.rows:
+            store.extend_columns(*zip(*self.rows))
+        return store
+
+    def append(self, rows):
+        self.rows.extend(rows)
+
+    def clear(self):
+        self.rows = []
+
+    def truncate(self, count):
+        del self.rows[count:]
+
+    def rename_category(self, old, new):
+        self.rows = [(row[0], new, *row[2:]) if row[1] == old else row for row in self.rows]
+
+    def count(self):
+        return len(self.rows)
+
+    def fetch(self, offset, limit):
+        return [to_record(row) for row in self.rows[offset:offset + limit]]
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite file in WAL mode, safe to share between Streamlit sessions
+
+    With `read_only`, an existing file is opened as is, for reading ledgers
+    without changing them: no journal mode switch, no schema, no writes.
+    """
+
+    def __init__(self, path, batch_size=1000, read_only=False):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        if read_only:
+            self._connection = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True,
+                                               check_same_thread=False)
+            found = self._connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expenses'"
+            ).fetchone()
+            if found is None:
+                self._connection.close()
+                raise ValueError(f"{path} has no expenses table, so it is not an expense ledger")
+            return
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS expenses (
+                    id INTEGER PRIMARY KEY,
+                    amount REAL NOT NULL,
+                    category TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    day INTEGER NOT NULL,
+                    timestamp INTEGER NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_expenses_day ON expenses (day)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category)")
+
+    def load(self):
+        with self._lock:
+            total = self._connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+            store = ExpenseStore(capacity=total or 1024)
+            cursor = self._connection.execute(
+                "SELECT amount, category, description, day, timestamp FROM expenses ORDER BY id"
+            )
+            while True:
+                rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+                if not rows:
+                    break
+                store.extend_columns(*zip(*rows))
+        return store
+
+    def append(self, rows):
+        rows = list(rows)
+        with self._lock, self._connection as connection:
+            # One transaction for the whole batch, written in executemany chunks
+            for start in range(0, len(rows), self.batch_size):
+                connection.executemany(
+                    "INSERT INTO expenses (amount, category, description, day, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    rows[start:start + self.batch_size]
+                )
+
+    def clear(self):
+        with self._lock, self._connection as connection:
+            connection.execute("DELETE FROM expenses")
+
+    def truncate(self, count):
+        with self._lock, self._connection as connection:
+            if count <= 0:
+                connection.execute("DELETE FROM expenses")
+                return
+            # Rows are kept in id order: find the first row to drop once, then delete the id range
+            first = connection.execute("SELECT id FROM expenses ORDER BY id LIMIT 1 OFFSET ?", (count,)).fetchone()
+            if first is not None:
+                connection.execute("DELETE FROM expenses WHERE id >= ?", first)
+
+    def rename_category(self, old, new):
+        with self._lock, self._connection as connection:
+            connection.execute("UPDATE expenses SET category = ? WHERE category = ?", (new, old))
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def fetch(self, offset, limit):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT amount, category, description, day, timestamp FROM expenses ORDER BY id LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [to_record(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def to_record(row):
+    """Decode a stored row into the dict shape used by the app"""
+    amount, category, description, day, timestamp = row
+    return {
+        "amount": amount,
+        "category": category,
+        "description": description,
+        "date": day_to_date(day),
+        "timestamp": micros_to_datetime(timestamp),
+    }
+
+
+def open_backend(path=None):
+    """Return a SQLiteBackend for `path`, or a MemoryBackend when no path is given"""
+    if not path:
+        return MemoryBackend()
+    return SQLiteBackend(path)
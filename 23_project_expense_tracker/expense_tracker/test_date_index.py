@@ -0,0 +1,118 @@
+# Tests for the sorted date index
+#
+# Run with:  python -m pytest -q
+
+import random
+
+import numpy as np
+
+from benchmarks import synthetic_ledger, synthetic_rows
+from date_index import LATE_LIMIT, DateIndex
+from expense_store import day_to_date
+from ledger import Ledger
+from storage import MemoryBackend
+
+
+def add_days(ledger, days, timestamps=None):
+    count = len(days)
+    ledger.add_many([1.0] * count, ["Food"] * count, ["Lunch"] * count, days,
+                    timestamps if timestamps is not None else [0] * count)
+
+
+def assert_date_order(ledger):
+    """The index orders every row by (day, timestamp), like a full lexsort"""
+    days, timestamps = ledger.store.column("day"), ledger.store.column("timestamp")
+    expected = np.lexsort((timestamps, days))
+    actual = ledger.date_index.ordered()
+    assert len(actual) == len(expected)
+    assert np.array_equal(days[actual], days[expected])
+    assert np.array_equal(timestamps[actual], timestamps[expected])
+    assert sorted(actual.tolist()) == list(range(len(ledger)))
+    assert ledger.date_index.day_range() == ((int(days.min()), int(days.max())) if len(days) else None)
+
+
+def test_mixed_batch_keeps_date_order():
+    ledger = Ledger(backend=MemoryBackend())
+    add_days(ledger, [100])
+    # One back-dated and one later row in the same batch, then an in-order add
+    add_days(ledger, [50, 300])
+    add_days(ledger, [200])
+    assert ledger.store.column("day")[ledger.date_index.ordered()].tolist() == [50, 100, 200, 300]
+    assert_date_order(ledger)
+
+
+def test_back_dated_rows_merge_into_ranges():
+    ledger = Ledger(backend=MemoryBackend())
+    add_days(ledger, list(range(0, 1000, 2)), list(range(500)))
+    add_days(ledger, [11, 11, 501, 999], [5, 3, 0, 9])
+    # 999 sorts after the last indexed row (998), so only three are back-dated
+    assert len(ledger.date_index._late_rows) == 3
+    assert_date_order(ledger)
+    days = ledger.store.column("day")
+    for start, end in [(10, 12), (0, 0), (500, 502), (990, 2000), (20, 10)]:
+        rows = ledger.date_index.between(start, end)
+        assert days[rows].tolist() == sorted(day for day in days.tolist() if start <= day <= end)
+
+
+def test_full_side_index_is_merged():
+    ledger = Ledger(backend=MemoryBackend())
+    add_days(ledger, [10_000])
+    for _ in range(3):
+        add_days(ledger, list(range(LATE_LIMIT // 2)))
+    assert len(ledger.date_index._late_rows) <= LATE_LIMIT
+    assert_date_order(ledger)
+    # A back-dated batch larger than the side index re-sorts everything
+    add_days(ledger, list(range(LATE_LIMIT + 1)))
+    assert len(ledger.date_index._late_rows) == 0
+    assert_date_order(ledger)
+
+
+def test_synthetic_adds_and_range_queries():
+    ledger = synthetic_ledger(3000)
+    # Back-dated single adds, then an out-of-order and an in-order batch
+    for row in synthetic_rows(300, seed=13):
+        ledger.add(*row)
+    for seed, rows, shift in [(1, 1000, 0), (2, 100, 3000)]:
+        batch = synthetic_ledger(rows, seed=seed).store
+        ledger.add_many(batch.column("amount"), [batch.categories[code] for code in batch.column("category_code")],
+                        [batch.descriptions[code] for code in batch.column("description_code")],
+                        batch.column("day") + shift, batch.column("timestamp"))
+    assert_date_order(ledger)
+
+    frame = ledger.store.to_frame()
+    rng = random.Random(13)
+    first_day, last_day = int(ledger.store.column("day").min()), int(ledger.store.column("day").max())
+    for _ in range(20):
+        start = rng.randint(first_day, last_day)
+        end = min(last_day, start + rng.randint(0, 60))
+        low, high = np.datetime64(day_to_date(start)), np.datetime64(day_to_date(end))
+        expected = np.flatnonzero(((frame["date"] >= low) & (frame["date"] <= high)).to_numpy())
+        assert np.array_equal(np.sort(ledger.date_index.between(start, end)), expected)
+
+
+def test_random_batches_and_undo_keep_date_order():
+    rng = random.Random(3)
+    for _ in range(8):
+        ledger = Ledger(backend=MemoryBackend())
+        for _ in range(40):
+            action = rng.random()
+            if action < 0.15 and ledger.undo_label:
+                ledger.undo()
+            elif action < 0.2 and "Food" in ledger.store.categories:
+                ledger.rename_category("Food", "Meals")
+            else:
+                count = rng.choice([1, 1, 3, 20])
+                add_days(ledger, [rng.randrange(400) for _ in range(count)],
+                         [rng.randrange(10) for _ in range(count)])
+            assert_date_order(ledger)
+
+
+def test_views_do_not_change():
+    index = DateIndex()
+    days = np.array([5, 1, 9], dtype=np.int32)
+    timestamps = np.zeros(3, dtype=np.int64)
+    index.extend(0, days[:1], timestamps[:1])
+    frozen = index.view()
+    index.extend(1, days, timestamps)
+    assert frozen.ordered().tolist() == [0]
+    assert index.ordered().tolist() == [1, 0, 2]
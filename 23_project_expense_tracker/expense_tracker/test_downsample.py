@@ -0,0 +1,25 @@
+# Tests for chart downsampling
+#
+# Run with:  python -m pytest -q
+
+import numpy as np
+import pytest
+
+from downsample import METHODS, downsample
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_keeps_endpoints_extremes_and_spikes(method, size=20_000, max_points=200):
+    rng = np.random.default_rng(5)
+    x = np.arange(size, dtype=np.int64)
+    y = rng.uniform(10, 50, size)
+    # Spikes far enough apart that no two share a bucket
+    spikes = np.arange(size // 20, size, size // 10)
+    y[spikes] = rng.uniform(5_000, 10_000, len(spikes))
+    y[size // 3] = -1_000.0
+    keep = downsample(x, y, max_points, method)
+    assert len(keep) <= max_points
+    assert keep[0] == 0 and keep[-1] == size - 1
+    assert np.all(np.diff(keep) > 0)
+    assert set(spikes.tolist()) <= set(keep.tolist())
+    assert y[keep].max() == y.max() and y[keep].min() == y.min()
@@ -0,0 +1,80 @@
+# Tests for the Streamlit app, run headless through AppTest
+#
+# Run with:  python -m pytest -q
+
+import os
+from datetime import date
+
+import pytest
+
+from benchmarks import page_operations, synthetic_ledger, synthetic_rows
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setenv("EXPENSE_TRACKER_DB", "")
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "expanse_tracker.py"),
+                            default_timeout=60)
+    app.run()
+    for row in synthetic_rows(500):
+        app.session_state.ledger.add(*row)
+    return app
+
+
+def test_every_page_renders(app):
+    for page in ["Dashboard", "Add Expense", "View Expenses", "Expense Analysis", "Settings"]:
+        app.sidebar.radio[0].set_value(page).run()
+        assert not app.exception, page
+
+
+def test_settings_edits_recompute_nothing(app):
+    for page in ["Dashboard", "Expense Analysis", "Settings"]:
+        app.sidebar.radio[0].set_value(page).run()
+    fragments, frames = app.session_state.fragments, app.session_state.frame_cache
+    builds, misses = dict(fragments.builds), frames.misses
+    for text in ["T", "Tr", "Travel"]:
+        app.text_input[0].set_value(text).run()
+    assert not app.exception
+    assert dict(fragments.builds) == builds
+    assert frames.misses == misses
+
+    # A real data change does recompute
+    app.session_state.ledger.add(12.5, "Food", "Lunch", date.today())
+    app.run()
+    key = ("render_sidebar_stats", "metrics")
+    assert fragments.builds[key] == builds[key] + 1
+
+
+@pytest.mark.parametrize("page", ["Dashboard", "Expense Analysis"])
+def test_warm_rerun_builds_no_figures(app, page):
+    app.sidebar.radio[0].set_value(page).run()
+    misses = app.session_state.figure_cache.stats()["misses"]
+    app.run()
+    assert not app.exception
+    assert app.session_state.figure_cache.stats()["misses"] == misses
+
+
+def test_new_export_replaces_the_previous_file(app):
+    app.sidebar.radio[0].set_value("View Expenses").run()
+    prepare = next(button for button in app.button if button.label.startswith("Prepare Export"))
+    prepare.click().run()
+    first = app.session_state.export_file.path
+    assert not app.exception and os.path.exists(first)
+    next(button for button in app.button if button.label.startswith("Prepare Export")).click().run()
+    assert not app.exception and not os.path.exists(first)
+    assert os.path.exists(app.session_state.export_file.path)
+    app.session_state.export_file.close()
+
+
+def test_benchmark_times_the_app_pages():
+    ledger = synthetic_ledger(2000)
+    operations = page_operations(ledger)
+    results = {name: operation() for name, operation in operations.items()}
+    assert len(ledger) == 2001
+    page = results["view_page_frame"]
+    assert {"Amount ($)", "Category", "Description", "Date"} <= set(page.columns) and len(page) == 50
+    assert page["Date"].tolist() == sorted(page["Date"], reverse=True)
+    if "distribution_figure" in results:
+        assert results["distribution_figure"].data[0].type == "box"
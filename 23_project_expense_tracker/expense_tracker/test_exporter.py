@@ -0,0 +1,55 @@
+# Tests for chunked exports and their round trip through the importer
+#
+# Run with:  python -m pytest -q
+
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks import synthetic_ledger
+from expense_query import select_rows
+from exporter import EXTENSIONS, ExportFile, export_expenses
+from importer import import_expenses
+
+
+@pytest.mark.parametrize("file_format", EXTENSIONS)
+def test_filtered_export_round_trips(tmp_path, file_format):
+    if file_format == "parquet":
+        pytest.importorskip("pyarrow")
+    ledger = synthetic_ledger(3000)
+    rows = select_rows(ledger.store, categories=["Food", "Bills"], min_amount=50, sort_by="amount", descending=True)
+    path = os.path.join(tmp_path, f"export{EXTENSIONS[file_format]}")
+    report = export_expenses(ledger.store, path, rows=rows, chunk_size=97)
+    assert report.rows_written == len(rows)
+
+    restored = synthetic_ledger(0)
+    report = import_expenses(restored, path)
+    assert report.rows_imported == len(rows) and not report.errors
+    expected, got = ledger.store.take(rows).to_frame(), restored.store.to_frame()
+    assert np.allclose(got["amount"], expected["amount"])
+    for column in ["category", "description", "date", "timestamp"]:
+        assert (got[column].astype(str).to_numpy() == expected[column].astype(str).to_numpy()).all(), column
+
+
+def test_full_export_writes_every_row(tmp_path):
+    ledger = synthetic_ledger(1000)
+    report = export_expenses(ledger.store, os.path.join(tmp_path, "export.csv"), chunk_size=300)
+    assert report.rows_written == 1000
+
+
+def test_export_file_is_deleted_when_closed_or_dropped():
+    ledger = synthetic_ledger(500)
+    export = ExportFile(ledger.store, "csv", chunk_size=100)
+    path = export.path
+    assert export.report.rows_written == 500 and len(export.read()) == export.report.bytes_written
+    export.close()
+    assert not os.path.exists(path)
+
+    # Dropping it, as when a session's state goes away, deletes the file too
+    export = ExportFile(ledger.store, "jsonl")
+    path = export.path
+    del export
+    gc.collect()
+    assert not os.path.exists(path)
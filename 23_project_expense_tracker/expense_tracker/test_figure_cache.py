@@ -0,0 +1,51 @@
+# Tests for the per-version figure cache
+#
+# Run with:  python -m pytest -q
+
+import json
+
+import pytest
+
+from figure_cache import FigureCache
+
+px = pytest.importorskip("plotly.express")
+plotly_io = pytest.importorskip("plotly.io")
+
+
+def line(points):
+    return lambda: px.line(x=list(range(points)), y=list(range(points)))
+
+
+def test_cached_figure_renders_like_a_fresh_one():
+    cache = FigureCache()
+    fresh = json.loads(plotly_io.to_json(cache.get("line", 1, (100,), line(100)), validate=False))
+    cached = cache.get("line", 1, (100,), lambda: None)
+    assert json.loads(plotly_io.to_json(cached, validate=False)) == fresh
+    assert cache.stats()["charts"]["line"] == {"hits": 1, "misses": 1}
+
+
+def test_hits_return_the_built_figure():
+    cache = FigureCache()
+    figure = cache.get("line", 1, (100,), line(100))
+    # Nothing is rebuilt or copied on a hit
+    assert cache.get("line", 1, (100,), lambda: None) is figure
+
+
+def test_byte_bound_evicts_least_recently_used():
+    cache = FigureCache(max_bytes=20_000)
+    for points in [1000, 1001, 1002]:
+        cache.get("line", 1, (points,), line(points))
+    stats = cache.stats()
+    assert stats["bytes"] <= cache.max_bytes and stats["evictions"] >= 1
+    assert cache.get("line", 1, (1002,), lambda: None) is not None
+    # The oldest figure was evicted and is built again
+    assert cache.get("line", 1, (1000,), lambda: px.line(x=[0], y=[0])) is not None
+    assert cache.stats()["charts"]["line"] == {"hits": 1, "misses": 4}
+
+
+def test_new_version_replaces_older_figures():
+    cache = FigureCache()
+    cache.get("line", 1, (10,), line(10))
+    cache.get("bar", 1, (10,), line(10))
+    cache.get("line", 2, (10,), line(10))
+    assert len(cache) == 1
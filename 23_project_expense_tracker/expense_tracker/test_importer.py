@@ -0,0 +1,60 @@
+# Tests for the chunked importer's validation and per-row rejections
+#
+# Run with:  python -m pytest -q
+
+import io
+import warnings
+from datetime import date
+
+import pytest
+
+from importer import import_expenses
+from ledger import Ledger
+
+pytest.importorskip("pandas")
+
+CSV = """amount,category,description,date,timestamp
+12.5,Food,Lunch,2024-01-02,2024-01-02 12:30:00
+-3,Food,Refund,2024-01-03,
+40,Bills,Power,01/02/2024,2024-01-04T08:00:00
+7,,Coffee,2024-01-05,
+abc,Transport,,2024-13-40,not a time
+99.99,Transport,Taxi,2024-01-06,2024-01-06T23:59:59.123456
+"""
+
+
+def import_csv(text, chunk_size=50_000):
+    ledger = Ledger()
+    report = import_expenses(ledger, io.StringIO(text), "csv", chunk_size=chunk_size)
+    return ledger, report
+
+
+@pytest.mark.parametrize("chunk_size", [2, 50_000])
+def test_bad_rows_are_reported_and_good_rows_imported(chunk_size):
+    ledger, report = import_csv(CSV, chunk_size)
+    assert report.rows_read == 6 and report.rows_imported == 2 and report.error_count == 4
+    assert report.errors == [
+        (2, "amount is not a positive number; timestamp is invalid"),
+        (3, "date is missing or invalid"),
+        (4, "category is empty; timestamp is invalid"),
+        (5, "amount is not a positive number; date is missing or invalid; description is empty; "
+            "timestamp is invalid"),
+    ]
+    assert [(row["amount"], row["description"], row["date"]) for row in ledger.store] == [
+        (12.5, "Lunch", date(2024, 1, 2)), (99.99, "Taxi", date(2024, 1, 6))
+    ]
+
+
+def test_each_date_is_parsed_on_its_own():
+    # A first row in another format must not decide how the ISO dates after it are read
+    text = "amount,category,description,date\n1,Food,A,01/02/2024\n2,Food,B,2024-01-03\n3,Food,C,2024-01-04\n"
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        ledger, report = import_csv(text)
+    assert report.errors == [(1, "date is missing or invalid")]
+    assert [row["date"] for row in ledger.store] == [date(2024, 1, 3), date(2024, 1, 4)]
+
+
+def test_missing_column_stops_the_import():
+    with pytest.raises(ValueError, match="date"):
+        import_csv("amount,category,description\n1,Food,Lunch\n")
@@ -0,0 +1,288 @@
+# Tests for the ledger: running aggregates, rollup, categories, sharing and undo/redo
+#
+# Run with:  python -m pytest -q
+
+import os
+import subprocess
+import sys
+import threading
+from datetime import date
+
+import pytest
+
+from benchmarks import (STARTUP_BUDGET_MS, held_by_changes, import_time, synthetic_columns, synthetic_ledger,
+                        synthetic_rows)
+from expense_store import date_to_day, datetime_to_micros
+from ledger import Ledger, LedgerSnapshot, SharedLedger
+from storage import MemoryBackend, SQLiteBackend
+from write_behind import WriteBehindBackend
+
+HEAVY_MODULES = ["streamlit", "plotly", "pandas"]
+
+
+def assert_metrics(ledger):
+    """The running aggregates agree with a full recomputation"""
+    amounts = ledger.store.column("amount")
+    total, average, max_expense = ledger.metrics()
+    if len(amounts):
+        assert total == pytest.approx(amounts.sum())
+        assert average == pytest.approx(amounts.mean())
+        assert max_expense == amounts.max()
+    else:
+        assert (total, average, max_expense) == (0, 0, 0)
+    frame = ledger.store.to_frame()
+    expected = frame.groupby("category", observed=True)["amount"].sum().to_dict()
+    totals = {name: value for name, value in ledger.aggregates.category_totals.items()
+              if ledger.aggregates.category_counts[name]}
+    assert totals == pytest.approx(expected)
+
+
+def assert_rollup(ledger):
+    """The category x day rollup agrees with a groupby over every row"""
+    frame = ledger.store.to_frame()
+    expected = frame.groupby(["category", "date"], observed=True)["amount"].agg(["sum", "count", "min", "max"])
+    actual = ledger.rollup.to_frame("day").set_index(["category", "date"])
+    assert len(actual) == len(expected)
+    for (category, day), row in expected.iterrows():
+        cell = actual.loc[(category, day)]
+        assert cell["amount"] == pytest.approx(row["sum"])
+        assert (cell["count"], cell["min"], cell["max"]) == (row["count"], row["min"], row["max"])
+
+
+def ledger_state(ledger):
+    """Everything a restored version must reproduce, from a Ledger or a LedgerSnapshot"""
+    return {
+        "rows": list(ledger.store),
+        "metrics": ledger.metrics(),
+        "rollup": ledger.rollup.to_frame("day").to_dict("list"),
+        "quantiles": ledger.sketches.percentile_frame().to_dict("list"),
+        "stats": ledger.monitor.stats_records(),
+        "budgets": dict(ledger.monitor.budgets),
+        "categories": list(ledger.store.categories.sorted_names()),
+        "dates": ledger.date_index.ordered().tolist(),
+    }
+
+
+def test_metrics_follow_adds_and_resets():
+    ledger = Ledger()
+    for number, row in enumerate(synthetic_rows(600, seed=7)):
+        ledger.add(*row)
+        if number in (150, 151):
+            ledger.reset()
+        if number % 100 == 0:
+            assert_metrics(ledger)
+    assert_metrics(ledger)
+    ledger.reset()
+    assert_metrics(ledger)
+
+
+def test_rollup_follows_single_and_batch_adds():
+    ledger = Ledger()
+    sample = list(synthetic_rows(1000, seed=11))
+    for row in sample[:500]:
+        ledger.add(*row)
+    batch = sample[500:]
+    ledger.add_many(
+        [row[0] for row in batch], [row[1] for row in batch], [row[2] for row in batch],
+        [date_to_day(row[3]) for row in batch], [datetime_to_micros(row[4]) for row in batch]
+    )
+    assert_rollup(ledger)
+
+
+def test_rename_and_merge_keep_views_consistent():
+    ledger = synthetic_ledger(2000)
+    ledger.rename_category("Bills", "Utilities")
+    ledger.rename_category("Shopping", "Food")
+    assert_metrics(ledger)
+    assert_rollup(ledger)
+    names = ledger.store.categories.sorted_names()
+    assert "Bills" not in names and "Shopping" not in names and "Utilities" in names
+    frame = ledger.store.to_frame()
+    assert list(frame["category"].cat.categories) == names
+    assert set(frame["category"].unique()) <= set(names)
+
+
+def test_shared_ledger_snapshots_are_consistent():
+    shared = SharedLedger()
+    failures = []
+    done = threading.Event()
+
+    def write(worker):
+        for row in synthetic_rows(300, seed=worker):
+            shared.add(*row)
+
+    def read():
+        while not done.is_set():
+            snapshot = shared.snapshot()
+            amounts = snapshot.store.column("amount")
+            total, _, max_amount = snapshot.metrics()
+            # Every part of a snapshot must describe the same version
+            if snapshot.aggregates.count != len(amounts):
+                failures.append(("count", snapshot.aggregates.count, len(amounts)))
+            elif len(amounts) and (abs(total - amounts.sum()) > 1e-6 * total or max_amount != amounts.max()):
+                failures.append(("metrics", total, float(amounts.sum())))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    writers = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not failures, failures[:5]
+    assert len(shared) == 4 * 300
+    assert_metrics(shared.snapshot())
+    assert_rollup(shared.snapshot())
+
+
+@pytest.fixture(params=["memory", "write_behind"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    else:
+        backend = WriteBehindBackend(SQLiteBackend(os.path.join(tmp_path, "history.db")))
+        yield backend
+        backend.close()
+
+
+def test_undo_redo_walks_history(backend):
+    ledger = Ledger(backend=backend)
+    extra = list(synthetic_rows(3, seed=29))
+    steps = [
+        lambda: ledger.add_many(*synthetic_columns(2000, 29)),
+        lambda: ledger.add(*extra[0]),
+        lambda: ledger.add_many(*synthetic_columns(500, 30)),
+        lambda: ledger.set_budget("Food", 300),
+        lambda: ledger.rename_category("Shopping", "Others"),
+        lambda: ledger.add_category("Travel"),
+        lambda: ledger.add(12.5, "Travel", "Train", date(2024, 3, 1)),
+        ledger.reset,
+        lambda: ledger.add(*extra[1]),
+    ]
+    states = [ledger_state(ledger)]
+    snapshots = [ledger.snapshot()]
+    for step in steps:
+        step()
+        states.append(ledger_state(ledger))
+        snapshots.append(ledger.snapshot())
+
+    def check(index):
+        assert ledger_state(ledger) == states[index]
+        assert backend.fetch(0, len(ledger) + 1) == states[index]["rows"]
+
+    for index in range(len(steps) - 1, -1, -1):
+        assert ledger.undo()
+        check(index)
+    assert not ledger.undo()
+    for index in range(1, len(steps) + 1):
+        assert ledger.redo()
+        check(index)
+    assert not ledger.redo()
+    # Snapshots handed out along the way never changed
+    for snapshot, state in zip(snapshots, states):
+        assert ledger_state(snapshot) == state
+
+    # A change after an undo drops the redo steps; undo still returns to the recorded state
+    for _ in range(4):
+        ledger.undo()
+    ledger.add(*extra[2])
+    assert not ledger.redo() and len(ledger) == len(states[5]["rows"]) + 1
+    assert_rollup(ledger)
+    ledger.undo()
+    check(5)
+
+
+def test_single_adds_undo_exactly():
+    ledger = synthetic_ledger(300, seed=5)
+    ledger.set_budget("Food", 400)
+    ledger.monitor.alerts.clear()
+    amounts = [12.0, 14.0, 900.0, 13.0, 250.0, 5000.0, 11.0, 0.0, 300.0, 7.5]
+    states = []
+    for number in range(60):
+        states.append((ledger_state(ledger), list(ledger.monitor.alerts)))
+        # Outliers and budget breaches raise alerts; late and new days need new rollup cells
+        ledger.add(amounts[number % len(amounts)], ["Food", "Bills", "Transport"][number % 3], "Item",
+                   date(2026 if number % 7 == 0 else 2024, 5, 1 + number % 28))
+    states.append((ledger_state(ledger), list(ledger.monitor.alerts)))
+    assert ledger.monitor.alerts
+
+    for index in range(len(states) - 2, len(states) - 22, -1):
+        assert ledger.undo()
+        assert (ledger_state(ledger), list(ledger.monitor.alerts)) == states[index]
+    for index in range(len(states) - 20, len(states)):
+        assert ledger.redo()
+        assert (ledger_state(ledger), list(ledger.monitor.alerts)) == states[index]
+
+
+def test_add_copies_nothing():
+    ledger = synthetic_ledger(1000)
+    ledger.add(*next(synthetic_rows(1)))
+    derived = ledger.aggregates, ledger.rollup, ledger.sketches, ledger.monitor
+    for row in synthetic_rows(10, seed=3):
+        ledger.add(*row)
+    # The undo steps hold what each add replaced, not a snapshot to copy the derived objects for
+    assert (ledger.aggregates, ledger.rollup, ledger.sketches, ledger.monitor) == derived
+    assert not any(isinstance(state, LedgerSnapshot) for _, state, _ in list(ledger._undo)[-10:])
+    # A new category keeps a snapshot, as the category registry changes too
+    ledger.add(5.0, "Travel", "Train", date(2024, 3, 1))
+    assert isinstance(ledger._undo[-1][1], LedgerSnapshot)
+    assert ledger.undo() and "Travel" not in ledger.store.categories
+
+
+def test_sessions_undo_only_their_own_changes():
+    caller = {"session": "a"}
+    shared = SharedLedger(session=lambda: caller["session"])
+    shared.add(10.0, "Food", "Lunch", date(2024, 1, 1))
+    caller["session"] = "b"
+    shared.add(20.0, "Bills", "Power", date(2024, 1, 2))
+
+    caller["session"] = "a"
+    assert shared.undo_label is None and not shared.undo()
+    caller["session"] = "b"
+    assert shared.undo_label == "add expense" and shared.undo()
+    assert len(shared) == 1
+    # Now a's add is the last change
+    assert shared.undo_label is None and not shared.undo()
+    caller["session"] = "a"
+    assert shared.undo() and len(shared) == 0
+    caller["session"] = "b"
+    assert shared.redo_label is None and not shared.redo()
+    caller["session"] = "a"
+    assert shared.redo() and len(shared) == 1
+
+
+def test_history_is_bounded():
+    ledger = Ledger(history=3)
+    for row in synthetic_rows(5, seed=29):
+        ledger.add(*row)
+    assert [ledger.undo() for _ in range(4)] == [True, True, True, False]
+    assert len(ledger) == 2
+
+    ledger = Ledger(history=0)
+    ledger.add(*next(synthetic_rows(1)))
+    assert not ledger.undo() and len(ledger) == 1
+
+
+def test_history_shares_rows_between_versions():
+    history = 20
+    held = {depth: held_by_changes(50_000, depth, seed=31) for depth in (0, history)}
+    # Versions share rows and untouched blocks, so each costs far less than a copy of the columns,
+    # and a reset keeps the old buffers for undo instead of copying them
+    assert held[history][0] - held[0][0] < history * 2 ** 20
+    assert held[history][1] - held[history][0] < 2 ** 20
+
+
+def test_import_skips_ui_stack():
+    result = subprocess.run(
+        [sys.executable, "-c", f"import ledger, importer, sys; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_import_is_within_startup_budget():
+    # Best of three fresh interpreters, so one slow disk read does not fail the run
+    assert min(import_time("ledger") for _ in range(3)) / 1000 <= STARTUP_BUDGET_MS
@@ -0,0 +1,56 @@
+# Tests for streaming per-category statistics, budgets and alerts
+#
+# Run with:  python -m pytest -q
+
+from datetime import date
+
+import numpy as np
+
+from benchmarks import synthetic_ledger, synthetic_rows
+
+
+def assert_monitor(ledger):
+    """The streaming statistics and monthly spend match pandas over the full ledger"""
+    frame = ledger.store.to_frame()
+    monitor = ledger.monitor
+    alpha = monitor.alpha
+    for category, amounts in frame.groupby("category", observed=True)["amount"]:
+        stats = monitor.stats[category]
+        assert stats.count == len(amounts)
+        assert np.isclose(stats.mean, amounts.mean())
+        assert np.isclose(stats.variance, amounts.var())
+        assert np.isclose(stats.ewm_mean, amounts.ewm(alpha=alpha, adjust=False).mean().iloc[-1])
+        assert np.isclose(stats.ewm_square, (amounts ** 2).ewm(alpha=alpha, adjust=False).mean().iloc[-1])
+    spend = frame.groupby(["category", frame["date"].dt.year, frame["date"].dt.month], observed=True)["amount"].sum()
+    assert len(spend) == sum(1 for value in monitor.month_spend.values() if value)
+    for (category, year, month), amount in spend.items():
+        assert np.isclose(monitor.month_spend[(category, (year, month))], amount)
+
+
+def test_statistics_follow_batch_and_single_adds():
+    # A bulk load, then single adds, in the order the store keeps them
+    ledger = synthetic_ledger(1000, seed=23)
+    for row in synthetic_rows(500, seed=23):
+        ledger.add(*row)
+    assert_monitor(ledger)
+
+
+def test_merged_category_statistics():
+    ledger = synthetic_ledger(1000, seed=23)
+    ledger.rename_category("Shopping", "Others")
+    stats = ledger.monitor.stats["Others"]
+    amounts = ledger.store.to_frame().query("category == 'Others'")["amount"]
+    assert stats.count == len(amounts) and np.isclose(stats.variance, amounts.var())
+
+
+def test_add_flags_outliers_and_budget_breaches():
+    ledger = synthetic_ledger(0)
+    ledger.set_budget("Food", 450)
+    alerts = [ledger.add(amount, "Food", "Lunch", date(2024, 5, 1 + number % 28))
+              for number, amount in enumerate([12.0, 14.0, 11.0, 13.0, 15.0, 12.5, 13.5, 14.5, 11.5, 12.0, 13.0])]
+    assert not any(alerts)
+    assert [alert.kind for alert in ledger.add(250.0, "Food", "Banquet", date(2024, 5, 20))] == ["outlier", "budget_warning"]
+    assert ledger.add(40.0, "Food", "Dinner", date(2024, 5, 21)) == []
+    assert [alert.kind for alert in ledger.add(40.0, "Food", "Dinner", date(2024, 5, 21))] == ["budget"]
+    assert ledger.add(10.0, "Food", "Snack", date(2024, 5, 22)) == []
+    assert ledger.monitor.budget_status(2024, 5)[0]["spent"] == ledger.monitor.month_spend[("Food", (2024, 5))]
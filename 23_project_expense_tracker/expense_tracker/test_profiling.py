@@ -0,0 +1,147 @@
+# Tests for the per-call profiler and its process-wide allocation tracking
+#
+# Run with:  python -m pytest -q
+
+import gc
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+import fragments
+from fragments import FragmentState, fragment
+from profiling import Profiler
+
+BUFFER_BYTES = 4 * 2 ** 20
+
+
+@pytest.fixture(autouse=True)
+def no_outside_tracing():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc was started outside the profiler")
+    yield
+    assert not tracemalloc.is_tracing()
+
+
+def allocate_and_free():
+    buffer = bytearray(BUFFER_BYTES)
+    del buffer
+
+
+def test_tracing_is_shared_between_profilers():
+    first, second = Profiler(), Profiler()
+    first.enable()
+    second.enable()
+    first.disable()
+    # Another session still profiles, so tracing keeps running
+    assert tracemalloc.is_tracing()
+    first.enable()
+    second.disable()
+    first.disable()
+    assert not tracemalloc.is_tracing()
+
+    # A profiler dropped without disabling, as when a session ends, releases tracing too
+    dropped = Profiler()
+    dropped.enable()
+    del dropped
+    gc.collect()
+    assert not tracemalloc.is_tracing()
+
+
+def test_nested_calls_keep_their_peaks():
+    profiler = Profiler()
+    profiler.enable()
+    profiler.start_run()
+    with profiler.measure("outer"):
+        allocate_and_free()
+        with profiler.measure("inner"):
+            pass
+    profiler.finish_run()
+    profiler.disable()
+    outer, inner = profiler.last_run()
+    assert (outer["name"], outer["depth"], inner["name"], inner["depth"]) == ("outer", 0, "inner", 1)
+    assert outer["allocated_bytes"] >= BUFFER_BYTES > inner["allocated_bytes"]
+
+
+def test_other_sessions_do_not_reset_a_running_peak():
+    first, second = Profiler(), Profiler()
+    first.enable()
+    second.enable()
+    first.start_run()
+    second.start_run()
+    # Interleave two sessions the way concurrent reruns do: the second one resets the shared
+    # peak while the first one's call is still running
+    running = first.measure("first")
+    running.__enter__()
+    allocate_and_free()
+    with second.measure("second"):
+        pass
+    running.__exit__(None, None, None)
+    first.finish_run()
+    second.finish_run()
+    first.disable()
+    second.disable()
+    assert first.last_run()[0]["allocated_bytes"] >= BUFFER_BYTES
+    assert second.last_run()[0]["allocated_bytes"] < BUFFER_BYTES
+
+
+def test_cpu_time_is_the_calling_threads_own():
+    profiler = Profiler()
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            pass
+
+    busy = threading.Thread(target=spin)
+    busy.start()
+    profiler.enable()
+    profiler.start_run()
+    with profiler.measure("sleep"):
+        time.sleep(0.2)
+    profiler.finish_run()
+    profiler.disable()
+    stop.set()
+    busy.join()
+    # Another session's work on another thread is not billed to this call
+    assert profiler.last_run()[0]["cpu_seconds"] < 0.05
+
+
+class FakeSessionState(dict):
+    __getattr__ = dict.__getitem__
+
+
+def test_fragment_reruns_record_their_own_run(monkeypatch):
+    # Stand in for Streamlit, so the fragment can be called directly as a fragment rerun would
+    profiler = Profiler()
+    session_state = FakeSessionState(fragments=FragmentState(), profiler=profiler)
+    monkeypatch.setattr(fragments, "st", SimpleNamespace(fragment=lambda function: function,
+                                                         session_state=session_state))
+
+    class Page:
+        def data_version(self, name):
+            return 0
+
+        @fragment("ledger")
+        def render_stats(self):
+            with profiler.measure("get_expense_metrics"):
+                pass
+
+    profiler.enable()
+
+    # Inside a full rerun the fragment adds to the rerun's calls
+    profiler.start_run()
+    with profiler.measure("render_sidebar"):
+        Page().render_stats()
+    profiler.finish_run()
+    assert [call["name"] for call in profiler.last_run()] == ["render_sidebar", "get_expense_metrics"]
+
+    # Rerun alone, it is a run of its own instead of being credited to the previous one
+    Page().render_stats()
+    profiler.disable()
+    assert len(profiler.runs) == 2 and not profiler.in_run
+    assert [(call["name"], call["depth"]) for call in profiler.last_run()] == [
+        ("render_stats", 0), ("get_expense_metrics", 1)
+    ]
@@ -0,0 +1,100 @@
+# Tests for the headless batch report generator
+#
+# Run with:  python -m pytest -q
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+import reports
+from benchmarks import write_ledger_files
+from ledger import Ledger
+from reports import generate_reports
+from storage import SQLiteBackend
+
+
+@pytest.fixture(scope="module")
+def directory(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("ledgers"))
+    write_ledger_files(directory, 3, 500)
+    return directory
+
+
+def test_index_is_the_same_for_any_worker_count(directory, tmp_path):
+    totals = []
+    for workers in (1, 2):
+        index = generate_reports([directory], os.path.join(tmp_path, f"reports-{workers}"), workers=workers)
+        # Three databases and one CSV export load, the broken JSON Lines file fails
+        assert index["ledgers"] == 5 and index["failed"] == 1
+        totals.append([(entry["ledger"], entry.get("total")) for entry in index["entries"]])
+    assert totals[0] == totals[1]
+
+
+def test_rerun_skips_earlier_reports(tmp_path):
+    directory = os.path.join(tmp_path, "ledgers")
+    os.makedirs(directory)
+    write_ledger_files(directory, 2, 100)
+    # Reports written inside the searched directory, and a stray one copied next to the ledgers
+    output_dir = os.path.join(directory, "reports")
+    first = generate_reports([directory], output_dir, workers=1)
+    shutil.copy(os.path.join(output_dir, "index.json"), os.path.join(directory, "old-index.json"))
+    second = generate_reports([directory], output_dir, workers=1)
+    assert first["ledgers"] == second["ledgers"] == 4 and second["failed"] == first["failed"] == 1
+
+
+def test_report_matches_pandas(directory, tmp_path):
+    generate_reports([directory], str(tmp_path), workers=1)
+    frame = Ledger(backend=SQLiteBackend(os.path.join(directory, "ledger-0000.db"))).store.to_frame()
+    with open(os.path.join(tmp_path, "ledger-0000.json")) as file:
+        report = json.load(file)
+    assert report["metrics"]["count"] == len(frame)
+    assert report["metrics"]["total"] == pytest.approx(frame["amount"].sum())
+    by_category = frame.groupby("category", observed=True)["amount"].sum()
+    for row in report["categories"]:
+        assert row["amount"] == pytest.approx(by_category[row["category"]])
+    months = frame.groupby(frame["date"].dt.strftime("%Y-%m"))["amount"].sum()
+    assert [row["month"] for row in report["monthly"]] == list(months.index)
+    for row in report["monthly"]:
+        assert row["amount"] == pytest.approx(months[row["month"]])
+
+
+def file_states(directory):
+    """Modification time and hash of each ledger file; SQLite's -wal and -shm files are left out"""
+    states = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and not name.endswith(("-wal", "-shm")):
+            with open(path, "rb") as file:
+                states[name] = (os.stat(path).st_mtime_ns, hashlib.sha256(file.read()).hexdigest())
+    return states
+
+
+def test_reports_leave_ledger_files_untouched(directory, tmp_path):
+    before = file_states(directory)
+    generate_reports([directory], str(tmp_path), workers=1)
+    assert file_states(directory) == before
+
+
+def test_database_without_expenses_is_reported(tmp_path):
+    path = os.path.join(tmp_path, "other.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE notes (text TEXT)")
+    connection.close()
+    index = generate_reports([path], os.path.join(tmp_path, "reports"), workers=1)
+    assert index["failed"] == 1
+    assert "no expenses table" in index["entries"][0]["error"]
+    with sqlite3.connect(path) as connection:
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    connection.close()
+    assert tables == ["notes"]
+
+
+def test_main_without_paths_prints_usage(capsys, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["reports.py"])
+    reports.main()
+    assert capsys.readouterr().out.startswith("usage:")
@@ -0,0 +1,36 @@
+# Scaling tests: page operations must not slow down with the ledger size
+#
+# Run with:  python -m pytest -q
+#            python -m pytest -q -m scaling --scaling-sizes 1000 10000 100000 1000000
+
+import pytest
+
+from benchmarks import page_operations, profile, synthetic_ledger
+
+# Operations served from running aggregates, the rollup, the sketches or the date index;
+# building a raw frame or a figure is allowed to grow with the data
+BOUNDED = ["add_expense", "get_expense_metrics", "dashboard_recent", "dashboard_range", "view_page_frame",
+           "by_category_frame", "box_frame"]
+# From the smallest to the largest ledger these may take this many times longer, plus timer
+# noise; a full scan over 100x the rows would take far longer
+GROWTH = 3
+NOISE_SECONDS = 0.001
+
+pytestmark = pytest.mark.scaling
+
+
+@pytest.fixture(scope="module")
+def timings(request):
+    """Median seconds of every page operation, per ledger size"""
+    results = {}
+    for rows in sorted(request.config.getoption("--scaling-sizes")):
+        operations = page_operations(synthetic_ledger(rows))
+        results[rows] = {name: profile(operations[name])["median_seconds"] for name in BOUNDED}
+    return results
+
+
+@pytest.mark.parametrize("name", BOUNDED)
+def test_page_operation_is_bounded(timings, name):
+    sizes = sorted(timings)
+    smallest, largest = timings[sizes[0]][name], timings[sizes[-1]][name]
+    assert largest <= GROWTH * smallest + NOISE_SECONDS, {rows: timings[rows][name] for rows in sizes}
@@ -0,0 +1,45 @@
+# Tests for the description search index
+#
+# Run with:  python -m pytest -q
+
+import re
+from datetime import date
+
+import numpy as np
+import pytest
+
+from benchmarks import CATEGORIES, DESCRIPTIONS, MERCHANTS, synthetic_ledger
+from expense_query import select_rows
+from expense_store import date_to_day
+
+
+@pytest.fixture(scope="module")
+def ledger(rows=5000):
+    rng = np.random.default_rng(17)
+    ledger = synthetic_ledger(0)
+    # Mostly unique descriptions, like a bank export with reference numbers
+    descriptions = [
+        f"{merchant} {item} ref {number}" for merchant, item, number in zip(
+            np.array(MERCHANTS)[rng.integers(len(MERCHANTS), size=rows)],
+            np.array(DESCRIPTIONS)[rng.integers(len(DESCRIPTIONS), size=rows)],
+            rng.integers(1000, size=rows),
+        )
+    ]
+    ledger.add_many(
+        np.round(rng.uniform(1, 500, rows), 2),
+        np.array(CATEGORIES, dtype=object)[rng.integers(len(CATEGORIES), size=rows)],
+        descriptions,
+        date_to_day(date(2020, 1, 1)) + rng.integers(1825, size=rows),
+        np.arange(rows, dtype=np.int64),
+    )
+    return ledger
+
+
+@pytest.mark.parametrize("query", ["tesco", "gro", "uber taxi", "ref 42", "netflix cinema 1", "TESCO  Lunch", "nothing"])
+def test_match_agrees_with_regex_scan(ledger, query):
+    found = select_rows(ledger.store, sort_by="added", description_codes=ledger.search_index.match(query))
+    lowered = ledger.store.to_frame()["description"].astype(str).str.lower()
+    mask = np.ones(len(lowered), dtype=bool)
+    for term in query.lower().split():
+        mask &= lowered.str.contains(r"\b" + re.escape(term), regex=True).to_numpy()
+    assert np.array_equal(found, np.flatnonzero(mask))
@@ -0,0 +1,42 @@
+# Tests for the per-category quantile sketches
+#
+# Run with:  python -m pytest -q
+
+import numpy as np
+import pytest
+
+from benchmarks import synthetic_ledger
+from sketches import PERCENTILES, QuantileSketch
+
+QS = (0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0)
+
+rng = np.random.default_rng(19)
+DISTRIBUTIONS = {
+    "uniform": rng.uniform(0.01, 500, 20_000),
+    "lognormal": rng.lognormal(3, 1.5, 20_000),
+    "pareto": (rng.pareto(1.2, 20_000) + 1) * 5,
+    "rounded": np.round(rng.exponential(40, 20_000), 2) + 0.01,
+}
+
+
+@pytest.mark.parametrize("name", DISTRIBUTIONS)
+def test_quantiles_within_relative_error(name, alpha=0.01):
+    values = DISTRIBUTIONS[name]
+    single, batched = QuantileSketch(alpha), QuantileSketch(alpha)
+    for value in values[:1000].tolist():
+        single.add(value)
+    batched.add_many(values[:1000])
+    assert single.quantiles(QS) == batched.quantiles(QS)
+    batched.add_many(values[1000:])
+    for got, want in zip(batched.quantiles(QS), np.quantile(values, QS, method="lower")):
+        assert abs(got - want) <= alpha * abs(want) + 1e-12
+
+
+def test_ledger_sketches_follow_merges():
+    ledger = synthetic_ledger(5000)
+    ledger.rename_category("Shopping", "Food")
+    frame = ledger.store.to_frame()
+    for category, amounts in frame.groupby("category", observed=True)["amount"]:
+        got = ledger.sketches.sketches[category].quantiles(PERCENTILES)
+        for value, want in zip(got, np.quantile(amounts, PERCENTILES, method="lower")):
+            assert abs(value - want) <= ledger.sketches.alpha * want
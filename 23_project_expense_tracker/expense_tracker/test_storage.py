@@ -0,0 +1,127 @@
+# Tests for the storage backends and the write-behind queue
+#
+# Run with:  python -m pytest -q
+
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+from benchmarks import synthetic_rows
+from expense_store import date_to_day, datetime_to_micros
+from ledger import Ledger
+from storage import MemoryBackend, SQLiteBackend
+from write_behind import WriteBehindBackend
+
+# Run in a child process that is then killed: add expenses forever, printing
+# how many are acknowledged after each flush
+CRASH_WRITER = """
+import sys
+from benchmarks import synthetic_rows
+from ledger import Ledger
+from storage import SQLiteBackend
+from write_behind import WriteBehindBackend
+
+backend = WriteBehindBackend(SQLiteBackend(sys.argv[1]), batch_size=64)
+ledger = Ledger(backend=backend)
+for count, row in enumerate(synthetic_rows(10 ** 9), start=1):
+    ledger.add(*row)
+    if count % 97 == 0:
+        backend.flush()
+        print(count, flush=True)
+"""
+
+
+def stored_rows(count, seed=1):
+    return [(amount, category, description, date_to_day(day), datetime_to_micros(stamp))
+            for amount, category, description, day, stamp in synthetic_rows(count, seed)]
+
+
+@pytest.fixture(params=["memory", "sqlite", "write_behind"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+        return
+    backend = SQLiteBackend(os.path.join(tmp_path, "expenses.db"))
+    if request.param == "write_behind":
+        backend = WriteBehindBackend(backend)
+    yield backend
+    backend.close()
+
+
+def test_append_fetch_and_load(backend):
+    rows = stored_rows(50)
+    backend.append(rows[:20])
+    backend.append(rows[20:])
+    assert backend.count() == 50
+    assert [record["description"] for record in backend.fetch(10, 5)] == [row[2] for row in rows[10:15]]
+    store = backend.load()
+    assert len(store) == 50
+    assert store.column("amount").tolist() == [row[0] for row in rows]
+
+
+@pytest.mark.parametrize("count", [0, 1, 30, 50, 80])
+def test_truncate_keeps_the_first_rows(backend, count):
+    rows = stored_rows(50)
+    backend.append(rows)
+    backend.truncate(count)
+    assert backend.count() == min(count, 50)
+    assert [record["amount"] for record in backend.fetch(0, 100)] == [row[0] for row in rows[:count]]
+    # Later appends land after the kept rows
+    backend.append(rows[:1])
+    assert backend.fetch(min(count, 50), 1)[0]["amount"] == rows[0][0]
+
+
+def test_rename_and_clear(backend):
+    backend.append(stored_rows(30))
+    backend.rename_category("Food", "Meals")
+    categories = {record["category"] for record in backend.fetch(0, 30)}
+    assert "Food" not in categories
+    backend.clear()
+    assert backend.count() == 0
+
+
+def test_ledger_reads_its_writes_through_the_queue(tmp_path):
+    backend = WriteBehindBackend(SQLiteBackend(os.path.join(tmp_path, "queued.db")))
+    ledger = Ledger(backend=backend)
+    for row in synthetic_rows(200):
+        ledger.add(*row)
+    assert len(ledger) == 200
+    backend.flush()
+    assert backend.count() == 200
+
+    # A reset drops whatever is still queued, and later adds land after it
+    for row in synthetic_rows(100, seed=1):
+        ledger.add(*row)
+    ledger.reset()
+    ledger.add(1.0, "Food", "After reset", date.today())
+    assert backend.count() == 1 and backend.fetch(0, 1)[0]["description"] == "After reset"
+    backend.close()
+
+
+def test_close_commits_the_queue(tmp_path):
+    path = os.path.join(tmp_path, "close.db")
+    backend = WriteBehindBackend(SQLiteBackend(path), max_delay=60)
+    backend.append([(1.0, "Food", "Lunch", 0, 0)] * 10)
+    backend.close()
+    assert SQLiteBackend(path).count() == 10
+
+
+def test_acknowledged_rows_survive_a_crash(tmp_path, acknowledgements=5):
+    path = os.path.join(tmp_path, "crash.db")
+    writer = subprocess.Popen([sys.executable, "-c", CRASH_WRITER, path], stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    acknowledged = 0
+    for _ in range(acknowledgements):
+        acknowledged = int(writer.stdout.readline())
+    writer.kill()
+    writer.wait()
+    writer.stdout.close()
+    backend = SQLiteBackend(path)
+    stored = backend.count()
+    assert stored >= acknowledged
+    for expected, record in zip(synthetic_rows(stored), backend.fetch(0, stored)):
+        assert (record["amount"], record["category"], record["description"]) == expected[:3]
+    backend.close()
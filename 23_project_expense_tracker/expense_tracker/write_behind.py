@@ -0,0 +1,192 @@
+# Write-behind queue in front of a storage backend
+#
+# append() only queues the rows; a background thread commits them to the
+# wrapped backend in batches, once `batch_size` rows are waiting or the oldest
+# has waited `max_delay` seconds. The ledger already serves every read from
+# memory, so a session sees its own writes at once; the backend's own reads
+# (load, count, fetch) flush the queue first. A write is acknowledged, and
+# survives a crash of the process, once flush() has returned.
+
+import atexit
+import threading
+import time
+
+from storage import StorageBackend
+
+
+class WriteBehindBackend(StorageBackend):
+    """Queue appends and commit them from a background thread"""
+
+    def __init__(self, backend, batch_size=500, max_delay=0.05):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        # Held while a batch is written, so clear(), truncate() and
+        # rename_category() never interleave with a commit
+        self._commit_lock = threading.Lock()
+        self._pending = []
+        self._oldest = None
+        # Rows ever queued, and rows committed (or dropped by clear()); both only grow
+        self._queued = 0
+        self._settled = 0
+        self._flush_target = 0
+        self._closed = False
+        self.error = None
+        self.commits = 0
+        self.failures = 0
+        self.max_depth = 0
+        self.commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="expense-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Let the batch fill up, unless someone is waiting on it (or
+                # clear() has emptied it meanwhile)
+                while (self._pending and len(self._pending) < self.batch_size and not self._closed
+                       and self._flush_target <= self._settled):
+                    remaining = self._oldest + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            if not self._commit_batch() and not self._closed:
+                # Keep the rows, in order, and try again after a pause
+                time.sleep(self.max_delay)
+
+    def _commit_batch(self):
+        """Write out everything queued; return False if the backend failed"""
+        # Lock order is always commit lock, then condition
+        with self._commit_lock:
+            with self._condition:
+                batch, oldest = self._pending, self._oldest
+                self._pending, self._oldest = [], None
+            if not batch:
+                return True
+            started = time.monotonic()
+            try:
+                self.backend.append(batch)
+            except Exception as error:
+                with self._condition:
+                    self._pending[:0] = batch
+                    self._oldest = oldest
+                    self.error = error
+                    self.failures += 1
+                    self._condition.notify_all()
+                    if self._closed:
+                        # Shutting down: report the loss rather than retry forever
+                        self._settled += len(self._pending)
+                        self._pending, self._oldest = [], None
+                return False
+            finished = time.monotonic()
+            with self._condition:
+                self._settled += len(batch)
+                self.error = None
+                self.commits += 1
+                self.commit_seconds += finished - started
+                self.max_commit_seconds = max(self.max_commit_seconds, finished - started)
+                self.max_lag_seconds = max(self.max_lag_seconds, finished - oldest)
+                self._condition.notify_all()
+            return True
+
+    def append(self, rows):
+        """Queue rows for the writer thread and return at once"""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("write-behind backend is closed")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.extend(rows)
+            self._queued += len(rows)
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every row queued so far is committed
+
+        Raises the writer's error if a commit failed while waiting, and
+        TimeoutError if `timeout` seconds pass first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            target = self._queued
+            self._flush_target = max(self._flush_target, target)
+            self._condition.notify_all()
+            while self._settled < target:
+                if self.error is not None:
+                    raise self.error
+                if not self._thread.is_alive():
+                    raise RuntimeError("write-behind writer has stopped")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"{target - self._settled} rows still queued")
+                self._condition.wait(remaining)
+
+    def load(self):
+        self.flush()
+        return self.backend.load()
+
+    def clear(self):
+        with self._commit_lock:
+            # Queued rows would only be deleted again, so they are dropped unwritten
+            with self._condition:
+                self._settled += len(self._pending)
+                self._pending, self._oldest = [], None
+                self._condition.notify_all()
+            self.backend.clear()
+
+    def truncate(self, count):
+        self.flush()
+        with self._commit_lock:
+            self.backend.truncate(count)
+
+    def rename_category(self, old, new):
+        self.flush()
+        with self._commit_lock:
+            self.backend.rename_category(old, new)
+
+    def count(self):
+        self.flush()
+        return self.backend.count()
+
+    def fetch(self, offset, limit):
+        self.flush()
+        return self.backend.fetch(offset, limit)
+
+    def close(self):
+        """Commit everything still queued, stop the writer and close the backend"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.backend.close()
+        atexit.unregister(self.close)
+
+    def metrics(self):
+        """Queue depth and commit latency, for the settings page and benchmarks"""
+        with self._condition:
+            return {
+                "queue_depth": len(self._pending),
+                "max_queue_depth": self.max_depth,
+                "rows_queued": self._queued,
+                "rows_committed": self._settled,
+                "commits": self.commits,
+                "failures": self.failures,
+                "mean_commit_ms": 1000 * self.commit_seconds / self.commits if self.commits else 0.0,
+                "max_commit_ms": 1000 * self.max_commit_seconds,
+                "max_lag_ms": 1000 * self.max_lag_seconds,
+                "last_error": None if self.error is None else str(self.error),
+            }